@@ -0,0 +1,188 @@
+"""
+Closed-loop alarm → relay latency benchmark.
+
+Starts an embedded broker, data_manager.py and relay_emulator.py, injects
+background person-count load at each requested rate and steps the temperature
+across TEMP_ALARM_C. Measures the time from publishing the crossing reading to
+receiving the matching actuator/relay_status (both rising "on" and falling
+"off" edges) and reports p50/p99/max per load rate.
+
+    python3 backend/bench/alarm_relay_latency.py --load-rates 0,100,1000 --steps 20 --json results.json
+"""
+
+import argparse
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import benchlib
+import paho.mqtt.client as mqtt
+
+from mini_broker import MiniBroker
+
+PEOPLE_TOPIC = "deepstream/person_count"
+TEMP_TOPIC = "jetson/internal/temperature"
+RELAY_STATUS_TOPIC = "actuator/relay_status"
+
+
+def start_services(port: int, workdir: str, alarm_c: float) -> list[subprocess.Popen]:
+    env = os.environ.copy()
+    env.update(
+        {
+            "MQTT_URL": f"mqtt://127.0.0.1:{port}",
+            "TEMP_WARN_C": str(alarm_c - 10),
+            "TEMP_ALARM_C": str(alarm_c),
+            "DDB_ENABLED": "0",
+            "DDB_HEARTBEAT_PATH": os.path.join(workdir, "ddb_heartbeat.json"),
+            "PYTHONUNBUFFERED": "1",
+        }
+    )
+    procs = []
+    for script in ("data_manager.py", "relay_emulator.py"):
+        # The child keeps its own copy of the descriptor.
+        with open(os.path.join(workdir, f"{script}.log"), "w", encoding="utf-8") as log:
+            procs.append(
+                subprocess.Popen([sys.executable, os.path.join(benchlib.MQTT_DIR, script)], env=env, stdout=log, stderr=log)
+            )
+    return procs
+
+
+class LoadGenerator(threading.Thread):
+    """Publishes person-count frames at a fixed rate until stopped."""
+
+    def __init__(self, client, rate: float):
+        super().__init__(name="person-load", daemon=True)
+        self.client = client
+        self.rate = rate
+        self.stopped = threading.Event()
+        self.sent = 0
+        self.elapsed = 0.0
+
+    def run(self):
+        if self.rate <= 0:
+            return
+        interval = 1.0 / self.rate
+        start = time.perf_counter()
+        while not self.stopped.is_set():
+            delay = start + self.sent * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            payload = json.dumps(
+                {"type": "person_count", "count": self.sent % 3, "stream_id": 0, "ts": int(time.time() * 1000)}
+            )
+            self.client.publish(PEOPLE_TOPIC, payload, qos=0)
+            self.sent += 1
+        self.elapsed = time.perf_counter() - start
+
+
+def run_load(client, statuses: queue.Queue, rate: float, steps: int, alarm_c: float, timeout: float) -> dict:
+    loader = LoadGenerator(client, rate)
+    loader.start()
+    time.sleep(0.5)  # let the load reach steady state
+
+    samples = {"on": [], "off": []}
+    timeouts = 0
+    for step in range(steps * 2):
+        expected = "on" if step % 2 == 0 else "off"
+        celsius = alarm_c + 5 if expected == "on" else alarm_c - 30
+        while not statuses.empty():
+            statuses.get_nowait()
+        started = time.perf_counter()
+        client.publish(TEMP_TOPIC, json.dumps({"type": "temperature", "celsius": celsius}), qos=0)
+        deadline = started + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                timeouts += 1
+                break
+            try:
+                received_at, state = statuses.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if state == expected:
+                samples[expected].append((received_at - started) * 1000.0)
+                break
+        time.sleep(0.05)
+
+    loader.stopped.set()
+    loader.join()
+    both = samples["on"] + samples["off"]
+    return {
+        "load_rate": rate,
+        "achieved_load": round(loader.sent / loader.elapsed, 1) if loader.elapsed else 0.0,
+        "timeouts": timeouts,
+        "latency_ms": benchlib.summarize(both),
+        "rising_ms": benchlib.summarize(samples["on"]),
+        "falling_ms": benchlib.summarize(samples["off"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--load-rates", default="0,100,500,2000", help="person-count messages per second")
+    parser.add_argument("--steps", type=int, default=20, help="alarm on/off cycles per load rate")
+    parser.add_argument("--alarm-c", type=float, default=80.0, help="TEMP_ALARM_C passed to the data manager")
+    parser.add_argument("--timeout", type=float, default=5.0, help="seconds to wait for each relay status")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the service logs")
+    args = parser.parse_args()
+
+    broker = MiniBroker().start()
+    workdir = tempfile.mkdtemp(prefix="alarm-relay-bench-")
+    services = start_services(broker.port, workdir, args.alarm_c)
+
+    statuses: queue.Queue = queue.Queue()
+
+    def on_message(client, userdata, msg):
+        received_at = time.perf_counter()
+        try:
+            statuses.put((received_at, json.loads(msg.payload).get("state")))
+        except Exception:
+            pass
+
+    client = mqtt.Client()
+    client.on_message = on_message
+    results = []
+    try:
+        benchlib.connect_client(client, "127.0.0.1", broker.port)
+        client.subscribe(RELAY_STATUS_TOPIC)
+        time.sleep(1.0)  # services connect and subscribe
+        # Start from a known state: temperature normal, relay off.
+        client.publish(TEMP_TOPIC, json.dumps({"type": "temperature", "celsius": args.alarm_c - 30}), qos=0)
+        time.sleep(0.5)
+
+        kept = f", logs in {workdir}" if args.keep else ""
+        print(f"[alarm-relay-bench] broker port {broker.port}{kept}")
+        print(f"{'load/s':>8} {'achieved':>9} {'n':>4} {'timeouts':>8} {'p50ms':>8} {'p99ms':>8} {'maxms':>8}")
+        for rate in (float(r) for r in args.load_rates.split(",") if r.strip()):
+            result = run_load(client, statuses, rate, args.steps, args.alarm_c, args.timeout)
+            results.append(result)
+            lat = result["latency_ms"]
+            print(
+                f"{rate:>8.0f} {result['achieved_load']:>9.1f} {lat['n']:>4} {result['timeouts']:>8} "
+                f"{benchlib.fmt_ms(lat['p50']):>8} {benchlib.fmt_ms(lat['p99']):>8} {benchlib.fmt_ms(lat['max']):>8}"
+            )
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        for proc in services:
+            proc.terminate()
+        for proc in services:
+            proc.wait(timeout=5)
+        broker.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    benchlib.write_json(
+        args.json,
+        {"benchmark": "alarm_relay_latency", "alarm_c": args.alarm_c, "steps": args.steps, "results": results},
+    )
+
+
+if __name__ == "__main__":
+    main()
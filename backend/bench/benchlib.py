@@ -0,0 +1,82 @@
+"""
+Shared helpers for the benchmark scripts in this folder.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+MQTT_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "mqtt"))
+TELEGRAM_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "..", "telegram_bot"))
+if MQTT_DIR not in sys.path:
+    # The services are plain scripts in backend/mqtt, not a package.
+    sys.path.insert(0, MQTT_DIR)
+
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def summarize(values: list[float]) -> dict:
+    ordered = sorted(values)
+    return {
+        "n": len(ordered),
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1] if ordered else None,
+    }
+
+
+def fmt_ms(value: float | None) -> str:
+    return "-" if value is None else f"{value:.2f}"
+
+
+def connect_client(client, host: str, port: int, timeout: float = 5.0):
+    """connect + loop_start, then block until CONNACK so publishes are not lost."""
+    connected = threading.Event()
+    previous = client.on_connect
+
+    def _on_connect(c, userdata, flags, rc, properties=None):
+        if previous:
+            previous(c, userdata, flags, rc)
+        connected.set()
+
+    client.on_connect = _on_connect
+    client.connect(host, port, 60)
+    client.loop_start()
+    if not connected.wait(timeout):
+        raise RuntimeError(f"MQTT connect to {host}:{port} timed out")
+    client.on_connect = previous
+
+
+def make_certs(workdir: str) -> dict:
+    """Throwaway CA plus server/client certificates (for 127.0.0.1/localhost) made with openssl."""
+
+    def openssl(*args):
+        subprocess.run(["openssl", *args], cwd=workdir, check=True, capture_output=True)
+
+    openssl("req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=bench-ca",
+            "-keyout", "ca.key", "-out", "ca.crt")
+    with open(os.path.join(workdir, "san.ext"), "w", encoding="utf-8") as handle:
+        handle.write("subjectAltName=IP:127.0.0.1,DNS:localhost\n")
+    for name in ("server", "client"):
+        openssl("req", "-newkey", "rsa:2048", "-nodes", "-subj", f"/CN={name}", "-keyout", f"{name}.key",
+                "-out", f"{name}.csr")
+        openssl("x509", "-req", "-in", f"{name}.csr", "-CA", "ca.crt", "-CAkey", "ca.key", "-CAcreateserial",
+                "-days", "1", "-extfile", "san.ext", "-out", f"{name}.crt")
+    return {name: os.path.join(workdir, name) for name in ("ca.crt", "server", "client")}
+
+
+def write_json(path: str | None, data: dict):
+    if not path:
+        return
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(data, handle, indent=2)
+        handle.write("\n")
@@ -0,0 +1,236 @@
+"""
+Fast-forward simulation of data_manager.py over a day of synthetic traffic.
+
+The real handlers run in-process on a virtual clock (data_manager.clock) and
+an in-process MQTT stand-in (simlib), so a simulated day takes seconds. The
+synthetic sensors, all seeded:
+  people       every --people-interval s; visits arrive more often in the
+               daytime (08:00-18:00) and last ~2 minutes with 1-4 people
+  gpu/temp/fps every --telemetry-interval s; GPU load with occasional
+               spikes to ~97%, temperature lagging behind GPU load plus a
+               daily ambient swing, FPS dropping while the GPU is saturated
+  relay        acknowledges relay commands after a random virtual delay
+               (--relay-drop of them are lost and retransmitted)
+data_manager's periodic tick runs every RELAY_ACK_CHECK_SECONDS.
+
+Reports the speed-up over real time, per-message handler cost, and the
+behavior: alarm transitions and time in each level per alarm, relay commands
+and retransmits, person-count rollups and LED toggles. It also prints a digest
+of all MQTT traffic. --compare <previous --json> exits non-zero when the
+behavior or digest differs, which makes it a regression test for windowing,
+alarm dwell and rollup changes (same seed and options).
+
+    python3 backend/bench/day_sim.py --hours 24 --seed 1 --json day.json
+    python3 backend/bench/day_sim.py --compare day.json
+"""
+
+import argparse
+import collections
+import json
+import math
+import os
+import random
+import sys
+import time
+
+import benchlib
+
+from simlib import FakeBroker, Scheduler, VirtualClock
+
+# A fixed local midnight keeps the run independent of when it starts.
+DAY_START = 1767225600.0  # 2026-01-01 00:00:00 UTC
+BEHAVIOR_KEYS = ("alarms", "dwell_s", "relay", "outputs", "digest")
+
+
+class Sensors:
+    def __init__(self, client, clock: VirtualClock, rng: random.Random, args):
+        self.client = client
+        self.clock = clock
+        self.rng = rng
+        self.args = args
+        self.people = 0
+        self.visit_until = 0.0
+        self.gpu = 35.0
+        self.spike_until = 0.0
+        self.temp = 50.0
+
+    def hour(self) -> float:
+        return ((self.clock.now - DAY_START) / 3600.0) % 24
+
+    def publish(self, topic: str, data: dict):
+        self.client.publish(topic, json.dumps(data))
+
+    def person_count(self):
+        now = self.clock.now
+        if now >= self.visit_until:
+            self.people = 0
+            arrivals_per_s = 1 / 300.0 if 8 <= self.hour() < 18 else 1 / 7200.0
+            if self.rng.random() < arrivals_per_s * self.args.people_interval:
+                self.people = self.rng.randint(1, 4)
+                self.visit_until = now + self.rng.expovariate(1 / 120.0)
+        self.publish("deepstream/person_count", {"count": self.people})
+
+    def telemetry(self):
+        now = self.clock.now
+        step = self.args.telemetry_interval
+        if now >= self.spike_until and self.rng.random() < self.args.spike_rate * step:
+            self.spike_until = now + self.rng.uniform(60, 300)
+        target = 97.0 if now < self.spike_until else 35.0 + (25.0 if self.people else 0.0)
+        self.gpu = min(100.0, max(0.0, self.gpu + 0.5 * (target - self.gpu) + self.rng.gauss(0, 2)))
+        ambient = 5.0 * math.sin((self.hour() - 9) / 24 * 2 * math.pi)
+        heat_target = 40.0 + 0.4 * self.gpu + ambient
+        self.temp += (heat_target - self.temp) * (1 - math.exp(-step / 60.0))
+        fps = 30.0 - (18.0 if self.gpu > 95 else 0.0) + self.rng.gauss(0, 0.5)
+        self.publish("jetson/internal/gpu_usage", {"percent": round(self.gpu, 1)})
+        self.publish("jetson/internal/temperature", {"celsius": round(self.temp, 2)})
+        self.publish("deepstream/perf", {"fps": {"0": round(fps, 2)}})
+
+
+class Observer:
+    """Tracks what data_manager publishes, with virtual timestamps."""
+
+    def __init__(self, clock: VirtualClock, alarm_topic: str, relay_topic: str):
+        self.clock = clock
+        self.alarm_topic = alarm_topic
+        self.relay_topic = relay_topic
+        self.outputs: collections.Counter = collections.Counter()
+        self.alarms: collections.Counter = collections.Counter()
+        self.levels: dict[str, tuple[str, float]] = {}
+        self.dwell: dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+        self.relay_ids: collections.Counter = collections.Counter()
+
+    def on_message(self, client, userdata, msg):
+        self.outputs[msg.topic] += 1
+        data = json.loads(msg.payload)
+        if msg.topic == self.alarm_topic:
+            self.alarms[f"{data['type']}:{data['level']}"] += 1
+            self.enter(data["type"], data["level"])
+        elif msg.topic == self.relay_topic:
+            self.relay_ids[data["id"]] += 1
+
+    def enter(self, alarm_type: str, level: str):
+        previous, since = self.levels.get(alarm_type, ("normal", DAY_START))
+        self.dwell[alarm_type][previous] += self.clock.now - since
+        self.levels[alarm_type] = (level, self.clock.now)
+
+    def finish(self):
+        for alarm_type, (level, _) in list(self.levels.items()):
+            self.enter(alarm_type, level)
+
+
+def run(args) -> dict:
+    # Forced off: a simulated day must not write synthetic items to the real tables.
+    os.environ["DDB_ENABLED"] = "0"
+    import data_manager as dm
+
+    clock = VirtualClock(DAY_START)
+    scheduler = Scheduler(clock)
+    rng = random.Random(args.seed)
+    broker = FakeBroker()
+    dm.clock = clock
+    dm.RELAY_ID_PREFIX = "dm-sim"
+
+    handler_us: list[float] = []
+    dm_client = broker.client("data-manager")
+
+    def timed_on_message(client, userdata, msg):
+        started = time.perf_counter()
+        dm.on_message(client, userdata, msg)
+        handler_us.append((time.perf_counter() - started) * 1e6)
+
+    dm_client.on_message = timed_on_message
+    dm.on_connect(dm_client, None, None, 0)
+
+    observer = Observer(clock, dm.UI_ALARM_TOPIC, dm.RELAY_COMMAND_TOPIC)
+    observer_client = broker.client("observer")
+    observer_client.on_message = observer.on_message
+    for topic in (f"{dm.UI_METRICS_PREFIX}/#", dm.UI_ALARM_TOPIC, dm.RELAY_COMMAND_TOPIC, dm.LED_TOGGLE_TOPIC):
+        observer_client.subscribe(topic)
+
+    relay_client = broker.client("relay")
+    relay_client.subscribe(dm.RELAY_COMMAND_TOPIC)
+
+    def relay_on_message(client, userdata, msg):
+        data = json.loads(msg.payload)
+        if rng.random() < args.relay_drop:
+            return
+        status = json.dumps({"id": data["id"], "state": data["state"]})
+        scheduler.after(rng.uniform(args.relay_min_ms, args.relay_max_ms) / 1000.0, client.publish, dm.RELAY_STATUS_TOPIC, status)
+
+    relay_client.on_message = relay_on_message
+
+    sensors = Sensors(broker.client("sensors"), clock, rng, args)
+    scheduler.every(args.people_interval, sensors.person_count)
+    scheduler.every(args.telemetry_interval, sensors.telemetry)
+    scheduler.every(dm.RELAY_ACK_CHECK_SECONDS, lambda: dm.tick(dm_client))
+
+    started = time.perf_counter()
+    scheduler.run_until(DAY_START + args.hours * 3600.0)
+    wall = time.perf_counter() - started
+    observer.finish()
+
+    virtual = args.hours * 3600.0
+    relay_sends = sum(observer.relay_ids.values())
+    return {
+        "hours": args.hours,
+        "seed": args.seed,
+        "wall_s": round(wall, 3),
+        "speedup": round(virtual / wall) if wall else None,
+        "events": scheduler.events,
+        "messages": broker.messages,
+        "handled": len(handler_us),
+        "handler_us": benchlib.summarize(handler_us),
+        "alarms": dict(sorted(observer.alarms.items())),
+        "dwell_s": {k: {level: round(v, 1) for level, v in sorted(c.items())} for k, c in sorted(observer.dwell.items())},
+        "relay": {
+            "commands": len(observer.relay_ids),
+            "retransmits": relay_sends - len(observer.relay_ids),
+            "acks": dm.relay_ack_stats["count"],
+            "timeouts": dm.relay_ack_stats["timeouts"],
+        },
+        "outputs": dict(sorted(observer.outputs.items())),
+        "digest": broker.digest.hexdigest(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=24.0, help="simulated duration")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--people-interval", type=float, default=1.0, help="seconds between person counts")
+    parser.add_argument("--telemetry-interval", type=float, default=5.0, help="seconds between gpu/temp/fps samples")
+    parser.add_argument("--spike-rate", type=float, default=1 / 3600.0, help="GPU spikes per second")
+    parser.add_argument("--relay-min-ms", type=float, default=20.0)
+    parser.add_argument("--relay-max-ms", type=float, default=200.0)
+    parser.add_argument("--relay-drop", type=float, default=0.05, help="share of relay commands never acknowledged")
+    parser.add_argument("--compare", help="previous --json result; exit 1 if the behavior differs")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    handler = result["handler_us"]
+    print(
+        f"[day-sim] {result['hours']:g} h simulated in {result['wall_s']:.2f}s ({result['speedup']}x), "
+        f"{result['handled']} messages handled, handler p50 {handler['p50']:.1f} us p99 {handler['p99']:.1f} us "
+        f"max {handler['max']:.1f} us"
+    )
+    for alarm_type, dwell in result["dwell_s"].items():
+        print(f"[day-sim] {alarm_type:>10}: " + ", ".join(f"{level} {seconds / 60:.1f} min" for level, seconds in dwell.items()))
+    print(f"[day-sim] alarms {result['alarms']}")
+    print(f"[day-sim] relay {result['relay']}")
+    print(f"[day-sim] outputs {result['outputs']}")
+    print(f"[day-sim] digest {result['digest']}")
+    benchlib.write_json(args.json, {"benchmark": "day_sim", **result})
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as handle:
+            previous = json.load(handle)
+        changed = [key for key in BEHAVIOR_KEYS if previous.get(key) != result[key]]
+        if changed:
+            print(f"[day-sim] behavior differs from {args.compare}: {', '.join(changed)}")
+            sys.exit(1)
+        print(f"[day-sim] behavior matches {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
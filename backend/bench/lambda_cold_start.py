@@ -0,0 +1,240 @@
+"""
+Cold-start cost of the Telegram lambdas.
+
+Each run starts a fresh interpreter with -X importtime (as a new Lambda
+container would), imports the handler module and invokes it twice: the first
+call is the cold invocation, the second a warm one on the same module. The
+notify handler sends to an HTTPS stand-in for the Telegram API (throwaway CA
+via SSL_CERT_FILE), so the cold call includes the TLS handshake and the warm
+call shows connection reuse. As deployed, it reads and writes its state table
+(NOTIFY_STATE_TABLE): a plain-HTTP DynamoDB stand-in answers GetItem/PutItem
+(AWS_ENDPOINT_URL_DYNAMODB), so the cold call includes loading boto3 and
+building the client, but not the TLS handshake to DynamoDB; --no-state-table
+runs without it. The command handler gets webhook events that need no AWS
+call; the time to build its IoT-data client on first publish is measured
+separately (no request is sent). Reports wall times, cold total (import plus
+first call, what a cold start costs), the import cost of the module and of
+anything imported lazily during the first call, and the heaviest imports.
+
+    python3 backend/bench/lambda_cold_start.py --runs 10
+    python3 backend/bench/lambda_cold_start.py --lambda-dir /tmp/old/telegram_bot   # compare another version
+
+Needs boto3; uses openssl for the certificates.
+"""
+
+import argparse
+import json
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import benchlib
+
+from lambda_load import Calls, start_telegram
+
+# Runs in the fresh interpreter; kept to modules the Lambda runtime has loaded anyway.
+CHILD = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+events = json.loads(sys.argv[3])
+sys.stderr.write("--import--\\n")
+started = time.perf_counter()
+handler = __import__(sys.argv[2])
+imported = time.perf_counter()
+sys.stderr.write("--first--\\n")
+handler.lambda_handler(events[0], None)
+first = time.perf_counter()
+sys.stderr.write("--warm--\\n")
+handler.lambda_handler(events[1], None)
+warm = time.perf_counter()
+sys.stderr.write("--client--\\n")
+client_ms = None
+if sys.argv[4] and hasattr(handler, sys.argv[4]):
+    getattr(handler, sys.argv[4])()
+    client_ms = (time.perf_counter() - warm) * 1000.0
+print(json.dumps({
+    "import_ms": (imported - started) * 1000.0,
+    "first_ms": (first - imported) * 1000.0,
+    "warm_ms": (warm - first) * 1000.0,
+    "client_ms": client_ms,
+}))
+"""
+
+
+def notify_events() -> list:
+    def batch(ts: int, count: int) -> dict:
+        image = {"metric": {"S": "person_count"}, "ts": {"N": str(ts)}, "count": {"N": str(count)}}
+        return {"Records": [{"eventName": "INSERT", "dynamodb": {"NewImage": image}}]}
+
+    return [batch(1_000, 2), batch(2_000, 0)]
+
+
+def command_events() -> list:
+    def webhook(message_id: int, text: str) -> dict:
+        message = {"message_id": message_id, "date": 0, "chat": {"id": 1000}, "text": text}
+        return {"body": json.dumps({"update_id": message_id, "message": message})}
+
+    return [webhook(1, "hello"), webhook(2, "help")]
+
+
+SCENARIOS = {
+    "notify": ("lambda_function", notify_events, "ddb_client"),
+    "command": ("command_lambda_function", command_events, "iot_client"),
+}
+
+
+def start_dynamodb(calls: Calls) -> ThreadingHTTPServer:
+    """Answers every DynamoDB call with an empty result: GetItem finds no item, PutItem succeeds."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", "0")))
+            calls.add("dynamodb." + self.headers.get("X-Amz-Target", "").rsplit(".", 1)[-1])
+            body = b"{}"
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-amz-json-1.0")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="dynamodb-standin", daemon=True).start()
+    return server
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Per phase: summed top-level cumulative import time (ms) plus every module's self time."""
+    phases: dict[str, float] = {}
+    modules: list[tuple[float, str]] = []
+    phase = None
+    for line in stderr.splitlines():
+        if line.startswith("--") and line.endswith("--"):
+            phase = line.strip("-")
+            phases[phase] = 0.0
+            continue
+        if phase is None or not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:  self [us] | cumulative | <2 spaces per nesting level>name"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        name = name[1:]
+        if not name.startswith(" "):
+            phases[phase] += int(cumulative_us) / 1000.0
+        modules.append((int(self_us) / 1000.0, name.strip()))
+    return {"phases": phases, "modules": modules}
+
+
+def run_once(name: str, lambda_dir: str, env: dict) -> dict:
+    module, events, client_fn = SCENARIOS[name]
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, lambda_dir, module, json.dumps(events()), client_fn],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{name} child failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result.update(parse_importtime(proc.stderr))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per handler")
+    parser.add_argument("--handlers", default="notify,command")
+    parser.add_argument("--lambda-dir", default=benchlib.TELEGRAM_DIR, help="folder with the handler modules")
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports to list")
+    parser.add_argument("--no-state-table", action="store_true", help="run the notify handler without NOTIFY_STATE_TABLE")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    # The CA and server keys only live for the run.
+    with tempfile.TemporaryDirectory(prefix="lambda-cold-start-bench-") as workdir:
+        run_bench(args, benchlib.make_certs(workdir))
+
+
+def run_bench(args, certs: dict):
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(certs["server"] + ".crt", certs["server"] + ".key")
+    calls = Calls()
+    telegram = start_telegram(calls, 0.0, server_context)
+    dynamodb = start_dynamodb(calls)
+
+    env = os.environ.copy()
+    env.update(
+        {
+            "BOT_TOKEN": "bench-token",
+            "CHAT_ID": "1000",
+            "TELEGRAM_API_URL": f"https://127.0.0.1:{telegram.server_port}",
+            "SSL_CERT_FILE": certs["ca.crt"],
+            "SUPPRESS_SECONDS": "0",
+            "NOTIFY_STATE_TABLE": "" if args.no_state_table else "notify_state",
+            "AWS_ENDPOINT_URL_DYNAMODB": f"http://127.0.0.1:{dynamodb.server_port}",
+            "ALLOWED_CHAT_ID": "1000",
+            "IOT_ENDPOINT": "data-ats.iot.us-east-1.amazonaws.com",
+            "AWS_DEFAULT_REGION": "us-east-1",
+            "AWS_ACCESS_KEY_ID": "bench",
+            "AWS_SECRET_ACCESS_KEY": "bench",
+        }
+    )
+
+    table = "no state table" if args.no_state_table else "state table on a local DynamoDB stand-in"
+    print(f"[lambda-cold-start-bench] handlers from {args.lambda_dir}, {args.runs} runs each; notify with {table}")
+    print(
+        f"{'handler':>8} {'import':>8} {'imp(it)':>8} {'cold 1st':>9} {'lazy imp':>9} {'cold tot':>9} "
+        f"{'warm':>7} {'client':>7}  (p50 ms)"
+    )
+    results = []
+    for name in (h.strip() for h in args.handlers.split(",") if h.strip()):
+        runs = [run_once(name, args.lambda_dir, env) for _ in range(args.runs)]
+        heaviest: dict[str, float] = {}
+        for run in runs:
+            for self_ms, module in run["modules"]:
+                heaviest[module] = heaviest.get(module, 0.0) + self_ms / len(runs)
+        client = [run["client_ms"] for run in runs if run["client_ms"] is not None]
+        result = {
+            "handler": name,
+            "import_ms": benchlib.summarize([run["import_ms"] for run in runs]),
+            "importtime_ms": benchlib.summarize([run["phases"].get("import", 0.0) for run in runs]),
+            "first_ms": benchlib.summarize([run["first_ms"] for run in runs]),
+            "first_importtime_ms": benchlib.summarize([run["phases"].get("first", 0.0) for run in runs]),
+            "cold_total_ms": benchlib.summarize([run["import_ms"] + run["first_ms"] for run in runs]),
+            "warm_ms": benchlib.summarize([run["warm_ms"] for run in runs]),
+            "client_init_ms": benchlib.summarize(client),
+            "heaviest_imports_ms": dict(sorted(heaviest.items(), key=lambda item: -item[1])[: args.top]),
+        }
+        results.append(result)
+        print(
+            f"{name:>8} {benchlib.fmt_ms(result['import_ms']['p50']):>8} {benchlib.fmt_ms(result['importtime_ms']['p50']):>8} "
+            f"{benchlib.fmt_ms(result['first_ms']['p50']):>9} {benchlib.fmt_ms(result['first_importtime_ms']['p50']):>9} "
+            f"{benchlib.fmt_ms(result['cold_total_ms']['p50']):>9} {benchlib.fmt_ms(result['warm_ms']['p50']):>7} {benchlib.fmt_ms(result['client_init_ms']['p50']):>7}"
+        )
+        print("         heaviest: " + ", ".join(f"{mod} {ms:.1f}" for mod, ms in result["heaviest_imports_ms"].items()))
+    telegram.shutdown()
+    dynamodb.shutdown()
+    print(f"[lambda-cold-start-bench] stand-in calls: {dict(calls.take())}")
+    benchlib.write_json(
+        args.json,
+        {
+            "benchmark": "lambda_cold_start",
+            "lambda_dir": args.lambda_dir,
+            "state_table": not args.no_state_table,
+            "results": results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
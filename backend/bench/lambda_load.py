@@ -0,0 +1,291 @@
+"""
+Local load harness for the Telegram lambdas.
+
+Invokes telegram_bot/lambda_function.py (DynamoDB stream alerts) and
+telegram_bot/command_lambda_function.py (webhook commands) in-process with
+synthetic events, against a local HTTP stand-in for the Telegram Bot API
+(via TELEGRAM_API_URL) and moto for DynamoDB and IoT-data. Needs boto3 and
+moto (pip install boto3 "moto[dynamodb,iotdata]").
+
+  notify   --batches stream batches of --batch-size person_count records; the
+           count random-walks between 0 and a few people (--change is the
+           chance that a record changes it)
+  command  --webhooks API Gateway events: allowed commands and "status" (read
+           from a seeded status item), plus a share of unknown text
+           (--ignored) and foreign chats (--foreign)
+
+Each handler module is first re-imported and invoked --reimports times, then
+run warm at --rate invocations/s (0 = back to back). The re-imports happen in
+this process, with boto3, botocore and moto already loaded, so "reimport" is
+the handler module's own import and "1st call" its first invocation (client
+build included); neither is a container cold start, which
+lambda_cold_start.py measures in fresh interpreters. Reports latency and
+outbound calls per invocation: Telegram requests and new TCP connections, and
+AWS API calls by operation. moto answers AWS calls in-process, so AWS latency
+is not included; --telegram-ms adds a delay to every Telegram reply.
+
+    python3 backend/bench/lambda_load.py --batches 200 --batch-size 20
+    python3 backend/bench/lambda_load.py --handlers command --webhooks 500 --rate 50
+"""
+
+import argparse
+import collections
+import importlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import benchlib
+
+import botocore.client
+from moto import mock_aws
+
+REGION = "us-east-1"
+STATE_TABLE = "notify_state"
+STATUS_TABLE = "status"
+# moto routes IoT-data calls by this hostname pattern.
+IOT_ENDPOINT = f"data-ats.iot.{REGION}.amazonaws.com"
+ALLOWED_CHAT_ID = "1000"
+COMMANDS = ["run", "run -db", "start pipeline", "stop", "status"]
+HANDLER_MODULES = {"notify": "lambda_function", "command": "command_lambda_function"}
+
+
+class Calls:
+    """Outbound call counters shared by the Telegram stand-in and the botocore hook."""
+
+    def __init__(self):
+        self.counts: collections.Counter = collections.Counter()
+        self.lock = threading.Lock()
+
+    def add(self, key: str):
+        with self.lock:
+            self.counts[key] += 1
+
+    def take(self) -> collections.Counter:
+        with self.lock:
+            counts, self.counts = self.counts, collections.Counter()
+            return counts
+
+
+def start_telegram(calls: Calls, delay_ms: float, ssl_context=None) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse shows up
+        disable_nagle_algorithm = True  # headers and body are separate writes
+
+        def setup(self):
+            super().setup()
+            calls.add("telegram.connections")
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", "0")))
+            calls.add("telegram." + self.path.rsplit("/", 1)[-1])
+            if delay_ms:
+                time.sleep(delay_ms / 1000.0)
+            body = b'{"ok":true,"result":{}}'
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    if ssl_context is not None:
+        server.socket = ssl_context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, name="telegram-standin", daemon=True).start()
+    return server
+
+
+def count_aws_calls(calls: Calls):
+    original = botocore.client.BaseClient._make_api_call
+
+    def _make_api_call(client, operation_name, api_params):
+        calls.add(f"{client.meta.service_model.service_name}.{operation_name}")
+        return original(client, operation_name, api_params)
+
+    botocore.client.BaseClient._make_api_call = _make_api_call
+
+
+class FakeContext:
+    def get_remaining_time_in_millis(self) -> int:
+        return 30000
+
+
+def stream_batches(args, rng: random.Random):
+    ts = int(time.time() * 1000)
+    count = 0
+    for _ in range(args.batches):
+        records = []
+        for _ in range(args.batch_size):
+            if rng.random() < args.change:
+                count = 0 if count else rng.randint(1, 5)
+            ts += args.record_ms
+            image = {"metric": {"S": "person_count"}, "ts": {"N": str(ts)}, "count": {"N": str(count)}}
+            records.append({"eventName": "INSERT", "dynamodb": {"NewImage": image}})
+        yield {"Records": records}
+
+
+def webhook_events(args, rng: random.Random):
+    for message_id in range(1, args.webhooks + 1):
+        chat_id = ALLOWED_CHAT_ID if rng.random() >= args.foreign else "2000"
+        text = "hello" if rng.random() < args.ignored else rng.choice(COMMANDS)
+        update = {
+            "update_id": message_id,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id)},
+                "text": text,
+            },
+        }
+        yield {"body": json.dumps(update), "isBase64Encoded": False}
+
+
+def fresh_import(module_name: str):
+    sys.modules.pop(module_name, None)
+    return importlib.import_module(module_name)
+
+
+def run_handler(name: str, events: list, args, calls: Calls) -> dict:
+    module_name = HANDLER_MODULES[name]
+    context = FakeContext()
+    imports_ms, firsts_ms = [], []
+    for i in range(args.reimports):
+        calls.take()
+        started = time.perf_counter()
+        module = fresh_import(module_name)
+        imported = time.perf_counter()
+        module.lambda_handler(events[i % len(events)], context)
+        firsts_ms.append((time.perf_counter() - imported) * 1000.0)
+        imports_ms.append((imported - started) * 1000.0)
+    calls.take()
+
+    latencies, results = [], collections.Counter()
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    next_at = time.perf_counter()
+    for event in events:
+        if interval:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_at += interval
+        started = time.perf_counter()
+        result = module.lambda_handler(event, context)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        results[str(result.get("statusCode", "ok") if isinstance(result, dict) else result)] += 1
+    calls_total = calls.take()
+    return {
+        "handler": name,
+        "invocations": len(events),
+        "reimport_ms": benchlib.summarize(imports_ms),
+        "first_call_ms": benchlib.summarize(firsts_ms),
+        "warm_ms": benchlib.summarize(latencies),
+        "results": dict(results),
+        "calls": dict(calls_total),
+        "calls_per_invocation": {key: round(value / len(events), 3) for key, value in sorted(calls_total.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handlers", default="notify,command")
+    parser.add_argument("--batches", type=int, default=200, help="stream batches for the notify handler")
+    parser.add_argument("--batch-size", type=int, default=10, help="records per stream batch")
+    parser.add_argument("--record-ms", type=int, default=1000, help="ts step between records")
+    parser.add_argument("--change", type=float, default=0.05, help="chance a record changes the count")
+    parser.add_argument("--webhooks", type=int, default=200, help="webhook events for the command handler")
+    parser.add_argument("--ignored", type=float, default=0.1, help="share of webhooks with unknown text")
+    parser.add_argument("--foreign", type=float, default=0.05, help="share of webhooks from another chat")
+    parser.add_argument("--rate", type=float, default=0.0, help="warm invocations per second (0 = back to back)")
+    parser.add_argument("--reimports", type=int, default=3, help="module re-imports + first calls measured per handler")
+    parser.add_argument("--chats", type=int, default=1, help="chat ids the notify handler alerts")
+    parser.add_argument("--telegram-ms", type=float, default=0.0, help="stand-in Telegram reply delay")
+    parser.add_argument("--no-state-table", action="store_true", help="run the notify handler without NOTIFY_STATE_TABLE")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    calls = Calls()
+    telegram = start_telegram(calls, args.telegram_ms)
+    os.environ.update(
+        {
+            "AWS_DEFAULT_REGION": REGION,
+            "AWS_ACCESS_KEY_ID": "bench",
+            "AWS_SECRET_ACCESS_KEY": "bench",
+            "BOT_TOKEN": "bench-token",
+            "CHAT_ID": ",".join(str(1000 + i) for i in range(args.chats)),
+            "TELEGRAM_API_URL": f"http://127.0.0.1:{telegram.server_port}",
+            "NOTIFY_STATE_TABLE": "" if args.no_state_table else STATE_TABLE,
+            "ALLOWED_CHAT_ID": ALLOWED_CHAT_ID,
+            "IOT_ENDPOINT": IOT_ENDPOINT,
+            "STATUS_TABLE": STATUS_TABLE,
+        }
+    )
+    if benchlib.TELEGRAM_DIR not in sys.path:
+        sys.path.insert(0, benchlib.TELEGRAM_DIR)
+
+    rng = random.Random(args.seed)
+    results = []
+    print(f"[lambda-load-bench] Telegram stand-in on port {telegram.server_port}")
+    print(f"{'handler':>8} {'calls':>6} {'reimport':>8} {'1st call':>9} {'warm p50':>9} {'p99':>8} {'max':>8}  outbound/invocation")
+    with mock_aws():
+        import boto3
+
+        if not args.no_state_table:
+            boto3.client("dynamodb", region_name=REGION).create_table(
+                TableName=STATE_TABLE,
+                KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+        dynamodb = boto3.client("dynamodb", region_name=REGION)
+        dynamodb.create_table(
+            TableName=STATUS_TABLE,
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        dynamodb.put_item(
+            TableName=STATUS_TABLE,
+            Item={
+                "id": {"S": "jetson"},
+                "ts": {"N": str(int(time.time() * 1000))},
+                "people": {"N": "1"},
+                "gpu": {"N": "42.5"},
+                "tempLevel": {"S": "normal"},
+                "relayState": {"S": "off"},
+            },
+        )
+        count_aws_calls(calls)
+        for name in (h.strip() for h in args.handlers.split(",") if h.strip()):
+            events = list(stream_batches(args, rng) if name == "notify" else webhook_events(args, rng))
+            result = run_handler(name, events, args, calls)
+            results.append(result)
+            per_call = " ".join(f"{key}={value}" for key, value in result["calls_per_invocation"].items())
+            print(
+                f"{name:>8} {result['invocations']:>6} {benchlib.fmt_ms(result['reimport_ms']['p50']):>8} "
+                f"{benchlib.fmt_ms(result['first_call_ms']['p50']):>9} {benchlib.fmt_ms(result['warm_ms']['p50']):>9} "
+                f"{benchlib.fmt_ms(result['warm_ms']['p99']):>8} {benchlib.fmt_ms(result['warm_ms']['max']):>8}  {per_call}"
+            )
+    telegram.shutdown()
+    benchlib.write_json(
+        args.json,
+        {
+            "benchmark": "lambda_load",
+            "batch_size": args.batch_size,
+            "rate": args.rate,
+            "state_table": not args.no_state_table,
+            "results": results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+MQTT → LED latency benchmark.
+
+Runs the LED notifier (person_led_mqtt.py) in-process on the mock GPIO backend,
+publishes alternating toggle/idle commands on the LED topic at increasing rates
+and matches every pin transition to the command that caused it. Reports
+command→pin latency percentiles, commands lost in transport, commands that
+never produced a transition (coalesced/dropped) and late transitions.
+
+    python3 backend/bench/led_latency.py                      # embedded broker
+    python3 backend/bench/led_latency.py --host 127.0.0.1 --port 1883 --rates 10,100,500
+"""
+
+import argparse
+import io
+import json
+import sys
+import threading
+import time
+
+import benchlib
+import paho.mqtt.client as mqtt
+
+import gpio_backend
+import person_led_mqtt
+from mini_broker import MiniBroker
+
+
+def match_transitions(sent: dict, received: list, transitions: list) -> tuple[list[float], set, int]:
+    """
+    A transition to level L at time t belongs to the newest received command
+    asking for L before t that is newer than the last matched command.
+    Transitions with no such command come from the blink cadence itself.
+    """
+    latencies = []
+    matched = set()
+    spurious = 0
+    last_seq = -1
+    r_idx = 0
+    for t_ts, _pin, level in transitions:
+        while r_idx < len(received) and received[r_idx][1] <= t_ts:
+            r_idx += 1
+        cause = None
+        for seq, _recv_ts, wants_high in reversed(received[:r_idx]):
+            if seq <= last_seq:
+                break
+            if wants_high == level:
+                cause = seq
+                break
+        if cause is None:
+            spurious += 1
+            continue
+        matched.add(cause)
+        last_seq = cause
+        latencies.append((t_ts - sent[cause]) * 1000.0)
+    return latencies, matched, spurious
+
+
+def run_rate(pub, topic: str, mock, received: list, rate: float, seconds: float, late_ms: float) -> dict:
+    person_led_mqtt.scheduler.all_off()
+    time.sleep(0.1)
+    with mock.lock:
+        mock.transitions.clear()
+    received.clear()
+
+    count = max(2, int(rate * seconds))
+    count -= count % 2  # end on idle
+    interval = 1.0 / rate
+    sent = {}
+    start = time.perf_counter()
+    for seq in range(count):
+        target = start + seq * interval
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        state = "toggle" if seq % 2 == 0 else "idle"
+        sent[seq] = time.time()
+        pub.publish(topic, json.dumps({"state": state, "seq": seq, "source": "bench"}), qos=0)
+    time.sleep(max(0.5, late_ms * 4 / 1000.0))
+
+    with mock.lock:
+        transitions = list(mock.transitions)
+    latencies, matched, spurious = match_transitions(sent, list(received), transitions)
+    stats = benchlib.summarize(latencies)
+    return {
+        "rate": rate,
+        "sent": count,
+        "received": len(received),
+        "transport_lost": count - len(received),
+        "no_transition": len(received) - len(matched),
+        "late": sum(1 for v in latencies if v > late_ms),
+        "blink_transitions": spurious,
+        "latency_ms": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", help="broker host (default: start an embedded broker)")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--topic", default=person_led_mqtt.TOPIC)
+    parser.add_argument("--rates", default="10,20,50,100,200,500", help="commands per second, comma separated")
+    parser.add_argument("--seconds", type=float, default=2.0, help="duration per rate")
+    parser.add_argument("--late-ms", type=float, default=20.0, help="latency above which a transition counts as late")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    broker = None
+    host, port = args.host, args.port
+    if not host:
+        broker = MiniBroker().start()
+        host, port = "127.0.0.1", broker.port
+
+    person_led_mqtt.TOPIC = args.topic
+    mock = gpio_backend.MockGpioBackend()
+    person_led_mqtt.init_led(mock)
+
+    received = []
+    subscribed = threading.Event()
+
+    def on_message(client, userdata, msg):
+        recv_ts = time.time()
+        try:
+            data = json.loads(msg.payload)
+            received.append((data["seq"], recv_ts, data["state"] == "toggle"))
+        except Exception:
+            pass
+        person_led_mqtt.on_message(client, userdata, msg)
+
+    sub = mqtt.Client()
+    sub.on_connect = person_led_mqtt.on_connect
+    sub.on_message = on_message
+    sub.on_subscribe = lambda *a: subscribed.set()
+    pub = mqtt.Client()
+    real_stdout = sys.stdout
+    results = []
+    try:
+        benchlib.connect_client(sub, host, port)
+        benchlib.connect_client(pub, host, port)
+        subscribed.wait(5)
+        print(f"[led-bench] broker {host}:{port} topic={args.topic}")
+        print(f"{'rate/s':>8} {'sent':>6} {'lost':>5} {'no-pin':>6} {'late':>5} {'p50ms':>8} {'p90ms':>8} {'p99ms':>8} {'maxms':>8}")
+        for rate in (float(r) for r in args.rates.split(",") if r.strip()):
+            # The notifier logs every command; keep that out of the report.
+            sys.stdout = io.StringIO()
+            try:
+                result = run_rate(pub, args.topic, mock, received, rate, args.seconds, args.late_ms)
+            finally:
+                sys.stdout = real_stdout
+            results.append(result)
+            lat = result["latency_ms"]
+            print(
+                f"{rate:>8.0f} {result['sent']:>6} {result['transport_lost']:>5} {result['no_transition']:>6} "
+                f"{result['late']:>5} {benchlib.fmt_ms(lat['p50']):>8} {benchlib.fmt_ms(lat['p90']):>8} "
+                f"{benchlib.fmt_ms(lat['p99']):>8} {benchlib.fmt_ms(lat['max']):>8}"
+            )
+    finally:
+        sys.stdout = real_stdout
+        for client in (sub, pub):
+            client.loop_stop()
+            client.disconnect()
+        person_led_mqtt.cleanup()
+        if broker:
+            broker.stop()
+    benchlib.write_json(args.json, {"benchmark": "led_latency", "late_ms": args.late_ms, "results": results})
+
+
+if __name__ == "__main__":
+    main()
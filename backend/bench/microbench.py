@@ -0,0 +1,224 @@
+"""
+Micro-benchmarks for the per-message hot paths, with saved baselines.
+
+Cases:
+  data_manager   on_message for each source topic (people, temperature, gpu,
+                 fps, relay status), normalize_for_ddb, round_half_down,
+                 to_number
+  relay          relay_emulator.normalize_state
+  listener       command_listener.extract_command_text
+  telemetry      the jetson_telemetry readers and SampleCollector.collect
+                 against a generated fake sysfs/procfs tree (TELEMETRY_FS_ROOT)
+  metrics        service_metrics counter/histogram updates, and an
+                 on_message wrapped by Registry.instrument (the per-message
+                 cost the services pay for their metrics)
+Handlers publish into a no-op client, so only the handler itself is timed.
+
+Each case is calibrated to about --min-time seconds per repeat; the result is
+the median over --repeat repeats in ns/op (plus the minimum). Baselines are
+machine-specific: save one on the device and commit it, then compare every
+hot-path change against it.
+
+    python3 backend/bench/microbench.py --save backend/bench/baselines/jetson.json
+    python3 backend/bench/microbench.py --compare backend/bench/baselines/jetson.json --threshold 10
+    python3 backend/bench/microbench.py --filter data_manager
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import benchlib
+
+CPU_COUNT = 8
+
+
+class PublishInfo:
+    rc = 0
+
+
+class NullClient:
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        return PublishInfo
+
+    def subscribe(self, topic, qos=0):
+        return None
+
+
+class Message:
+    def __init__(self, topic: str, data: dict):
+        self.topic = topic
+        self.payload = json.dumps(data).encode("utf-8")
+        self.qos = 0
+        self.retain = False
+
+
+def write(root: str, path: str, content: str):
+    full = os.path.join(root, path.lstrip("/"))
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, "w", encoding="utf-8") as handle:
+        handle.write(content)
+
+
+def make_fake_fs(root: str):
+    """A Jetson-like sysfs/procfs subset: GPU load, thermal zones, EMC, INA3221 rails, /proc/stat, meminfo."""
+    write(root, "/sys/devices/gpu.0/load", "437\n")
+    for i, (ztype, temp) in enumerate((("CPU-therm", 48500), ("GPU-therm", 47000), ("SOC-therm", 49100), ("tj-therm", 50200))):
+        write(root, f"/sys/devices/virtual/thermal/thermal_zone{i}/type", ztype + "\n")
+        write(root, f"/sys/devices/virtual/thermal/thermal_zone{i}/temp", f"{temp}\n")
+    write(root, "/sys/kernel/debug/bpmp/debug/clk/emc/rate", "2133000000\n")
+    hwmon = "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon3"
+    for channel, label in ((1, "VDD_IN"), (2, "VDD_CPU_GPU_CV"), (3, "VDD_SOC")):
+        write(root, f"{hwmon}/in{channel}_label", label + "\n")
+        write(root, f"{hwmon}/in{channel}_input", "5080\n")
+        write(root, f"{hwmon}/curr{channel}_input", f"{400 + 100 * channel}\n")
+    lines = ["cpu  184210 412 53210 9120345 4210 0 1203 0 0 0"]
+    lines += [f"cpu{i} 23026 51 6651 1140043 526 0 150 0 0 0" for i in range(CPU_COUNT)]
+    lines += ["intr 123456789 " + " ".join("0" for _ in range(400)), "ctxt 987654321", "btime 1767225600"]
+    write(root, "/proc/stat", "\n".join(lines) + "\n")
+    meminfo = {
+        "MemTotal": 7999436, "MemFree": 1203344, "MemAvailable": 4512320, "Buffers": 120344, "Cached": 2912344,
+        "SwapCached": 0, "Active": 2400000, "Inactive": 2100000, "SwapTotal": 3999712, "SwapFree": 3999712,
+    }
+    write(root, "/proc/meminfo", "".join(f"{key}:{value:>16} kB\n" for key, value in meminfo.items()))
+
+
+def build_cases(fs_root: str) -> dict:
+    os.environ["TELEMETRY_FS_ROOT"] = fs_root
+    # Forced off: the data_manager cases would time real DynamoDB writes.
+    os.environ["DDB_ENABLED"] = "0"
+    os.environ.setdefault("COMMAND_LISTENER_ENV", os.devnull)
+    import command_listener
+    import data_manager as dm
+    import jetson_telemetry as telemetry
+    import relay_emulator
+    import service_metrics
+
+    client = NullClient()
+    topics = dm.SOURCE_TOPICS
+    messages = {
+        "people": Message(topics["people"], {"count": 2}),
+        "temperature": Message(topics["temperature"], {"celsius": 52.5}),
+        "gpu": Message(topics["gpu"], {"percent": 43.7}),
+        "fps": Message(topics["fps"], {"fps": {"0": 29.97, "1": 30.01}, "avg": {"0": 29.9, "1": 30.0}}),
+        "relay_status": Message(dm.RELAY_STATUS_TOPIC, {"id": "dm-0-0", "state": "off"}),
+    }
+    ddb_item = {"metric": "fps", "ts": 1767225600000, "type": "fps", "fps": {"0": 29.97, "1": 30.01}, "min": 29.97}
+    command_json = json.dumps({"command": "start pipeline", "source": "telegram", "id": "tg-1-2", "ts": 1767225600000})
+    collector = telemetry.SampleCollector()
+    cpu, mem, rails = telemetry.CpuReader(), telemetry.MemReader(), telemetry.PowerRailReader()
+    registry = service_metrics.Registry("microbench")
+    counter = registry.counter("bench_total", "", ("topic",))
+    histogram = registry.histogram("bench_seconds", "", ("topic",))
+    instrumented = NullClient()
+    instrumented.on_message = lambda c, u, m: None
+    registry.instrument(instrumented)
+    people = messages["people"]
+
+    cases = {f"data_manager.on_message[{name}]": (lambda m=msg: dm.on_message(client, None, m)) for name, msg in messages.items()}
+    cases.update(
+        {
+            "data_manager.normalize_for_ddb": lambda: dm.normalize_for_ddb(ddb_item),
+            "data_manager.round_half_down": lambda: dm.round_half_down(2.5),
+            "data_manager.to_number[str]": lambda: dm.to_number("42.5"),
+            "data_manager.to_number[float]": lambda: dm.to_number(42.5),
+            "relay_emulator.normalize_state[str]": lambda: relay_emulator.normalize_state(" ON "),
+            "relay_emulator.normalize_state[bool]": lambda: relay_emulator.normalize_state(True),
+            "command_listener.extract_command_text[json]": lambda: command_listener.extract_command_text(command_json),
+            "command_listener.extract_command_text[text]": lambda: command_listener.extract_command_text("stop"),
+            "telemetry.read_gpu_usage_percent": telemetry.read_gpu_usage_percent,
+            "telemetry.read_temperature_c": telemetry.read_temperature_c,
+            "telemetry.CpuReader.read": cpu.read,
+            "telemetry.MemReader.read": mem.read,
+            "telemetry.PowerRailReader.read": rails.read,
+            "telemetry.SampleCollector.collect": lambda: collector.collect(1767225600000, 43.7, 47.0),
+            "service_metrics.Counter.inc": lambda: counter.inc("deepstream/person_count"),
+            "service_metrics.Histogram.observe": lambda: histogram.observe(0.00042, "deepstream/person_count"),
+            "service_metrics.instrument[on_message]": lambda: instrumented.on_message(instrumented, None, people),
+            "service_metrics.instrument[publish]": lambda: instrumented.publish("ui/metrics/fps", "{}"),
+        }
+    )
+    return cases
+
+
+def measure(fn, repeat: int, min_time: float) -> dict:
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 5 or number >= 1 << 24:
+            break
+        number *= 4
+    number = max(1, int(number * (min_time / max(elapsed, 1e-9))))
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - started) / number * 1e9)
+    return {"ns_per_op": round(statistics.median(runs), 1), "min_ns": round(min(runs), 1), "number": number}
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> bool:
+    with open(baseline_path, "r", encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    if baseline.get("machine") != machine_info():
+        print(f"[microbench] note: baseline is from {baseline.get('machine')}")
+    regressed = False
+    print(f"{'case':<48} {'baseline':>10} {'now':>10} {'delta':>8}")
+    for name, result in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            print(f"{name:<48} {'-':>10} {result['ns_per_op']:>10.1f} {'new':>8}")
+            continue
+        delta = (result["ns_per_op"] - base["ns_per_op"]) / base["ns_per_op"] * 100.0
+        flag = ""
+        if delta > threshold:
+            flag, regressed = "  REGRESSION", True
+        print(f"{name:<48} {base['ns_per_op']:>10.1f} {result['ns_per_op']:>10.1f} {delta:>+7.1f}%{flag}")
+    return regressed
+
+
+def machine_info() -> dict:
+    return {"python": platform.python_version(), "machine": platform.machine(), "node": platform.node()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only cases containing this text")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+    parser.add_argument("--save", help="write the results as a baseline file")
+    parser.add_argument("--compare", help="baseline file to compare against; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent slowdown counted as a regression")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="microbench-fs-") as fs_root:
+        make_fake_fs(fs_root)
+        cases = {name: fn for name, fn in build_cases(fs_root).items() if args.filter in name}
+        for name, fn in cases.items():
+            results[name] = measure(fn, args.repeat, args.min_time)
+            if not args.compare:
+                print(f"{name:<48} {results[name]['ns_per_op']:>10.1f} ns/op (min {results[name]['min_ns']:.1f})")
+
+    data = {"benchmark": "microbench", "machine": machine_info(), "cases": results}
+    benchlib.write_json(args.json, data)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        benchlib.write_json(args.save, data)
+        print(f"[microbench] baseline saved to {args.save}")
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
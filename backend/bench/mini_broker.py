@@ -0,0 +1,304 @@
+"""
+Minimal in-process MQTT 3.1.1 broker for benchmarks.
+
+Supports CONNECT/PUBLISH (QoS 0 and 1)/SUBSCRIBE/UNSUBSCRIBE/PING/DISCONNECT,
+'+' and '#' wildcards and retained messages. Runs an asyncio loop on a
+background thread so a benchmark can start it next to its clients:
+
+    broker = MiniBroker(port=0).start()
+    ... connect clients to 127.0.0.1:broker.port ...
+    broker.stop()
+
+Pass an ssl.SSLContext for TLS. Clients connecting with clean_session=False
+keep their subscriptions across connections, and QoS 1 messages for them are
+queued while they are offline (in-flight messages are not redelivered).
+
+Or standalone: python3 backend/bench/mini_broker.py --port 1883
+"""
+
+import argparse
+import asyncio
+import collections
+import ssl
+import struct
+import threading
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+OFFLINE_QUEUE_LIMIT = 1000
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    f_parts = topic_filter.split("/")
+    t_parts = topic.split("/")
+    for i, part in enumerate(f_parts):
+        if part == "#":
+            return True
+        if i >= len(t_parts):
+            return False
+        if part != "+" and part != t_parts[i]:
+            return False
+    return len(f_parts) == len(t_parts)
+
+
+def encode_length(length: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+
+def encode_str(value: str) -> bytes:
+    raw = value.encode("utf-8")
+    return struct.pack("!H", len(raw)) + raw
+
+
+def packet(ptype: int, flags: int, body: bytes) -> bytes:
+    return bytes([(ptype << 4) | flags]) + encode_length(len(body)) + body
+
+
+class Session:
+    def __init__(self, broker: "MiniBroker", writer: asyncio.StreamWriter):
+        self.broker = broker
+        self.writer = writer
+        self.client_id = ""
+        self.clean = True
+        self.subscriptions: dict[str, int] = {}
+        self.next_packet_id = 1
+        self.offline: collections.deque | None = None
+
+    def send(self, data: bytes):
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(data)
+
+    def deliver(self, topic: str, payload: bytes, qos: int, retain: bool = False):
+        if self.offline is not None:
+            if qos:
+                self.offline.append((topic, payload, qos))
+            return
+        body = encode_str(topic)
+        flags = (qos << 1) | (1 if retain else 0)
+        if qos:
+            body += struct.pack("!H", self.next_packet_id)
+            self.next_packet_id = self.next_packet_id % 65535 + 1
+        self.send(packet(PUBLISH, flags, body + payload))
+
+
+class MiniBroker:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, ssl_context: ssl.SSLContext | None = None):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.sessions: set[Session] = set()
+        self.persistent: dict[str, Session] = {}
+        self.retained: dict[str, bytes] = {}
+        self.published = 0
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.server: asyncio.AbstractServer | None = None
+        self.thread: threading.Thread | None = None
+        self.ready = threading.Event()
+        self.handlers: dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    # Lifecycle -----------------------------------------------------------
+
+    def start(self) -> "MiniBroker":
+        self.thread = threading.Thread(target=self._run, name="mini-broker", daemon=True)
+        self.thread.start()
+        if not self.ready.wait(5):
+            raise RuntimeError("mini broker failed to start")
+        return self
+
+    def stop(self):
+        if self.loop and self.server and self.loop.is_running():
+            shutdown = asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+            try:
+                shutdown.result(timeout=2)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(self._serve())
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    async def _serve(self):
+        return await asyncio.start_server(self._handle, self.host, self.port, ssl=self.ssl_context)
+
+    async def _shutdown(self):
+        # Finish every connection handler before the loop stops, so none is left pending:
+        # closing its writer ends the read with EOF and the handler returns normally.
+        self.server.close()
+        handlers = dict(self.handlers)
+        for writer in handlers.values():
+            writer.close()
+        if handlers:
+            _done, pending = await asyncio.wait(handlers, timeout=1)
+            for task in pending:
+                task.cancel()
+        await self.server.wait_closed()
+
+    # Protocol ------------------------------------------------------------
+
+    async def _read_packet(self, reader: asyncio.StreamReader) -> tuple[int, int, bytes]:
+        header = (await reader.readexactly(1))[0]
+        multiplier = 1
+        length = 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await reader.readexactly(length) if length else b""
+        return header >> 4, header & 0x0F, body
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = Session(self, writer)
+        task = asyncio.current_task()
+        self.handlers[task] = writer
+        try:
+            while True:
+                ptype, flags, body = await self._read_packet(reader)
+                if ptype == CONNECT:
+                    session = self._on_connect(session, body)
+                elif ptype == PUBLISH:
+                    self._on_publish(session, flags, body)
+                elif ptype == SUBSCRIBE:
+                    self._on_subscribe(session, body)
+                elif ptype == UNSUBSCRIBE:
+                    self._on_unsubscribe(session, body)
+                elif ptype == PINGREQ:
+                    session.send(packet(PINGRESP, 0, b""))
+                elif ptype == DISCONNECT:
+                    break
+                # PUBACK from clients needs no action: no redelivery here.
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            if session.writer is writer:
+                if session.clean:
+                    self.sessions.discard(session)
+                else:
+                    # Stays subscribed; deliver() queues for it until it returns.
+                    session.writer = None
+                    session.offline = collections.deque(maxlen=OFFLINE_QUEUE_LIMIT)
+            writer.close()
+            self.handlers.pop(task, None)
+
+    def _on_connect(self, session: Session, body: bytes) -> Session:
+        proto_len = struct.unpack("!H", body[:2])[0]
+        connect_flags = body[2 + proto_len + 1]
+        pos = 2 + proto_len + 1 + 1 + 2  # protocol name, level, flags, keepalive
+        id_len = struct.unpack("!H", body[pos : pos + 2])[0]
+        client_id = body[pos + 2 : pos + 2 + id_len].decode("utf-8", errors="ignore")
+        clean = bool(connect_flags & 0x02)
+        stored = self.persistent.pop(client_id, None) if client_id else None
+        if stored is not None:
+            if stored.writer is not None:
+                stored.writer.close()  # session takeover
+            self.sessions.discard(stored)
+        if stored is not None and not clean:
+            stored.writer = session.writer
+            session = stored
+            present = 1
+        else:
+            session.client_id = client_id
+            present = 0
+        session.clean = clean
+        if not clean:
+            self.persistent[client_id] = session
+        self.sessions.add(session)
+        session.send(packet(CONNACK, 0, bytes([present, 0])))
+        queued, session.offline = session.offline, None
+        for topic, payload, qos in queued or ():
+            session.deliver(topic, payload, qos)
+        return session
+
+    def _on_publish(self, session: Session, flags: int, body: bytes):
+        qos = (flags >> 1) & 0x03
+        retain = bool(flags & 0x01)
+        topic_len = struct.unpack("!H", body[:2])[0]
+        topic = body[2 : 2 + topic_len].decode("utf-8")
+        pos = 2 + topic_len
+        if qos:
+            packet_id = body[pos : pos + 2]
+            pos += 2
+            session.send(packet(PUBACK, 0, packet_id))
+        payload = body[pos:]
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        self.published += 1
+        self.route(topic, payload, qos)
+
+    def route(self, topic: str, payload: bytes, qos: int = 0):
+        for target in list(self.sessions):
+            granted = None
+            for topic_filter, sub_qos in target.subscriptions.items():
+                if topic_matches(topic_filter, topic):
+                    granted = max(granted or 0, sub_qos)
+            if granted is not None:
+                target.deliver(topic, payload, min(qos, granted))
+
+    def _on_subscribe(self, session: Session, body: bytes):
+        packet_id = body[:2]
+        pos = 2
+        granted = bytearray()
+        new_filters = []
+        while pos < len(body):
+            f_len = struct.unpack("!H", body[pos : pos + 2])[0]
+            topic_filter = body[pos + 2 : pos + 2 + f_len].decode("utf-8")
+            qos = min(body[pos + 2 + f_len], 1)
+            pos += 3 + f_len
+            session.subscriptions[topic_filter] = qos
+            granted.append(qos)
+            new_filters.append((topic_filter, qos))
+        session.send(packet(SUBACK, 0, packet_id + bytes(granted)))
+        for topic_filter, qos in new_filters:
+            for topic, payload in self.retained.items():
+                if topic_matches(topic_filter, topic):
+                    session.deliver(topic, payload, qos, retain=True)
+
+    def _on_unsubscribe(self, session: Session, body: bytes):
+        packet_id = body[:2]
+        pos = 2
+        while pos < len(body):
+            f_len = struct.unpack("!H", body[pos : pos + 2])[0]
+            session.subscriptions.pop(body[pos + 2 : pos + 2 + f_len].decode("utf-8"), None)
+            pos += 2 + f_len
+        session.send(packet(UNSUBACK, 0, packet_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+    broker = MiniBroker(args.host, args.port).start()
+    print(f"[mini-broker] listening on {args.host}:{broker.port}")
+    try:
+        broker.thread.join()
+    except KeyboardInterrupt:
+        broker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Record live MQTT traffic to a capture file and replay it deterministically.
+
+  record  subscribe to --topics (default deepstream/#, jetson/#, ui/#,
+          actuator/#) and append every message until --seconds/--count or
+          Ctrl-C
+  replay  publish a capture back to a broker in recorded order, paced from the
+          first message and scaled by --speed (1 = real time, N = N times
+          faster, 0 = as fast as possible); reports lag against the schedule
+  info    per-topic message counts and bytes of a capture
+
+Capture format (little-endian), built so a reader can mmap the file and walk
+it without parsing or copying payloads:
+  header  8s magic "MQCAP1\\0\\0", u64 wall-clock start (ns since epoch)
+  record  u64 offset (ns since start), u16 topic length, u32 payload length,
+          u8 flags (bits 0-1 QoS, bit 2 retained), topic, payload
+The recorded QoS is the one the message was delivered with, i.e. the lower of
+the publisher's and the recorder's --qos: record with --qos 1 to replay QoS 1
+traffic as QoS 1.
+A capture cut short (e.g. the recorder was killed) is read up to the last
+complete record.
+
+    python3 backend/bench/mqtt_capture.py record --out day.mqcap --seconds 3600
+    python3 backend/bench/mqtt_capture.py replay day.mqcap --speed 10
+    python3 backend/bench/mqtt_capture.py replay day.mqcap --speed 0 --embedded
+"""
+
+import argparse
+import collections
+import mmap
+import struct
+import threading
+import time
+
+import benchlib
+import paho.mqtt.client as mqtt
+
+from mini_broker import MiniBroker
+
+MAGIC = b"MQCAP1\0\0"
+HEADER = struct.Struct("<8sQ")
+RECORD = struct.Struct("<QHIB")
+DEFAULT_TOPICS = "deepstream/#,jetson/#,ui/#,actuator/#"
+RETAIN_FLAG = 0x04
+
+
+class CaptureWriter:
+    def __init__(self, path: str):
+        self.handle = open(path, "wb", buffering=1 << 20)
+        self.start_ns = time.monotonic_ns()
+        self.handle.write(HEADER.pack(MAGIC, time.time_ns()))
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def write(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False):
+        raw_topic = topic.encode("utf-8")
+        flags = (qos & 0x03) | (RETAIN_FLAG if retain else 0)
+        header = RECORD.pack(time.monotonic_ns() - self.start_ns, len(raw_topic), len(payload), flags)
+        with self.lock:
+            self.handle.write(header + raw_topic + payload)
+            self.count += 1
+
+    def flush(self):
+        with self.lock:
+            self.handle.flush()
+
+    def close(self):
+        with self.lock:
+            self.handle.close()
+
+
+class CaptureReader:
+    """mmap-backed; records are yielded as (offset_ns, topic, payload memoryview, qos, retained)."""
+
+    def __init__(self, path: str):
+        self.handle = open(path, "rb")
+        self.map = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.start_wall_ns = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a capture file")
+        self.view = memoryview(self.map)
+
+    def __iter__(self):
+        pos, end = HEADER.size, len(self.map)
+        while pos + RECORD.size <= end:
+            offset_ns, topic_len, payload_len, flags = RECORD.unpack_from(self.map, pos)
+            body = pos + RECORD.size
+            if body + topic_len + payload_len > end:
+                break
+            topic = bytes(self.view[body : body + topic_len]).decode("utf-8")
+            payload = self.view[body + topic_len : body + topic_len + payload_len]
+            yield offset_ns, topic, payload, flags & 0x03, bool(flags & RETAIN_FLAG)
+            pos = body + topic_len + payload_len
+
+    def close(self):
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            pass  # a yielded payload view is still referenced; unmapped once it is collected
+        self.handle.close()
+
+
+def record(args):
+    writer = CaptureWriter(args.out)
+    topics = [topic.strip() for topic in args.topics.split(",") if topic.strip()]
+    client = mqtt.Client()
+    client.on_connect = lambda c, u, f, rc, p=None: [c.subscribe(topic, qos=args.qos) for topic in topics]
+    client.on_message = lambda c, u, msg: writer.write(msg.topic, msg.payload, msg.qos, msg.retain)
+    benchlib.connect_client(client, args.host, args.port)
+    print(f"[mqtt-capture] recording {', '.join(topics)} from {args.host}:{args.port} to {args.out}")
+    deadline = time.monotonic() + args.seconds if args.seconds else None
+    try:
+        while (deadline is None or time.monotonic() < deadline) and (not args.count or writer.count < args.count):
+            time.sleep(0.2)
+            writer.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        writer.close()
+    print(f"[mqtt-capture] {writer.count} messages written")
+
+
+def replay(args):
+    reader = CaptureReader(args.capture)
+    broker = None
+    host, port = args.host, args.port
+    if args.embedded:
+        broker = MiniBroker(port=args.port).start()
+        host, port = "127.0.0.1", broker.port
+        print(f"[mqtt-capture] embedded broker on port {port}")
+    client = mqtt.Client()
+    client.max_queued_messages_set(0)
+    benchlib.connect_client(client, host, port)
+
+    lags_ms = []
+    sent = skipped = 0
+    last = None
+    started = time.perf_counter()
+    try:
+        for _ in range(args.loops):
+            loop_start, first_ns = time.perf_counter(), None
+            for offset_ns, topic, payload, qos, retained in reader:
+                if retained and not args.retained:
+                    # Broker state delivered when the recorder subscribed, not live traffic.
+                    skipped += 1
+                    continue
+                if args.speed > 0:
+                    first_ns = offset_ns if first_ns is None else first_ns
+                    due = loop_start + (offset_ns - first_ns) / 1e9 / args.speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    lags_ms.append((time.perf_counter() - due) * 1000.0)
+                last = client.publish(topic, bytes(payload), qos=qos if args.qos is None else args.qos)
+                sent += 1
+        if last is not None:
+            last.wait_for_publish()
+    finally:
+        elapsed = time.perf_counter() - started
+        client.loop_stop()
+        client.disconnect()
+        reader.close()
+        if broker:
+            broker.stop()
+
+    lag = benchlib.summarize(lags_ms)
+    rate = sent / elapsed if elapsed > 0 else 0.0
+    print(
+        f"[mqtt-capture] replayed {sent} messages ({skipped} retained skipped) in {elapsed:.2f}s, {rate:.0f} msg/s; "
+        f"lag p50 {benchlib.fmt_ms(lag['p50'])} p99 {benchlib.fmt_ms(lag['p99'])} max {benchlib.fmt_ms(lag['max'])} ms"
+    )
+    benchlib.write_json(
+        args.json,
+        {
+            "benchmark": "mqtt_replay",
+            "capture": args.capture,
+            "speed": args.speed,
+            "sent": sent,
+            "skipped_retained": skipped,
+            "seconds": round(elapsed, 3),
+            "msgs_per_s": round(rate, 1),
+            "lag_ms": lag,
+        },
+    )
+
+
+def info(args):
+    reader = CaptureReader(args.capture)
+    counts: collections.Counter = collections.Counter()
+    sizes: collections.Counter = collections.Counter()
+    first = last = None
+    for offset_ns, topic, payload, _, _ in reader:
+        counts[topic] += 1
+        sizes[topic] += len(payload)
+        first = offset_ns if first is None else first
+        last = offset_ns
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(reader.start_wall_ns / 1e9))
+    duration = (last - first) / 1e9 if counts else 0.0
+    reader.close()
+    print(f"[mqtt-capture] {args.capture}: {sum(counts.values())} messages over {duration:.1f}s, started {started}")
+    for topic, count in counts.most_common():
+        print(f"{count:>9} {sizes[topic]:>12} B  {topic}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    rec = sub.add_parser("record", help="capture live traffic")
+    rec.add_argument("--out", required=True, help="capture file to write")
+    rec.add_argument("--topics", default=DEFAULT_TOPICS, help="comma-separated subscriptions")
+    rec.add_argument("--seconds", type=float, default=0.0, help="stop after this long (0 = until Ctrl-C)")
+    rec.add_argument("--count", type=int, default=0, help="stop after this many messages")
+    rec.add_argument("--qos", type=int, default=0, help="subscription QoS (caps the QoS recorded)")
+    rec.set_defaults(func=record)
+
+    rep = sub.add_parser("replay", help="publish a capture")
+    rep.add_argument("capture")
+    rep.add_argument("--speed", type=float, default=1.0, help="1 = recorded pacing, N = N times faster, 0 = max")
+    rep.add_argument("--loops", type=int, default=1, help="replay the capture this many times")
+    rep.add_argument("--qos", type=int, help="publish QoS (default: as delivered to the recorder)")
+    rep.add_argument("--retained", action="store_true", help="also replay retained messages seen at subscribe")
+    rep.add_argument("--embedded", action="store_true", help="replay into an embedded broker on --port (0 = any)")
+    rep.add_argument("--json", help="write results to this file")
+    rep.set_defaults(func=replay)
+
+    inf = sub.add_parser("info", help="summarize a capture")
+    inf.add_argument("capture")
+    inf.set_defaults(func=info)
+
+    for sub_parser in (rec, rep):
+        sub_parser.add_argument("--host", default="127.0.0.1")
+        sub_parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Pipeline FPS stability under helper load, with and without process profiles.
+
+A synthetic pipeline process does a fixed amount of CPU work per frame at a
+target frame rate and writes DeepStream-style "**PERF:" lines, which are read
+back with the perf-log parser (deepstream_perf.PerfParser). Busy-looping
+helper processes stand in for data_manager/telemetry bursts. Three phases:
+  idle      pipeline alone
+  load      pipeline + helpers, default scheduling
+  profiled  pipeline + helpers, both launched through process_profiles.py
+Reports mean/p5/min FPS, stdev and the share of intervals below 90% of target.
+
+    python3 backend/bench/profile_fps.py --seconds 10 --helpers 4
+    python3 backend/bench/profile_fps.py --profiles my_profiles.json   # keys "pipeline" and "helper"
+
+Without --profiles the pipeline gets the upper half of the available CPUs and
+the helpers the lower half at nice 19 / ionice idle (on a single CPU only the
+priorities differ).
+"""
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchlib
+
+from deepstream_perf import PerfParser
+
+PROFILE_WRAPPER = os.path.join(benchlib.MQTT_DIR, "process_profiles.py")
+
+
+def run_pipeline(args):
+    """Child mode: emulate DeepStream at --fps, 'work_ms' of CPU per frame."""
+    frame = 1.0 / args.fps
+    with open(args.log, "a", encoding="utf-8", buffering=1) as log:
+        log.write("**PERF:  " + "\t".join(f"FPS {i} (Avg)" for i in range(args.streams)) + "\n")
+        start = time.perf_counter()
+        window_start = start
+        frames = total = 0
+        next_frame = start
+        while time.perf_counter() - start < args.seconds:
+            # CPU time, not wall time: under contention a frame takes longer.
+            busy_until = time.process_time() + args.work_ms / 1000.0
+            while time.process_time() < busy_until:
+                pass
+            frames += 1
+            total += 1
+            next_frame += frame
+            now = time.perf_counter()
+            if next_frame > now:
+                time.sleep(next_frame - now)
+            else:
+                next_frame = now  # behind: no catch-up burst, like a live source
+            now = time.perf_counter()
+            if now - window_start >= args.interval:
+                fps = frames / (now - window_start)
+                avg = total / (now - start)
+                log.write("**PERF:  " + "\t".join(f"{fps:.2f} ({avg:.2f})" for _ in range(args.streams)) + "\n")
+                window_start, frames = now, 0
+
+
+def run_helper(args):
+    """Child mode: burn 'duty' of a CPU in 10 ms slices until killed."""
+    while True:
+        busy_until = time.perf_counter() + 0.01 * args.duty
+        while time.perf_counter() < busy_until:
+            pass
+        if args.duty < 1.0:
+            time.sleep(0.01 * (1.0 - args.duty))
+
+
+def default_profiles() -> dict:
+    cpus = sorted(os.sched_getaffinity(0))
+    half = len(cpus) // 2
+    pipeline_cpus, helper_cpus = (cpus[half:], cpus[:half]) if half else (cpus, cpus)
+    return {
+        "pipeline": {"cpus": pipeline_cpus},
+        "helper": {"cpus": helper_cpus, "nice": 19, "ionice": "idle"},
+    }
+
+
+def child_command(name: str, extra: list[str], profiled: bool) -> list[str]:
+    command = [sys.executable, os.path.abspath(__file__), f"--{name}"] + extra
+    if profiled:
+        command = [sys.executable, PROFILE_WRAPPER, name, "--"] + command
+    return command
+
+
+def run_phase(args, label: str, helpers: int, profiles: dict | None, workdir: str) -> dict:
+    env = os.environ.copy()
+    if profiles is not None:
+        env["PROCESS_PROFILES"] = json.dumps(profiles)
+    log_path = os.path.join(workdir, f"{label}.perf.log")
+    helper_procs = [
+        subprocess.Popen(child_command("helper", ["--duty", str(args.duty)], profiles is not None), env=env)
+        for _ in range(helpers)
+    ]
+    try:
+        time.sleep(0.3)  # helpers reach full load first
+        pipeline_args = [
+            "--fps", str(args.fps), "--work-ms", str(args.work_ms), "--seconds", str(args.seconds),
+            "--interval", str(args.interval), "--streams", "1", "--log", log_path,
+        ]
+        subprocess.run(child_command("pipeline", pipeline_args, profiles is not None), env=env, check=True)
+    finally:
+        for proc in helper_procs:
+            proc.terminate()
+        for proc in helper_procs:
+            proc.wait(timeout=5)
+
+    parser = PerfParser()
+    samples = []
+    with open(log_path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            perf = parser.feed(line)
+            if perf:
+                samples.extend(perf["fps"].values())
+    samples = samples[1:]  # first window includes process start-up
+    ordered = sorted(samples)
+    mean = sum(samples) / len(samples) if samples else 0.0
+    return {
+        "phase": label,
+        "helpers": helpers,
+        "intervals": len(samples),
+        "fps_mean": round(mean, 2),
+        "fps_p5": benchlib.percentile(ordered, 5),
+        "fps_min": ordered[0] if ordered else None,
+        "fps_stdev": round(math.sqrt(sum((v - mean) ** 2 for v in samples) / len(samples)), 3) if samples else None,
+        "below_90pct": round(sum(1 for v in samples if v < 0.9 * args.fps) / len(samples), 3) if samples else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fps", type=float, default=30.0, help="pipeline target frame rate")
+    parser.add_argument("--work-ms", type=float, default=14.0, help="pipeline CPU work per frame")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration per phase")
+    parser.add_argument("--interval", type=float, default=0.5, help="perf measurement interval")
+    parser.add_argument("--helpers", type=int, default=os.cpu_count() or 1, help="helper load processes")
+    parser.add_argument("--duty", type=float, default=1.0, help="CPU share each helper burns")
+    parser.add_argument("--profiles", help="JSON file with 'pipeline' and 'helper' profiles")
+    parser.add_argument("--json", help="write results to this file")
+    # Child modes.
+    parser.add_argument("--pipeline", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--helper", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--streams", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--log", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.pipeline:
+        run_pipeline(args)
+        return
+    if args.helper:
+        run_helper(args)
+        return
+
+    if args.profiles:
+        with open(args.profiles, "r", encoding="utf-8") as handle:
+            profiles = json.load(handle)
+    else:
+        profiles = default_profiles()
+    print(f"[profile-fps-bench] target {args.fps:.0f} fps, {args.work_ms} ms/frame, {args.helpers} helpers")
+    print(f"[profile-fps-bench] profiles {json.dumps(profiles)}")
+    print(f"{'phase':>9} {'mean':>7} {'p5':>7} {'min':>7} {'stdev':>7} {'<90%':>6}")
+    results = []
+    # The perf logs are only read back by run_phase.
+    with tempfile.TemporaryDirectory(prefix="profile-fps-bench-") as workdir:
+        for label, helpers, phase_profiles in (
+            ("idle", 0, None),
+            ("load", args.helpers, None),
+            ("profiled", args.helpers, profiles),
+        ):
+            result = run_phase(args, label, helpers, phase_profiles, workdir)
+            results.append(result)
+            print(
+                f"{label:>9} {result['fps_mean']:>7.2f} {result['fps_p5'] or 0:>7.2f} {result['fps_min'] or 0:>7.2f} "
+                f"{result['fps_stdev'] or 0:>7.3f} {result['below_90pct'] or 0:>6.1%}"
+            )
+    benchlib.write_json(
+        args.json,
+        {
+            "benchmark": "profile_fps",
+            "fps": args.fps,
+            "work_ms": args.work_ms,
+            "profiles": profiles,
+            "results": results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
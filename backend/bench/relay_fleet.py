@@ -0,0 +1,157 @@
+"""
+Relay fleet load test.
+
+Starts relay_emulator.py in fleet mode (RELAY_FLEET_SIZE relays) against a
+broker, publishes commands to random relays at a fixed rate and waits for the
+matching actuator/relay_status/<id> message (correlated by "id"). Reports
+command→status latency percentiles, failures and commands with no status.
+
+    python3 backend/bench/relay_fleet.py --relays 2000 --rate 2000 --seconds 5
+    python3 backend/bench/relay_fleet.py --host 127.0.0.1 --port 1883 --delay-ms 5,50 --drop 0.01
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import benchlib
+import paho.mqtt.client as mqtt
+
+from mini_broker import MiniBroker
+
+
+def start_emulator(host: str, port: int, args) -> subprocess.Popen:
+    delay_min, _, delay_max = args.delay_ms.partition(",")
+    env = os.environ.copy()
+    env.update(
+        {
+            "MQTT_URL": f"mqtt://{host}:{port}",
+            "RELAY_COMMAND_TOPIC": args.command_topic,
+            "RELAY_STATUS_TOPIC": args.status_topic,
+            "RELAY_FLEET_SIZE": str(args.relays),
+            "RELAY_DELAY_MIN_MS": delay_min or "0",
+            "RELAY_DELAY_MAX_MS": delay_max or delay_min or "0",
+            "RELAY_FAILURE_PROB": str(args.failure),
+            "RELAY_DROP_PROB": str(args.drop),
+            "RELAY_STATS_SECONDS": "0",
+            "PYTHONUNBUFFERED": "1",
+        }
+    )
+    script = os.path.join(benchlib.MQTT_DIR, "relay_emulator.py")
+    return subprocess.Popen([sys.executable, script], env=env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", help="broker host (default: start an embedded broker)")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--relays", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=1000.0, help="commands per second across the fleet")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--delay-ms", default="0", help="actuation delay 'min[,max]' in ms")
+    parser.add_argument("--failure", type=float, default=0.0, help="actuation failure probability")
+    parser.add_argument("--drop", type=float, default=0.0, help="probability a command gets no status")
+    parser.add_argument("--timeout", type=float, default=2.0, help="seconds to wait for outstanding statuses")
+    parser.add_argument("--command-topic", default="actuator/relay")
+    parser.add_argument("--status-topic", default="actuator/relay_status")
+    parser.add_argument("--no-spawn", action="store_true", help="use an already running fleet emulator")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    broker = None
+    host, port = args.host, args.port
+    if not host:
+        broker = MiniBroker().start()
+        host, port = "127.0.0.1", broker.port
+
+    emulator = None if args.no_spawn else start_emulator(host, port, args)
+    sent: dict[int, float] = {}
+    latencies: list[float] = []
+    failed = 0
+    lock = threading.Lock()
+    subscribed = threading.Event()
+
+    def on_message(client, userdata, msg):
+        nonlocal failed
+        now = time.perf_counter()
+        try:
+            data = json.loads(msg.payload)
+            cmd_id = int(data["id"])
+        except Exception:
+            return
+        with lock:
+            started = sent.pop(cmd_id, None)
+            if started is None:
+                return
+            latencies.append((now - started) * 1000.0)
+            if not data.get("ok", True):
+                failed += 1
+
+    client = mqtt.Client()
+    client.on_message = on_message
+    client.on_subscribe = lambda *a: subscribed.set()
+    try:
+        benchlib.connect_client(client, host, port)
+        client.subscribe(f"{args.status_topic}/+")
+        subscribed.wait(5)
+        # Give the spawned emulator time to connect and subscribe.
+        time.sleep(1.0 if emulator else 0.0)
+
+        count = int(args.rate * args.seconds)
+        interval = 1.0 / args.rate
+        start = time.perf_counter()
+        for cmd_id in range(count):
+            delay = start + cmd_id * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            relay = random.randrange(args.relays)
+            payload = json.dumps(
+                {"state": random.choice(("on", "off")), "id": cmd_id, "source": "bench", "ts": int(time.time() * 1000)}
+            )
+            with lock:
+                sent[cmd_id] = time.perf_counter()
+            client.publish(f"{args.command_topic}/{relay}", payload, qos=0)
+        achieved = count / (time.perf_counter() - start)
+
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            with lock:
+                if not sent:
+                    break
+            time.sleep(0.05)
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        if emulator:
+            emulator.terminate()
+            emulator.wait(timeout=5)
+        if broker:
+            broker.stop()
+
+    stats = benchlib.summarize(latencies)
+    result = {
+        "benchmark": "relay_fleet",
+        "relays": args.relays,
+        "rate": args.rate,
+        "achieved_rate": round(achieved, 1),
+        "sent": count,
+        "acked": len(latencies),
+        "failed": failed,
+        "no_status": len(sent),
+        "latency_ms": stats,
+    }
+    print(
+        f"[relay-fleet] relays={args.relays} sent={count} ({result['achieved_rate']}/s) acked={len(latencies)} "
+        f"failed={failed} no_status={len(sent)} p50={benchlib.fmt_ms(stats['p50'])}ms "
+        f"p90={benchlib.fmt_ms(stats['p90'])}ms p99={benchlib.fmt_ms(stats['p99'])}ms max={benchlib.fmt_ms(stats['max'])}ms"
+    )
+    benchlib.write_json(args.json, result)
+
+
+if __name__ == "__main__":
+    main()
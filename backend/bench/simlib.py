@@ -0,0 +1,105 @@
+"""
+Virtual time and an in-process MQTT stand-in for simulations.
+
+VirtualClock is a callable returning the simulated epoch seconds, so it can
+replace a module's clock (e.g. data_manager.clock). Scheduler is a
+discrete-event loop: callbacks run in time order and the clock jumps straight
+to the next one, so idle time costs nothing.
+
+FakeBroker/FakeClient cover the paho subset the services use (subscribe,
+publish, on_message). Delivery is synchronous and in subscription order, so a
+run is fully deterministic; a participant that answers after a delay (e.g. a
+relay) schedules its publish on the Scheduler instead of publishing from
+inside on_message.
+"""
+
+import hashlib
+import heapq
+import itertools
+
+from mini_broker import topic_matches
+
+
+class VirtualClock:
+    def __init__(self, start: float):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Scheduler:
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.queue: list = []
+        self.seq = itertools.count()
+        self.events = 0
+
+    def at(self, when: float, callback, *args):
+        heapq.heappush(self.queue, (when, next(self.seq), callback, args))
+
+    def after(self, delay: float, callback, *args):
+        self.at(self.clock.now + delay, callback, *args)
+
+    def every(self, interval: float, callback, start: float | None = None):
+        """Call 'callback()' every 'interval' seconds from 'start' (default: one interval from now)."""
+
+        def run():
+            callback()
+            self.after(interval, run)
+
+        self.at(self.clock.now + interval if start is None else start, run)
+
+    def run_until(self, end: float):
+        while self.queue and self.queue[0][0] <= end:
+            when, _, callback, args = heapq.heappop(self.queue)
+            self.clock.now = max(self.clock.now, when)
+            callback(*args)
+            self.events += 1
+        self.clock.now = max(self.clock.now, end)
+
+
+class FakeMessage:
+    def __init__(self, topic: str, payload: bytes, qos: int, retain: bool):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+
+class FakeClient:
+    def __init__(self, broker: "FakeBroker", name: str):
+        self.broker = broker
+        self.name = name
+        self.subscriptions: list[str] = []
+        self.on_message = None
+        self.userdata = None
+
+    def subscribe(self, topic: str, qos: int = 0):
+        if topic not in self.subscriptions:
+            self.subscriptions.append(topic)
+
+    def publish(self, topic: str, payload=b"", qos: int = 0, retain: bool = False):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        self.broker.route(FakeMessage(topic, payload, qos, retain))
+
+
+class FakeBroker:
+    def __init__(self):
+        self.clients: list[FakeClient] = []
+        self.messages = 0
+        # Every routed message, in order: equal digests mean identical traffic.
+        self.digest = hashlib.sha256()
+
+    def client(self, name: str) -> FakeClient:
+        client = FakeClient(self, name)
+        self.clients.append(client)
+        return client
+
+    def route(self, msg: FakeMessage):
+        self.messages += 1
+        self.digest.update(msg.topic.encode("utf-8") + b"\0" + msg.payload + b"\n")
+        for client in self.clients:
+            if client.on_message and any(topic_matches(f, msg.topic) for f in client.subscriptions):
+                client.on_message(client, client.userdata, msg)
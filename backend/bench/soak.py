@@ -0,0 +1,408 @@
+"""
+Soak test: run the Python services for hours under load and look for leaks.
+
+Starts the selected --services (data_manager, relay_emulator,
+person_led_mqtt with the mock GPIO backend, jetson_telemetry against a
+generated fake sysfs/procfs tree, command_listener) as child processes against
+an embedded broker (or --host/--port) and drives them with either a capture
+replayed in a loop (--capture, see mqtt_capture.py; --speed scales it) or
+synthetic traffic: person counts with visits (LED toggles and blinks),
+temperature/GPU readings that cross the alarm thresholds (relay commands) and
+FPS samples, plus an unknown command now and then for command_listener.
+
+Every --sample-seconds it reads VmRSS, Threads and the open file descriptor
+count from /proc/<pid> and the size of each service's log. After --warmup
+seconds (imports, caches and pools filling up) it fits a least-squares slope
+per service and flags RSS growth above --max-rss-slope (KiB/h), thread or fd
+growth above --max-thread-slope/--max-fd-slope (per hour) and services that
+exited. With --tracemalloc each service runs under tracemalloc and dumps a
+snapshot every --snapshot-seconds; the first snapshot after warm-up is diffed
+against the last one and the lines that grew most are listed, which points at
+the allocation site when RSS keeps climbing.
+
+Slopes only mean something over hours; short runs are for checking the setup.
+Service logs and snapshots go to a temporary directory that is removed at the
+end unless --keep is given.
+
+    python3 backend/bench/soak.py --hours 8 --tracemalloc --json soak.json
+    python3 backend/bench/soak.py --hours 2 --capture day.mqcap --speed 10
+    python3 backend/bench/soak.py --hours 0.05 --warmup 60 --services data_manager,person_led_mqtt
+
+Linux only (/proc). Exits 1 when anything is flagged.
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import benchlib
+import paho.mqtt.client as mqtt
+
+from microbench import make_fake_fs
+from mini_broker import MiniBroker
+from mqtt_capture import CaptureReader
+
+SERVICES = ("data_manager", "relay_emulator", "person_led_mqtt", "jetson_telemetry", "command_listener")
+# Allocations made by the tracing itself or by the import system are not the services' own.
+TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def child_main(script: str, snapshot_dir: str, interval: float, frames: int):
+    """Run 'script' as __main__ under tracemalloc, dumping a snapshot every 'interval' seconds."""
+    tracemalloc.start(frames)
+    started = time.monotonic()
+
+    def dump():
+        while True:
+            time.sleep(interval)
+            elapsed = int(time.monotonic() - started)
+            path = os.path.join(snapshot_dir, f"snap-{elapsed:08d}.tracemalloc")
+            tracemalloc.take_snapshot().dump(path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+    threading.Thread(target=dump, name="soak-tracemalloc", daemon=True).start()
+    sys.argv = [script]
+    sys.path.insert(0, os.path.dirname(script))
+    runpy.run_path(script, run_name="__main__")
+
+
+def start_services(names: list[str], host: str, port: int, workdir: str, args) -> dict:
+    fs_root = os.path.join(workdir, "fs")
+    make_fake_fs(fs_root)
+    env = os.environ.copy()
+    env.update(
+        {
+            "MQTT_URL": f"mqtt://{host}:{port}",
+            "MQTT_HOST": host,
+            "MQTT_PORT": str(port),
+            "DDB_ENABLED": "0",
+            "DDB_HEARTBEAT_PATH": os.path.join(workdir, "ddb_heartbeat.json"),
+            "LED_GPIO_BACKEND": "mock",
+            "TELEMETRY_FS_ROOT": fs_root,
+            "COMMAND_LISTENER_ENV": os.devnull,
+            "PYTHONUNBUFFERED": "1",
+        }
+    )
+    services = {}
+    for name in names:
+        script = os.path.join(benchlib.MQTT_DIR, f"{name}.py")
+        command = [sys.executable, script]
+        snapshot_dir = None
+        if args.tracemalloc:
+            snapshot_dir = os.path.join(workdir, f"{name}.snapshots")
+            os.makedirs(snapshot_dir)
+            command = [sys.executable, os.path.abspath(__file__), "--child", script, snapshot_dir,
+                       str(args.snapshot_seconds), str(args.tracemalloc_frames)]
+        log_path = os.path.join(workdir, f"{name}.log")
+        log = open(log_path, "w", encoding="utf-8")
+        proc = subprocess.Popen(command, env=env, stdout=log, stderr=log)
+        services[name] = {"proc": proc, "log": log_path, "snapshots": snapshot_dir, "samples": []}
+    return services
+
+
+def read_proc(pid: int) -> dict | None:
+    """VmRSS (KiB), thread count and open fds of a live process, None once it is gone."""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as handle:
+            fields = dict(line.split(":", 1) for line in handle if ":" in line)
+        fds = len(os.listdir(f"/proc/{pid}/fd"))
+    except (FileNotFoundError, ProcessLookupError):
+        return None
+    return {"rss_kb": int(fields["VmRSS"].split()[0]), "threads": int(fields["Threads"]), "fds": fds}
+
+
+def slope_per_hour(points: list[tuple[float, float]]) -> float | None:
+    """Least-squares slope of (seconds, value) points, in value per hour."""
+    if len(points) < 2:
+        return None
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    if var_t == 0:
+        return None
+    cov = sum((t - mean_t) * (v - mean_v) for t, v in points)
+    return cov / var_t * 3600.0
+
+
+class SyntheticLoad(threading.Thread):
+    """Person visits, alarm-crossing temperature/GPU, FPS and stray commands, seeded."""
+
+    def __init__(self, client, rate: float, seed: int):
+        super().__init__(name="soak-load", daemon=True)
+        self.client = client
+        self.rate = rate
+        self.rng = random.Random(seed)
+        self.stop = threading.Event()
+        self.sent = 0
+
+    def publish(self, topic: str, data):
+        payload = data if isinstance(data, str) else json.dumps(data)
+        self.client.publish(topic, payload)
+        self.sent += 1
+
+    def run(self):
+        rng = self.rng
+        people, visit_until, tick = 0, 0.0, 0
+        interval = 1.0 / self.rate
+        next_due = time.perf_counter()
+        while not self.stop.is_set():
+            now = time.monotonic()
+            if now >= visit_until:
+                people = rng.randint(1, 4) if rng.random() < 0.3 else 0
+                visit_until = now + rng.uniform(2.0, 20.0)
+            self.publish("deepstream/person_count", {"count": people})
+            if tick % 5 == 0:
+                # One reading in ten is hot, so alarms and relay commands keep flipping.
+                hot = rng.random() < 0.1
+                self.publish("jetson/internal/temperature", {"celsius": round(rng.uniform(82, 90) if hot else rng.uniform(45, 60), 2)})
+                self.publish("jetson/internal/gpu_usage", {"percent": round(rng.uniform(96, 100) if hot else rng.uniform(20, 60), 1)})
+                self.publish("deepstream/perf", {"fps": {"0": round(rng.gauss(30, 0.5), 2)}})
+            if tick % 50 == 0:
+                self.publish("jetson/command", "soak")
+            tick += 1
+            next_due += interval
+            delay = next_due - time.perf_counter()
+            if delay > 0:
+                self.stop.wait(delay)
+            else:
+                next_due = time.perf_counter()
+
+
+class ReplayLoad(threading.Thread):
+    """Replays a capture in a loop at 'speed' (0 = as fast as possible)."""
+
+    def __init__(self, client, path: str, speed: float):
+        super().__init__(name="soak-replay", daemon=True)
+        self.client = client
+        self.path = path
+        self.speed = speed
+        self.stop = threading.Event()
+        self.sent = 0
+        self.loops = 0
+
+    def run(self):
+        reader = CaptureReader(self.path)
+        try:
+            while not self.stop.is_set():
+                loop_start, first_ns = time.perf_counter(), None
+                for offset_ns, topic, payload, qos, retained in reader:
+                    if self.stop.is_set():
+                        break
+                    if retained:
+                        continue
+                    if self.speed > 0:
+                        first_ns = offset_ns if first_ns is None else first_ns
+                        delay = loop_start + (offset_ns - first_ns) / 1e9 / self.speed - time.perf_counter()
+                        if delay > 0 and self.stop.wait(delay):
+                            break
+                    self.client.publish(topic, bytes(payload), qos=qos)
+                    self.sent += 1
+                self.loops += 1
+                if self.sent == 0:
+                    break  # only retained messages; nothing to loop over
+        finally:
+            reader.close()
+
+
+def snapshot_diff(snapshot_dir: str, warmup: float, top: int) -> dict | None:
+    paths = sorted(glob.glob(os.path.join(snapshot_dir, "snap-*.tracemalloc")))
+    elapsed = [int(os.path.basename(path)[5:13]) for path in paths]
+    after = [path for path, seconds in zip(paths, elapsed) if seconds >= warmup]
+    if len(after) < 2:
+        return None
+    first = tracemalloc.Snapshot.load(after[0]).filter_traces(TRACE_FILTERS)
+    last = tracemalloc.Snapshot.load(after[-1]).filter_traces(TRACE_FILTERS)
+    stats = [stat for stat in last.compare_to(first, "lineno") if stat.size_diff > 0][:top]
+    return {
+        "from": os.path.basename(after[0]),
+        "to": os.path.basename(after[-1]),
+        "traced_kb": round(sum(stat.size for stat in last.statistics("filename")) / 1024.0, 1),
+        "top": [
+            {
+                "where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_diff_kb": round(stat.size_diff / 1024.0, 1),
+                "count_diff": stat.count_diff,
+            }
+            for stat in stats
+        ],
+    }
+
+
+def analyze(name: str, service: dict, args) -> dict:
+    samples = service["samples"]
+    steady = [s for s in samples if s["t"] >= args.warmup]
+    first, last = (steady[0], steady[-1]) if steady else (None, None)
+    result = {
+        "service": name,
+        "samples": len(samples),
+        "exit_code": service["proc"].poll(),
+        "rss_kb": {"start": first and first["rss_kb"], "end": last and last["rss_kb"],
+                   "max": max((s["rss_kb"] for s in samples), default=None)},
+        "threads": {"start": first and first["threads"], "end": last and last["threads"],
+                    "max": max((s["threads"] for s in samples), default=None)},
+        "fds": {"start": first and first["fds"], "end": last and last["fds"]},
+        "rss_slope_kb_h": slope_per_hour([(s["t"], s["rss_kb"]) for s in steady]),
+        "thread_slope_h": slope_per_hour([(s["t"], s["threads"]) for s in steady]),
+        "fd_slope_h": slope_per_hour([(s["t"], s["fds"]) for s in steady]),
+        "log_slope_kb_h": slope_per_hour([(s["t"], s["log_bytes"] / 1024.0) for s in steady]),
+    }
+    flags = []
+    if result["exit_code"] is not None:
+        flags.append(f"exited with {result['exit_code']}")
+    for key, limit, label in (
+        ("rss_slope_kb_h", args.max_rss_slope, "RSS"),
+        ("thread_slope_h", args.max_thread_slope, "threads"),
+        ("fd_slope_h", args.max_fd_slope, "fds"),
+    ):
+        if result[key] is not None and result[key] > limit:
+            flags.append(f"{label} +{result[key]:.1f}/h > {limit:g}/h")
+    result["flags"] = flags
+    if service["snapshots"]:
+        result["tracemalloc"] = snapshot_diff(service["snapshots"], args.warmup, args.top)
+    return result
+
+
+def fmt_slope(value: float | None) -> str:
+    return "-" if value is None else f"{value:+.1f}"
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child_main(sys.argv[2], sys.argv[3], float(sys.argv[4]), int(sys.argv[5]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=4.0, help="soak duration")
+    parser.add_argument("--services", default=",".join(SERVICES))
+    parser.add_argument("--capture", help="replay this capture in a loop instead of synthetic traffic")
+    parser.add_argument("--speed", type=float, default=1.0, help="capture pacing: 1 = recorded, N = N times faster, 0 = max")
+    parser.add_argument("--rate", type=float, default=10.0, help="synthetic person-count messages per second")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--warmup", type=float, default=600.0, help="seconds left out of the slope fit")
+    parser.add_argument("--sample-seconds", type=float, default=10.0)
+    parser.add_argument("--report-seconds", type=float, default=600.0, help="progress line interval")
+    parser.add_argument("--max-rss-slope", type=float, default=1024.0, help="KiB per hour")
+    parser.add_argument("--max-thread-slope", type=float, default=1.0, help="threads per hour")
+    parser.add_argument("--max-fd-slope", type=float, default=1.0, help="open fds per hour")
+    parser.add_argument("--tracemalloc", action="store_true", help="run the services under tracemalloc (slower)")
+    parser.add_argument("--tracemalloc-frames", type=int, default=1, help="traceback depth kept per allocation")
+    parser.add_argument("--snapshot-seconds", type=float, default=600.0)
+    parser.add_argument("--top", type=int, default=10, help="growing allocation sites to list per service")
+    parser.add_argument("--host", help="external broker (default: embedded)")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the service logs and snapshots")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.services.split(",") if name.strip()]
+    unknown = set(names) - set(SERVICES)
+    if unknown:
+        parser.error(f"unknown services: {', '.join(sorted(unknown))} (expected {', '.join(SERVICES)})")
+
+    workdir = tempfile.mkdtemp(prefix="soak-")
+    broker = None
+    host, port = args.host, args.port
+    if not host:
+        broker = MiniBroker(port=args.port).start()
+        host, port = "127.0.0.1", broker.port
+    kept = f"; logs and snapshots in {workdir}" if args.keep else ""
+    print(f"[soak] {', '.join(names)} against {host}:{port} for {args.hours:g} h{kept}")
+    services = start_services(names, host, port, workdir, args)
+
+    client = mqtt.Client()
+    client.max_queued_messages_set(1000)
+    benchlib.connect_client(client, host, port)
+    load = ReplayLoad(client, args.capture, args.speed) if args.capture else SyntheticLoad(client, args.rate, args.seed)
+    load.start()
+
+    started = time.monotonic()
+    deadline = started + args.hours * 3600.0
+    next_report = started + args.report_seconds
+    try:
+        while time.monotonic() < deadline:
+            time.sleep(min(args.sample_seconds, max(0.0, deadline - time.monotonic())))
+            now = time.monotonic()
+            for service in services.values():
+                sample = read_proc(service["proc"].pid) if service["proc"].poll() is None else None
+                if sample is None:
+                    continue
+                sample.update({"t": round(now - started, 1), "log_bytes": os.path.getsize(service["log"])})
+                service["samples"].append(sample)
+            if now >= next_report:
+                next_report += args.report_seconds
+                parts = [
+                    f"{name} {s['samples'][-1]['rss_kb'] / 1024.0:.1f}MiB/{s['samples'][-1]['threads']}t"
+                    for name, s in services.items()
+                    if s["samples"]
+                ]
+                print(f"[soak] {(now - started) / 60.0:.1f} min, {load.sent} sent: " + ", ".join(parts))
+    except KeyboardInterrupt:
+        print("[soak] interrupted; analyzing what was sampled")
+    finally:
+        load.stop.set()
+        load.join(timeout=5)
+        results = [analyze(name, service, args) for name, service in services.items()]
+        for service in services.values():
+            if service["proc"].poll() is None:
+                service["proc"].terminate()
+        for service in services.values():
+            try:
+                service["proc"].wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                service["proc"].kill()
+        client.loop_stop()
+        client.disconnect()
+        if broker:
+            broker.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'service':<18} {'RSS start':>10} {'end':>8} {'KiB/h':>9} {'thr':>5} {'thr/h':>7} {'fds':>4} {'fd/h':>7} {'log KiB/h':>10}")
+    for result in results:
+        rss, threads, fds = result["rss_kb"], result["threads"], result["fds"]
+        print(
+            f"{result['service']:<18} {rss['start'] or '-':>10} {rss['end'] or '-':>8} {fmt_slope(result['rss_slope_kb_h']):>9} "
+            f"{threads['end'] or '-':>5} {fmt_slope(result['thread_slope_h']):>7} {fds['end'] or '-':>4} "
+            f"{fmt_slope(result['fd_slope_h']):>7} {fmt_slope(result['log_slope_kb_h']):>10}"
+        )
+        for flag in result["flags"]:
+            print(f"    FLAG {flag}")
+        diff = result.get("tracemalloc")
+        if diff:
+            print(f"    tracemalloc {diff['from']} -> {diff['to']} ({diff['traced_kb']} KiB traced):")
+            for stat in diff["top"]:
+                print(f"      {stat['size_diff_kb']:>+9.1f} KiB {stat['count_diff']:>+7} blocks  {stat['where']}")
+    flagged = [result["service"] for result in results if result["flags"]]
+    print(f"[soak] {load.sent} messages sent; " + (f"flagged: {', '.join(flagged)}" if flagged else "no growth flagged"))
+    benchlib.write_json(
+        args.json,
+        {
+            "benchmark": "soak",
+            "hours": args.hours,
+            "load": {"capture": args.capture, "speed": args.speed} if args.capture else {"rate": args.rate, "seed": args.seed},
+            "results": results,
+            "samples": {name: service["samples"] for name, service in services.items()},
+        },
+    )
+    if flagged:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Command-channel recovery over a flaky TLS link.
+
+Generates a throwaway CA plus server and client certificates (openssl), starts
+a mutual-TLS embedded broker and runs command_listener.py through a TCP proxy
+that can drop the link. Each cycle cuts the link for --outage seconds, sends
+--commands "tail 1" commands while it is down and restores it. Reports how
+many of those commands were answered, recovery time (restore → last answer),
+and the TLS handshake time/resumption rate of the reconnects. Modes:
+  resume    persistent session, QoS 1, TLS session resumption (the defaults)
+  baseline  clean session, QoS 0, full handshakes (the previous behavior)
+
+    python3 backend/bench/tls_reconnect.py --cycles 10 --outage 2
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import benchlib
+import paho.mqtt.client as mqtt
+
+from mini_broker import MiniBroker
+
+COMMAND_TOPIC = "bench/command"
+RESULT_TOPIC = "bench/command/result"
+CONNECTED_RE = re.compile(r"connected .*handshake=([0-9.]+|None)ms resumed=(\d)")
+MODES = {
+    "resume": {"COMMAND_PERSISTENT_SESSION": "1", "COMMAND_QOS": "1", "COMMAND_TLS_RESUME": "1"},
+    "baseline": {"COMMAND_PERSISTENT_SESSION": "0", "COMMAND_QOS": "0", "COMMAND_TLS_RESUME": "0"},
+}
+
+
+class FlakyProxy:
+    """TCP relay to the broker; cut() drops every connection and refuses new ones until restore()."""
+
+    def __init__(self, target_port: int):
+        self.target_port = target_port
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.up = True
+        self.sockets: list[socket.socket] = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self._accept, name="flaky-proxy", daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            if not self.up:
+                conn.close()
+                continue
+            upstream = socket.create_connection(("127.0.0.1", self.target_port))
+            with self.lock:
+                self.sockets += [conn, upstream]
+            for src, dst in ((conn, upstream), (upstream, conn)):
+                threading.Thread(target=self._pump, args=(src, dst), daemon=True).start()
+
+    def _pump(self, src: socket.socket, dst: socket.socket):
+        try:
+            while True:
+                data = src.recv(65536)
+                if not data:
+                    break
+                dst.sendall(data)
+        except OSError:
+            pass
+        for sock in (src, dst):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def cut(self):
+        self.up = False
+        with self.lock:
+            sockets, self.sockets = self.sockets, []
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+                sock.close()
+            except OSError:
+                pass
+
+    def restore(self):
+        self.up = True
+
+    def close(self):
+        self.cut()
+        self.listener.close()
+
+
+def start_listener(proxy_port: int, certs: dict, mode: str, connects: list) -> subprocess.Popen:
+    env = os.environ.copy()
+    env.update(
+        {
+            "COMMAND_LISTENER_ENV": os.devnull,
+            "MQTT_HOST": "127.0.0.1",
+            "MQTT_PORT": str(proxy_port),
+            "MQTT_TLS_ENABLED": "1",
+            "MQTT_CA_CERT": certs["ca.crt"],
+            "MQTT_CLIENT_CERT": certs["client"] + ".crt",
+            "MQTT_CLIENT_KEY": certs["client"] + ".key",
+            "MQTT_CLIENT_ID": f"bench-listener-{mode}",
+            "COMMAND_TOPIC": COMMAND_TOPIC,
+            "COMMAND_RESULT_TOPIC": RESULT_TOPIC,
+            "COMMAND_OUTPUT_TOPIC": "",
+            "COMMAND_RECONNECT_MIN_SECONDS": "0.2",
+            "COMMAND_RECONNECT_MAX_SECONDS": "2",
+            "PYTHONUNBUFFERED": "1",
+        }
+    )
+    env.update(MODES[mode])
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(benchlib.MQTT_DIR, "command_listener.py")],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+
+    def read():
+        for line in proc.stdout:
+            match = CONNECTED_RE.search(line)
+            if match:
+                handshake = None if match.group(1) == "None" else float(match.group(1))
+                connects.append((time.perf_counter(), handshake, match.group(2) == "1"))
+
+    threading.Thread(target=read, name="listener-log", daemon=True).start()
+    return proc
+
+
+def run_mode(mode: str, broker: MiniBroker, certs: dict, args) -> dict:
+    proxy = FlakyProxy(broker.port)
+    connects: list = []
+    answers: list[float] = []
+    listener = start_listener(proxy.port, certs, mode, connects)
+
+    client = mqtt.Client()
+    client.tls_set(ca_certs=certs["ca.crt"], certfile=certs["client"] + ".crt", keyfile=certs["client"] + ".key")
+    client.on_message = lambda c, u, msg: answers.append(time.perf_counter())
+    recovery_ms, sent, answered = [], 0, 0
+    try:
+        benchlib.connect_client(client, "127.0.0.1", broker.port)
+        client.subscribe(RESULT_TOPIC)
+        deadline = time.monotonic() + 10
+        while not connects and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.5)
+        for cycle in range(args.cycles):
+            proxy.cut()
+            answers.clear()
+            time.sleep(args.outage / 2)
+            for i in range(args.commands):
+                payload = {"command": "tail 1", "id": f"{mode}-{cycle}-{i}", "ts": int(time.time() * 1000)}
+                client.publish(COMMAND_TOPIC, json.dumps(payload), qos=1)
+                sent += 1
+            time.sleep(args.outage / 2)
+            restored = time.perf_counter()
+            proxy.restore()
+            wait_until = time.monotonic() + args.timeout
+            while len(answers) < args.commands and time.monotonic() < wait_until:
+                time.sleep(0.02)
+            answered += min(len(answers), args.commands)
+            if len(answers) >= args.commands:
+                recovery_ms.append((answers[args.commands - 1] - restored) * 1000.0)
+            time.sleep(0.3)
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        listener.terminate()
+        listener.wait(timeout=5)
+        proxy.close()
+
+    reconnects = connects[1:]
+    handshakes = [h for _, h, _ in reconnects if h is not None]
+    return {
+        "mode": mode,
+        "cycles": args.cycles,
+        "sent": sent,
+        "answered": answered,
+        "recovery_ms": benchlib.summarize(recovery_ms),
+        "handshake_ms": benchlib.summarize(handshakes),
+        "resumed": sum(1 for _, _, resumed in reconnects if resumed),
+        "reconnects": len(reconnects),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=5, help="link drops per mode")
+    parser.add_argument("--outage", type=float, default=2.0, help="seconds the link stays down")
+    parser.add_argument("--commands", type=int, default=3, help="commands sent during each outage")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for answers after restore")
+    parser.add_argument("--modes", default="baseline,resume")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    # The CA and keys only live for the run.
+    with tempfile.TemporaryDirectory(prefix="tls-reconnect-bench-") as workdir:
+        run_bench(args, benchlib.make_certs(workdir))
+
+
+def run_bench(args, certs: dict):
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(certs["server"] + ".crt", certs["server"] + ".key")
+    server_context.load_verify_locations(certs["ca.crt"])
+    server_context.verify_mode = ssl.CERT_REQUIRED
+    broker = MiniBroker(ssl_context=server_context).start()
+
+    print(f"[tls-reconnect-bench] TLS broker port {broker.port}")
+    print(f"{'mode':>9} {'answered':>9} {'recov p50':>10} {'recov max':>10} {'hs p50ms':>9} {'resumed':>8}")
+    results = []
+    try:
+        for mode in (m.strip() for m in args.modes.split(",") if m.strip()):
+            result = run_mode(mode, broker, certs, args)
+            results.append(result)
+            print(
+                f"{mode:>9} {result['answered']:>4}/{result['sent']:<4} "
+                f"{benchlib.fmt_ms(result['recovery_ms']['p50']):>10} {benchlib.fmt_ms(result['recovery_ms']['max']):>10} "
+                f"{benchlib.fmt_ms(result['handshake_ms']['p50']):>9} {result['resumed']:>3}/{result['reconnects']:<4}"
+            )
+    finally:
+        broker.stop()
+    benchlib.write_json(args.json, {"benchmark": "tls_reconnect", "outage_s": args.outage, "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,41 @@
 """
 Listen for MQTT commands and run a shell command on demand.
+
+Commands run on a single worker thread so the paho network loop never blocks
+on them; each has a timeout and its result is published asynchronously on
+COMMAND_RESULT_TOPIC. Server output is captured into a bounded buffer and
+published in rate-limited batches on COMMAND_OUTPUT_TOPIC; "tail [n]" returns
+the last lines on demand.
+
+The command channel uses a persistent session (clean_session=False) with a
+QoS 1 subscription, so commands sent while the link is down are delivered on
+reconnect. Reconnects back off exponentially with jitter and resume the
+previous TLS session instead of doing a full handshake.
+
+Receive/accept/drop counts, MQTT traffic and queue depths are served as
+Prometheus metrics on COMMAND_METRICS_PORT and published as JSON on
+COMMAND_STATS_TOPIC (service_metrics.py).
 """
 
+import collections
 import json
 import os
+import random
 import shlex
-import subprocess
+import socket
+import ssl
+import threading
 import time
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-import signal
 
 import paho.mqtt.client as mqtt
 
+import service_metrics
+from process_profiles import load_profiles, wrap_command
+from process_registry import ManagedProcess, OutputBuffer, ProcessRegistry, http_probe
+
 ENV_FILE = os.getenv("COMMAND_LISTENER_ENV", "/etc/jetson-iot/command_listener.env")
 
 
@@ -43,21 +66,60 @@ COMMAND_TOPIC = os.getenv("COMMAND_TOPIC", "jetson/command")
 TRIGGER_TEXT = os.getenv("TRIGGER_TEXT", "run").strip().lower()
 START_PIPELINE_TEXT = os.getenv("START_PIPELINE_TEXT", "start pipeline").strip().lower()
 PIPELINE_API_URL = os.getenv("PIPELINE_API_URL", "http://127.0.0.1:8081/api/start")
+STATUS_API_URL = os.getenv("STATUS_API_URL", "http://127.0.0.1:8081/api/status")
 RUN_COMMAND = os.getenv("RUN_COMMAND", "npm run serve -- --no-ddb")
 RUN_DB_TEXT = os.getenv("RUN_DB_TEXT", "run -db").strip().lower()
 RUN_DB_COMMAND = os.getenv("RUN_DB_COMMAND", "npm run serve -- --ddb")
 STOP_TEXT = os.getenv("STOP_TEXT", "stop").strip().lower()
+TAIL_TEXT = os.getenv("TAIL_TEXT", "tail").strip().lower()
 COMMAND_CWD = os.getenv(
     "COMMAND_CWD",
     os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")),
 )
-COOLDOWN_SECONDS = float(os.getenv("COMMAND_COOLDOWN_SECONDS", "2"))
-
-last_trigger_at = 0.0
-current_process = None
+# Each command has its own token bucket, so a flood of one never starves another.
+COMMAND_RATE_PER_MINUTE = float(os.getenv("COMMAND_RATE_PER_MINUTE", "10"))
+COMMAND_BURST = float(os.getenv("COMMAND_BURST", "3"))
+COMMAND_MAX_PAYLOAD_BYTES = int(os.getenv("COMMAND_MAX_PAYLOAD_BYTES", "512"))
+COMMAND_STATS_TOPIC = os.getenv("COMMAND_STATS_TOPIC", "jetson/command/stats")
+COMMAND_STATS_SECONDS = float(os.getenv("COMMAND_STATS_SECONDS", "60"))
+METRICS_PORT = int(os.getenv("COMMAND_METRICS_PORT", "9105"))
+COMMAND_RESULT_TOPIC = os.getenv("COMMAND_RESULT_TOPIC", "jetson/command/result")
+START_TIMEOUT_SECONDS = float(os.getenv("COMMAND_START_TIMEOUT_SECONDS", "15"))
+STOP_TIMEOUT_SECONDS = float(os.getenv("COMMAND_STOP_TIMEOUT_SECONDS", "10"))
+PIPELINE_TIMEOUT_SECONDS = float(os.getenv("COMMAND_PIPELINE_TIMEOUT_SECONDS", "10"))
+# Start the server (with all its helpers) at boot, as if "run" had been sent;
+# only the first "run"/"start pipeline" after boot skips the cold start.
+AUTOSTART = os.getenv("COMMAND_AUTOSTART", "0") == "1"
+AUTOSTART_TEXT = os.getenv("COMMAND_AUTOSTART_TEXT", TRIGGER_TEXT).strip().lower()
+COMMAND_OUTPUT_TOPIC = os.getenv("COMMAND_OUTPUT_TOPIC", "jetson/command/output")
+OUTPUT_INTERVAL_SECONDS = float(os.getenv("COMMAND_OUTPUT_INTERVAL_SECONDS", "1"))
+OUTPUT_BATCH_LINES = int(os.getenv("COMMAND_OUTPUT_BATCH_LINES", "50"))
+OUTPUT_BUFFER_LINES = int(os.getenv("COMMAND_OUTPUT_BUFFER_LINES", "1000"))
+OUTPUT_ECHO = os.getenv("COMMAND_OUTPUT_ECHO", "1") == "1"
+KEEPALIVE_SECONDS = int(os.getenv("COMMAND_KEEPALIVE_SECONDS", "60"))
+COMMAND_QOS = int(os.getenv("COMMAND_QOS", "1"))
+PERSISTENT_SESSION = os.getenv("COMMAND_PERSISTENT_SESSION", "1") == "1"
+TLS_RESUME = os.getenv("COMMAND_TLS_RESUME", "1") == "1"
+RECONNECT_MIN_SECONDS = float(os.getenv("COMMAND_RECONNECT_MIN_SECONDS", "0.5"))
+RECONNECT_MAX_SECONDS = float(os.getenv("COMMAND_RECONNECT_MAX_SECONDS", "60"))
+# Commands queued by the broker longer than this are not run on reconnect.
+COMMAND_MAX_AGE_SECONDS = float(os.getenv("COMMAND_MAX_AGE_SECONDS", "300"))
+TAIL_DEFAULT_LINES = 20
+TAIL_MAX_LINES = 200
+# Encoded size of the lines in a tail reply; AWS IoT rejects messages over 128 KB.
+TAIL_MAX_BYTES = int(os.getenv("COMMAND_TAIL_MAX_BYTES", "65536"))
+
+metrics = service_metrics.Registry("command-listener")
+commands = metrics.counter("commands_total", "Commands received, accepted and dropped (by reason)", ("result",))
 connect_host = None
 connect_port = None
 connect_tls = False
+attempt_started = 0.0
+connack_received = False
+tls_context = None
+recent_command_ids: collections.deque = collections.deque(maxlen=100)
+# One worker keeps commands in arrival order (a "stop" never overtakes a "run").
+command_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="command")
 
 
 def parse_mqtt_url(url: str) -> tuple[str, int]:
@@ -75,6 +137,73 @@ def parse_mqtt_url(url: str) -> tuple[str, int]:
     return rest, default_port
 
 
+class TimedSSLSocket(ssl.SSLSocket):
+    def do_handshake(self, block=False):
+        began = time.monotonic()
+        super().do_handshake(block)
+        self.context.last_handshake = {
+            "handshake_ms": round((time.monotonic() - began) * 1000.0, 1),
+            "resumed": self.session_reused,
+        }
+
+
+class ResumingTLSContext(ssl.SSLContext):
+    """Client context that offers the previous TLS session on reconnect and times handshakes."""
+
+    sslsocket_class = TimedSSLSocket
+
+    def __new__(cls, resume: bool = True):
+        return super().__new__(cls, ssl.PROTOCOL_TLS_CLIENT)
+
+    def __init__(self, resume: bool = True):
+        self.resume = resume
+        self.session: ssl.SSLSession | None = None
+        self.last_handshake: dict = {}
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        self.last_handshake = {}
+        if self.resume and self.session is not None:
+            kwargs.setdefault("session", self.session)
+        return super().wrap_socket(sock, *args, **kwargs)
+
+    def remember(self, sock):
+        # Called after CONNACK: TLS 1.3 tickets arrive after the handshake itself.
+        if self.resume and isinstance(sock, ssl.SSLSocket) and sock.session is not None:
+            self.session = sock.session
+
+
+def build_tls_context() -> ResumingTLSContext:
+    context = ResumingTLSContext(TLS_RESUME)
+    context.load_verify_locations(MQTT_CA_CERT)
+    context.load_cert_chain(MQTT_CLIENT_CERT, MQTT_CLIENT_KEY)
+    if MQTT_TLS_INSECURE:
+        context.check_hostname = False
+    return context
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, burst: float):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+def reconnect_delay(attempt: int) -> float:
+    """Exponential backoff with jitter, so a fleet does not reconnect in lockstep."""
+    ceiling = min(RECONNECT_MAX_SECONDS, RECONNECT_MIN_SECONDS * (2 ** min(attempt, 16)))
+    return random.uniform(ceiling / 2.0, ceiling)
+
+
 def extract_command_text(payload: str) -> Optional[str]:
     try:
         data = json.loads(payload)
@@ -93,14 +222,7 @@ def extract_command_text(payload: str) -> Optional[str]:
     return None
 
 
-def start_command():
-    global current_process
-    if current_process and current_process.poll() is None:
-        print("[command-listener] command already running")
-        return
-
-    args = shlex.split(RUN_COMMAND)
-    print(f"[command-listener] starting: {RUN_COMMAND}")
+def command_env() -> dict:
     env = os.environ.copy()
     if env.get("KEEP_MQTT_ENV_FOR_COMMAND", "0") != "1":
         # Avoid leaking AWS IoT MQTT settings into the app we are starting.
@@ -115,114 +237,338 @@ def start_command():
             "MQTT_TLS_INSECURE",
         ):
             env.pop(key, None)
-    current_process = subprocess.Popen(args, cwd=COMMAND_CWD, env=env, start_new_session=True)
+    if env.get("PROCESS_PROFILES_FILE"):
+        # The server and its children run from other working directories.
+        env["PROCESS_PROFILES_FILE"] = os.path.abspath(env["PROCESS_PROFILES_FILE"])
+    return env
+
+
+try:
+    profiles = load_profiles()
+except Exception as exc:
+    print(f"[command-listener] ignoring process profiles: {exc}")
+    profiles = {}
+
+registry = ProcessRegistry()
+# Both server variants bind port 8081, so at most one of them runs at a time.
+SERVER_NAMES = {TRIGGER_TEXT: "server", RUN_DB_TEXT: "server-db"}
+for _text, _name in SERVER_NAMES.items():
+    registry.add(
+        ManagedProcess(
+            _name,
+            wrap_command(_name, shlex.split(RUN_DB_COMMAND if _text == RUN_DB_TEXT else RUN_COMMAND), profiles),
+            cwd=COMMAND_CWD,
+            env=command_env(),
+            probe=http_probe(STATUS_API_URL),
+            output=OutputBuffer(history_lines=TAIL_MAX_LINES, pending_lines=OUTPUT_BUFFER_LINES),
+            echo_output=OUTPUT_ECHO,
+        )
+    )
+
+metrics.gauge("command_queue", "Commands waiting for the worker", fn=lambda: command_executor._work_queue.qsize())
+metrics.gauge(
+    "output_pending_lines",
+    "Captured server output not yet published",
+    ("process",),
+    fn=lambda: {name: len(managed.output.pending) for name, managed in registry.processes.items()},
+)
 
-def start_db_command():
-    global current_process
-    if current_process and current_process.poll() is None:
-        print("[command-listener] command already running")
-        return
 
-    args = shlex.split(RUN_DB_COMMAND)
-    print(f"[command-listener] starting: {RUN_DB_COMMAND}")
-    env = os.environ.copy()
-    if env.get("KEEP_MQTT_ENV_FOR_COMMAND", "0") != "1":
-        for key in (
-            "MQTT_URL",
-            "MQTT_HOST",
-            "MQTT_PORT",
-            "MQTT_TLS_ENABLED",
-            "MQTT_CA_CERT",
-            "MQTT_CLIENT_CERT",
-            "MQTT_CLIENT_KEY",
-            "MQTT_TLS_INSECURE",
-        ):
-            env.pop(key, None)
-    current_process = subprocess.Popen(args, cwd=COMMAND_CWD, env=env, start_new_session=True)
+def launch(name: str, timeout: float) -> dict:
+    managed = registry.get(name)
+    began = time.monotonic()
+    stopped = {}
+    for other in registry.running():
+        if other is not managed:
+            stopped[other.name] = other.stop(STOP_TIMEOUT_SECONDS)
+    result = managed.start()
+    result["ready"] = managed.wait_ready(max(timeout - (time.monotonic() - began), 0.0))
+    # wait_ms is what this command cost; ~0 when the server was already up (auto-start).
+    result["wait_ms"] = round((time.monotonic() - began) * 1000.0, 1)
+    result["timings"] = dict(managed.timings)
+    if stopped:
+        result["replaced"] = stopped
+    return result
+
+
+def start_command(timeout: float = START_TIMEOUT_SECONDS) -> dict:
+    return launch(SERVER_NAMES[TRIGGER_TEXT], timeout)
+
 
+def start_db_command(timeout: float = START_TIMEOUT_SECONDS) -> dict:
+    return launch(SERVER_NAMES[RUN_DB_TEXT], timeout)
 
-def stop_command():
-    global current_process
-    if not current_process or current_process.poll() is not None:
+
+def autostart(timeout: float = START_TIMEOUT_SECONDS) -> dict:
+    return launch(SERVER_NAMES.get(AUTOSTART_TEXT, "server"), timeout)
+
+
+def stop_command(timeout: float = STOP_TIMEOUT_SECONDS) -> dict:
+    stopped = registry.stop_all(timeout)
+    if not stopped:
         print("[command-listener] no command running")
+    # An auto-started server is not started again: "stop" leaves the stack down
+    # until the next "run".
+    return {"status": "stopped" if stopped else "not_running", "processes": stopped}
+
+
+def start_pipeline(timeout: float = PIPELINE_TIMEOUT_SECONDS) -> dict:
+    began = time.monotonic()
+    for managed in registry.running():
+        # A server that is still warming up would refuse the request.
+        managed.wait_ready(timeout)
+    server_wait_ms = round((time.monotonic() - began) * 1000.0, 1)
+    req = urllib.request.Request(PIPELINE_API_URL, method="POST")
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        body = resp.read().decode("utf-8", errors="ignore")
+    print(f"[command-listener] start pipeline: {resp.status} {body[:200]}")
+    return {
+        "status": "ok",
+        "http_status": resp.status,
+        "body": body[:200],
+        "timings": {
+            "server_wait_ms": server_wait_ms,
+            "request_ms": round((time.monotonic() - began) * 1000.0 - server_wait_ms, 1),
+        },
+    }
+
+
+def on_connect(client, userdata, flags, rc, properties=None):
+    global connack_received
+    if rc != 0:
+        print(f"[command-listener] connection refused rc={rc}")
         return
+    connack_received = True
+    timing = f"connack={(time.monotonic() - attempt_started) * 1000.0:.1f}ms"
+    tls_label = "plain"
+    if tls_context is not None:
+        tls_context.remember(client.socket())
+        handshake = tls_context.last_handshake
+        tls_label = f"tls handshake={handshake.get('handshake_ms')}ms resumed={int(bool(handshake.get('resumed')))}"
+    session_present = int(bool((flags or {}).get("session present")))
+    print(
+        f"[command-listener] connected {connect_host}:{connect_port} ({tls_label}) {timing} "
+        f"session_present={session_present}; topic={COMMAND_TOPIC}"
+    )
+    client.subscribe(COMMAND_TOPIC, qos=COMMAND_QOS)
+
+
+def delivery_drop_reason(payload: str) -> str | None:
+    """QoS 1 may redeliver, and a persistent session replays commands queued while offline."""
     try:
-        os.killpg(current_process.pid, signal.SIGTERM)
-        current_process.wait(timeout=10)
+        data = json.loads(payload)
     except Exception:
-        try:
-            os.killpg(current_process.pid, signal.SIGKILL)
-        except Exception:
-            pass
-    current_process = None
+        return None
+    if not isinstance(data, dict):
+        return None
+    command_id = data.get("id")
+    if command_id is not None:
+        if command_id in recent_command_ids:
+            return "duplicate"
+        recent_command_ids.append(command_id)
+    sent_ms = data.get("ts")
+    if isinstance(sent_ms, (int, float)) and COMMAND_MAX_AGE_SECONDS > 0:
+        age = time.time() - sent_ms / 1000.0
+        if age > COMMAND_MAX_AGE_SECONDS:
+            print(f"[command-listener] dropping command queued {age:.0f}s ago")
+            return "stale"
+    return None
 
 
-def on_connect(client, userdata, flags, rc, properties=None):
-    tls_label = "tls" if connect_tls else "plain"
-    print(f"[command-listener] connected {connect_host}:{connect_port} ({tls_label}); topic={COMMAND_TOPIC}")
-    client.subscribe(COMMAND_TOPIC)
+COMMANDS = {
+    TRIGGER_TEXT: (start_command, START_TIMEOUT_SECONDS),
+    RUN_DB_TEXT: (start_db_command, START_TIMEOUT_SECONDS),
+    STOP_TEXT: (stop_command, STOP_TIMEOUT_SECONDS),
+    START_PIPELINE_TEXT: (start_pipeline, PIPELINE_TIMEOUT_SECONDS),
+}
+buckets = {
+    text: TokenBucket(COMMAND_RATE_PER_MINUTE / 60.0, COMMAND_BURST) for text in list(COMMANDS) + [TAIL_TEXT]
+}
+# A command is either bare text or JSON; anything else is rejected before decoding.
+ALLOWED_PREFIXES = {b"{"} | {text[:1].encode("utf-8") for text in buckets if text}
 
 
 def on_message(client, userdata, msg):
-    global last_trigger_at
-    text = extract_command_text(msg.payload.decode("utf-8", errors="ignore"))
-    if not text:
+    commands.inc("received")
+    raw = msg.payload
+    if len(raw) > COMMAND_MAX_PAYLOAD_BYTES:
+        commands.inc("dropped_oversize")
         return
-
-    normalized = text.strip().lower()
-    now = time.time()
-    if now - last_trigger_at < COOLDOWN_SECONDS:
+    if raw.lstrip()[:1].lower() not in ALLOWED_PREFIXES:
+        commands.inc("dropped_prefix")
         return
-    last_trigger_at = now
-    if normalized == TRIGGER_TEXT:
-        start_command()
+    payload = raw.decode("utf-8", errors="ignore")
+    reason = delivery_drop_reason(payload)
+    if reason:
+        commands.inc(f"dropped_{reason}")
         return
-    if normalized == RUN_DB_TEXT:
-        start_db_command()
+    text = extract_command_text(payload)
+    normalized = text.strip().lower() if text else ""
+    words = normalized.split()
+    key = TAIL_TEXT if words and words[0] == TAIL_TEXT else normalized
+    bucket = buckets.get(key)
+    if bucket is None:
+        commands.inc("dropped_unknown")
         return
-    if normalized == STOP_TEXT:
-        stop_command()
+    if not bucket.take():
+        commands.inc(f"dropped_rate:{key}")
+        print(f"[command-listener] rate limited: {key}")
         return
-    if normalized == START_PIPELINE_TEXT:
-        start_pipeline()
+    commands.inc("accepted")
+    if key == TAIL_TEXT:
+        # Read-only and instant: answer directly instead of queueing behind a start.
+        publish_result(client, normalized, tail_output(words[1:]), time.monotonic())
         return
+    dispatch(client, normalized, *COMMANDS[key])
+
+
+def dispatch(client, command: str, func, timeout: float):
+    """Queue 'command' on the worker; the result is published when it finishes."""
+    submitted_at = time.monotonic()
+    future = command_executor.submit(run_command, command, func, timeout, submitted_at)
+    future.add_done_callback(lambda done: report_result(client, command, done, submitted_at))
+
 
+def run_command(command: str, func, timeout: float, submitted_at: float) -> dict:
+    queued = time.monotonic() - submitted_at
+    # A start that waited behind a slow command longer than its timeout is not worth
+    # running late; a stop always runs, or the stack would stay up.
+    if queued > timeout and func is not stop_command:
+        return {"status": "expired", "queued_s": round(queued, 3)}
+    result = func(timeout)
+    result["queued_s"] = round(queued, 3)
+    return result
 
-def start_pipeline():
+
+def report_result(client, command: str, future, submitted_at: float):
     try:
-        req = urllib.request.Request(PIPELINE_API_URL, method="POST")
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            body = resp.read().decode("utf-8", errors="ignore")
-        print(f"[command-listener] start pipeline: {resp.status} {body[:200]}")
+        result = future.result()
     except Exception as exc:
-        print(f"[command-listener] start pipeline failed: {exc}")
+        result = {"status": "error", "error": str(exc)}
+    publish_result(client, command, result, submitted_at)
+
+
+def publish_result(client, command: str, result: dict, submitted_at: float):
+    result.update(
+        {
+            "command": command,
+            "elapsed_s": round(time.monotonic() - submitted_at, 3),
+            "ts": int(time.time() * 1000),
+        }
+    )
+    payload = json.dumps(result)
+    print(f"[command-listener] result {payload}")
+    if COMMAND_RESULT_TOPIC:
+        client.publish(COMMAND_RESULT_TOPIC, payload, qos=0, retain=False)
+
+
+def tail_output(args: list[str]) -> dict:
+    try:
+        count = min(int(args[0]), TAIL_MAX_LINES) if args else TAIL_DEFAULT_LINES
+    except ValueError:
+        count = TAIL_DEFAULT_LINES
+    # The most recently started server, even if it has exited since.
+    started = [managed for managed in registry.processes.values() if managed.started_at]
+    if not started:
+        return {"status": "not_running", "lines": []}
+    managed = max(started, key=lambda item: item.started_at)
+    lines = managed.output.tail(count)
+    # Newest lines first until the JSON-encoded reply would pass TAIL_MAX_BYTES.
+    kept, size = [], 0
+    for line in reversed(lines):
+        size += len(json.dumps(line)) + 2
+        if size > TAIL_MAX_BYTES:
+            break
+        kept.append(line)
+    kept.reverse()
+    result = {
+        "status": "ok",
+        "process": managed.name,
+        "running": managed.running,
+        "lines": kept,
+    }
+    if len(kept) < len(lines):
+        result["omitted"] = len(lines) - len(kept)
+    return result
+
+
+def publish_output(client):
+    """Every OUTPUT_INTERVAL_SECONDS, publish at most one batch per process."""
+    seq = 0
+    while True:
+        time.sleep(OUTPUT_INTERVAL_SECONDS)
+        for managed in registry.processes.values():
+            lines, dropped = managed.output.drain(OUTPUT_BATCH_LINES)
+            if not lines and not dropped:
+                continue
+            seq += 1
+            payload = {
+                "process": managed.name,
+                "pid": managed.pid,
+                "seq": seq,
+                "lines": lines,
+                "dropped": dropped,
+                "ts": int(time.time() * 1000),
+            }
+            # QoS 0 publish only queues; while disconnected it fails fast and the batch is lost.
+            client.publish(COMMAND_OUTPUT_TOPIC, json.dumps(payload), qos=0, retain=False)
+
+
+def serve(client, host: str, port: int):
+    """Connect and run the network loop, reconnecting with backoff when the link drops."""
+    global attempt_started, connack_received
+    attempt = 0
+    while True:
+        attempt_started = time.monotonic()
+        connack_received = False
+        try:
+            rc = client.connect(host, port, KEEPALIVE_SECONDS)
+            while rc == mqtt.MQTT_ERR_SUCCESS:
+                rc = client.loop(timeout=1.0)
+            print(f"[command-listener] connection lost rc={rc}")
+        except Exception as exc:
+            print(f"[command-listener] connect failed: {exc}")
+        if connack_received:
+            attempt = 0
+        delay = reconnect_delay(attempt)
+        attempt += 1
+        print(f"[command-listener] reconnecting in {delay:.2f}s")
+        time.sleep(delay)
 
 
 def main():
-    global connect_host, connect_port, connect_tls
+    global connect_host, connect_port, connect_tls, tls_context
     if MQTT_HOST:
         host = MQTT_HOST
         port = int(MQTT_PORT or "8883")
     else:
         host, port = parse_mqtt_url(MQTT_URL)
-    client = mqtt.Client(client_id=os.getenv("MQTT_CLIENT_ID"))
+    client_id = os.getenv("MQTT_CLIENT_ID")
+    if PERSISTENT_SESSION and not client_id:
+        # The broker keys the stored session on the client id, so it must be stable.
+        client_id = f"command-listener-{socket.gethostname()}"
+    client = mqtt.Client(client_id=client_id or "", clean_session=not PERSISTENT_SESSION)
     connect_tls = MQTT_TLS_ENABLED or port == 8883 or MQTT_URL.startswith("mqtts://")
     if connect_tls:
         if not MQTT_CA_CERT or not MQTT_CLIENT_CERT or not MQTT_CLIENT_KEY:
             raise RuntimeError("MQTT TLS enabled but cert paths are missing")
-        client.tls_set(
-            ca_certs=MQTT_CA_CERT,
-            certfile=MQTT_CLIENT_CERT,
-            keyfile=MQTT_CLIENT_KEY,
-        )
+        tls_context = build_tls_context()
+        client.tls_set_context(tls_context)
         if MQTT_TLS_INSECURE:
             client.tls_insecure_set(True)
     connect_host = host
     connect_port = port
     client.on_connect = on_connect
     client.on_message = on_message
-    client.connect(host, port, 60)
-    client.loop_forever()
+    if COMMAND_OUTPUT_TOPIC:
+        threading.Thread(target=publish_output, args=(client,), name="command-output", daemon=True).start()
+    metrics.instrument(client)
+    metrics.serve(METRICS_PORT)
+    if COMMAND_STATS_TOPIC:
+        metrics.start_publisher(client, COMMAND_STATS_TOPIC, COMMAND_STATS_SECONDS)
+    if AUTOSTART:
+        dispatch(client, "autostart", autostart, START_TIMEOUT_SECONDS)
+    serve(client, host, port)
 
 
 if __name__ == "__main__":
@@ -1,30 +1,67 @@
 """
 Data Manager: subscribe to device metrics, normalize, forward to UI topics, and emit alarms.
+
+Relay commands carry a correlation "id" that the relay echoes on
+actuator/relay_status. Unacknowledged commands are retransmitted after
+RELAY_ACK_TIMEOUT_SECONDS; command→ack latency is published as a histogram on
+ui/metrics/relay_ack_latency and raises a "relay_ack" alarm when it degrades.
+
+With DDB_STATUS_TABLE set, a single compact status item (latest person count,
+GPU, temperature, FPS, alarm levels and relay state) is overwritten at most
+every DDB_STATUS_INTERVAL_SECONDS when something changed, and unchanged every
+DDB_STATUS_HEARTBEAT_SECONDS so its "ts" shows the manager is alive; the
+Telegram "status" command reads it.
+
+Message rates, handler latency, DynamoDB write latency and queue depths are
+served as Prometheus metrics on DATA_MANAGER_METRICS_PORT (service_metrics.py).
 """
 
+import itertools
 import json
 import os
+import threading
 import time
 from decimal import Decimal, ROUND_HALF_DOWN
 
 import paho.mqtt.client as mqtt
 
+import service_metrics
+
 MQTT_URL = os.getenv("MQTT_URL", "mqtt://mqtt-dashboard.com:1883")
 UI_METRICS_PREFIX = os.getenv("UI_METRICS_PREFIX", "ui/metrics")
 UI_ALARM_TOPIC = os.getenv("UI_ALARM_TOPIC", "ui/alarms")
 RELAY_COMMAND_TOPIC = os.getenv("RELAY_COMMAND_TOPIC", "actuator/relay")
+RELAY_STATUS_TOPIC = os.getenv("RELAY_STATUS_TOPIC", "actuator/relay_status")
 LED_TOGGLE_TOPIC = os.getenv("LED_TOGGLE_TOPIC", "actuator/led_toggle")
 
 TEMP_WARN_C = float(os.getenv("TEMP_WARN_C", "70"))
 TEMP_ALARM_C = float(os.getenv("TEMP_ALARM_C", "80"))
 GPU_WARN_PCT = float(os.getenv("GPU_WARN_PCT", "85"))
 GPU_ALARM_PCT = float(os.getenv("GPU_ALARM_PCT", "95"))
+# FPS alarms fire when the slowest stream drops below these.
+FPS_WARN_MIN = float(os.getenv("FPS_WARN_MIN", "20"))
+FPS_ALARM_MIN = float(os.getenv("FPS_ALARM_MIN", "10"))
+# No perf window for this long (a few perf intervals) means the pipeline stopped:
+# the FPS reading is cleared and its alarm level reset to normal.
+FPS_STALE_SECONDS = float(os.getenv("FPS_STALE_SECONDS", "20"))
 RELAY_ON_LEVEL = os.getenv("RELAY_ON_LEVEL", "warning")
+RELAY_ACK_TIMEOUT_SECONDS = float(os.getenv("RELAY_ACK_TIMEOUT_SECONDS", "2"))
+RELAY_ACK_RETRIES = int(os.getenv("RELAY_ACK_RETRIES", "3"))
+RELAY_ACK_CHECK_SECONDS = float(os.getenv("RELAY_ACK_CHECK_SECONDS", "0.25"))
+# Alarm on the smoothed command→ack latency.
+RELAY_ACK_WARN_MS = float(os.getenv("RELAY_ACK_WARN_MS", "500"))
+RELAY_ACK_ALARM_MS = float(os.getenv("RELAY_ACK_ALARM_MS", "1500"))
+RELAY_ACK_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
 
 DDB_ENABLED = os.getenv("DDB_ENABLED", "0") == "1"
 DDB_REGION = os.getenv("AWS_REGION")
 DDB_METRICS_TABLE = os.getenv("DDB_METRICS_TABLE", "metrics")
 DDB_ALARMS_TABLE = os.getenv("DDB_ALARMS_TABLE", "alarms")
+DDB_STATUS_TABLE = os.getenv("DDB_STATUS_TABLE", "")
+DDB_STATUS_ID = os.getenv("DDB_STATUS_ID", "jetson")
+DDB_STATUS_INTERVAL_SECONDS = float(os.getenv("DDB_STATUS_INTERVAL_SECONDS", "30"))
+DDB_STATUS_HEARTBEAT_SECONDS = float(os.getenv("DDB_STATUS_HEARTBEAT_SECONDS", "300"))
+METRICS_PORT = int(os.getenv("DATA_MANAGER_METRICS_PORT", "9101"))
 DDB_HEARTBEAT_PATH = os.getenv(
     "DDB_HEARTBEAT_PATH",
     os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "ddb_heartbeat.json")),
@@ -34,11 +71,21 @@ SOURCE_TOPICS = {
     "people": "deepstream/person_count",
     "temperature": "jetson/internal/temperature",
     "gpu": "jetson/internal/gpu_usage",
+    "fps": os.getenv("DEEPSTREAM_PERF_TOPIC", "deepstream/perf"),
+}
+
+ALARM_STATE_KEYS = {
+    "temperature": "tempLevel",
+    "gpu_usage": "gpuLevel",
+    "fps": "fpsLevel",
+    "relay_ack": "relayAckLevel",
 }
 
 state = {
     "tempLevel": "normal",
     "gpuLevel": "normal",
+    "fpsLevel": "normal",
+    "relayAckLevel": "normal",
     "relayState": "off",
     "ledState": "idle",
 }
@@ -48,15 +95,57 @@ person_accumulator = {
     "count": 0,
 }
 
+# Latest readings for the status item.
+latest = {
+    "people": None,
+    "gpu": None,
+    "temperature": None,
+    "fps": None,
+}
+status_sync = {
+    "dirty": False,
+    "written_at": None,
+}
+fps_seen = {"at": None}
+
+# id -> {"payload", "first_sent", "sent_at", "attempts"}
+relay_pending = {}
+relay_ids = itertools.count(1)
+RELAY_ID_PREFIX = f"dm-{os.getpid()}"
+relay_ack_stats = {
+    "buckets": [0] * (len(RELAY_ACK_BUCKETS_MS) + 1),
+    "count": 0,
+    "timeouts": 0,
+    "ewma_ms": None,
+}
+
+# Serializes the paho network thread (on_message) and the ack timer in main().
+handler_lock = threading.RLock()
+
 ddb_resource = None
 ddb_tables = {}
 ddb_failed = False
 
+metrics = service_metrics.Registry("data-manager")
+ddb_write_seconds = metrics.histogram(
+    "ddb_write_seconds", "DynamoDB put_item duration", ("table",), service_metrics.WRITE_BUCKETS
+)
+ddb_write_failures = metrics.counter("ddb_write_failures_total", "DynamoDB writes that raised", ("table",))
+metrics.gauge("relay_pending", "Relay commands waiting for an ack", fn=lambda: len(relay_pending))
+
+# Wall clock for every timestamp and timeout; a simulation swaps in a virtual
+# clock to drive the handlers faster than real time (backend/bench/day_sim.py).
+clock = time.time
+
+
+def now_ms() -> int:
+    return int(clock() * 1000)
+
 
 def record_ddb_success(source: str):
     try:
         os.makedirs(os.path.dirname(DDB_HEARTBEAT_PATH), exist_ok=True)
-        payload = json.dumps({"source": source, "ts": int(time.time() * 1000)})
+        payload = json.dumps({"source": source, "ts": now_ms()})
         with open(DDB_HEARTBEAT_PATH, "w", encoding="utf-8") as handle:
             handle.write(payload)
     except Exception:
@@ -87,25 +176,40 @@ def to_number(value):
     return None
 
 
-def publish_alarm(client, alarm_type: str, value: float, warn: float, alarm: float):
+def update_latest(key: str, value):
+    if latest[key] != value:
+        latest[key] = value
+        status_sync["dirty"] = True
+
+
+def publish_alarm(client, alarm_type: str, value: float, warn: float, alarm: float, below: bool = False):
     level = "normal"
-    if value >= alarm:
+    if below:
+        if value < alarm:
+            level = "alarm"
+        elif value < warn:
+            level = "warning"
+    elif value >= alarm:
         level = "alarm"
     elif value >= warn:
         level = "warning"
+    set_alarm_level(client, alarm_type, level, value, alarm if level == "alarm" else warn)
+
 
-    key = "tempLevel" if alarm_type == "temperature" else "gpuLevel"
+def set_alarm_level(client, alarm_type: str, level: str, value, threshold):
+    key = ALARM_STATE_KEYS[alarm_type]
     if state[key] == level:
         return
     state[key] = level
+    status_sync["dirty"] = True
 
     payload = json.dumps(
         {
             "type": alarm_type,
             "level": level,
             "value": value,
-            "threshold": alarm if level == "alarm" else warn,
-            "ts": int(time.time() * 1000),
+            "threshold": threshold,
+            "ts": now_ms(),
         }
     )
     client.publish(UI_ALARM_TOPIC, payload, qos=0, retain=False)
@@ -129,14 +233,75 @@ def maybe_toggle_relay(client):
     if next_state == state["relayState"]:
         return
     state["relayState"] = next_state
-    payload = json.dumps({"state": next_state, "source": "data_manager", "ts": int(time.time() * 1000)})
+    status_sync["dirty"] = True
+    now = clock()
+    command_id = f"{RELAY_ID_PREFIX}-{next(relay_ids)}"
+    payload = json.dumps({"state": next_state, "id": command_id, "source": "data_manager", "ts": int(now * 1000)})
+    # Only the newest command matters; older ones are superseded.
+    relay_pending.clear()
+    relay_pending[command_id] = {"payload": payload, "first_sent": now, "sent_at": now, "attempts": 1}
     client.publish(RELAY_COMMAND_TOPIC, payload, qos=0, retain=False)
 
 
+def record_relay_ack(client, latency_ms: float):
+    idx = len(RELAY_ACK_BUCKETS_MS)
+    for i, bound in enumerate(RELAY_ACK_BUCKETS_MS):
+        if latency_ms <= bound:
+            idx = i
+            break
+    relay_ack_stats["buckets"][idx] += 1
+    relay_ack_stats["count"] += 1
+    ewma = relay_ack_stats["ewma_ms"]
+    relay_ack_stats["ewma_ms"] = latency_ms if ewma is None else 0.8 * ewma + 0.2 * latency_ms
+
+    labels = [str(b) for b in RELAY_ACK_BUCKETS_MS] + ["+Inf"]
+    payload = json.dumps(
+        {
+            "type": "relay_ack_latency",
+            "latency_ms": round(latency_ms, 2),
+            "ewma_ms": round(relay_ack_stats["ewma_ms"], 2),
+            "count": relay_ack_stats["count"],
+            "timeouts": relay_ack_stats["timeouts"],
+            "buckets": dict(zip(labels, relay_ack_stats["buckets"])),
+            "ts": now_ms(),
+        }
+    )
+    forward_metric(client, "relay_ack_latency", payload)
+    publish_alarm(client, "relay_ack", relay_ack_stats["ewma_ms"], RELAY_ACK_WARN_MS, RELAY_ACK_ALARM_MS)
+
+
+def handle_relay_status(client, data: dict):
+    entry = relay_pending.pop(data.get("id"), None)
+    if entry is None:
+        # Untracked, superseded or duplicate ack.
+        return
+    record_relay_ack(client, (clock() - entry["first_sent"]) * 1000.0)
+
+
+def check_relay_acks(client):
+    """Retransmit relay commands whose ack is overdue; give up after RELAY_ACK_RETRIES."""
+    now = clock()
+    for command_id, entry in list(relay_pending.items()):
+        if now - entry["sent_at"] < RELAY_ACK_TIMEOUT_SECONDS:
+            continue
+        if entry["attempts"] > RELAY_ACK_RETRIES:
+            del relay_pending[command_id]
+            relay_ack_stats["timeouts"] += 1
+            elapsed_ms = round((now - entry["first_sent"]) * 1000.0, 2)
+            print(f"[data-manager] relay command {command_id} not acknowledged after {entry['attempts']} attempts")
+            publish_alarm(client, "relay_ack", max(elapsed_ms, RELAY_ACK_ALARM_MS), RELAY_ACK_WARN_MS, RELAY_ACK_ALARM_MS)
+            continue
+        entry["attempts"] += 1
+        entry["sent_at"] = now
+        client.publish(RELAY_COMMAND_TOPIC, entry["payload"], qos=0, retain=False)
+
+
 def maybe_toggle_led(client, count: int):
     next_state = "toggle" if count >= 1 else "idle"
-    state["ledState"] = next_state
-    payload = json.dumps({"state": next_state, "source": "data_manager", "ts": int(time.time() * 1000)})
+    if state["ledState"] != next_state:
+        state["ledState"] = next_state
+        status_sync["dirty"] = True
+    payload = json.dumps({"state": next_state, "source": "data_manager", "ts": now_ms()})
     client.publish(LED_TOGGLE_TOPIC, payload, qos=0, retain=False)
 
 
@@ -147,7 +312,8 @@ def publish_person_count_average(client):
     person_accumulator["sum"] = 0.0
     person_accumulator["count"] = 0
     rounded = round_half_down(avg)
-    payload = json.dumps({"type": "person_count", "count": rounded, "ts": int(time.time() * 1000)})
+    update_latest("people", rounded)
+    payload = json.dumps({"type": "person_count", "count": rounded, "ts": now_ms()})
     forward_metric(client, "person_count", payload)
     maybe_toggle_led(client, rounded)
 
@@ -180,6 +346,8 @@ def init_ddb():
         ddb_resource = boto3.resource("dynamodb", region_name=DDB_REGION)
         ddb_tables["metrics"] = ddb_resource.Table(DDB_METRICS_TABLE)
         ddb_tables["alarms"] = ddb_resource.Table(DDB_ALARMS_TABLE)
+        if DDB_STATUS_TABLE:
+            ddb_tables["status"] = ddb_resource.Table(DDB_STATUS_TABLE)
         print("[data-manager] dynamodb enabled")
     except Exception as exc:
         print(f"[data-manager] ddb init failed: {exc}")
@@ -187,6 +355,18 @@ def init_ddb():
         return
 
 
+def put_ddb_item(table: str, item: dict):
+    """put_item into ddb_tables[table], timed; raises whatever put_item raises."""
+    started = time.perf_counter()
+    try:
+        ddb_tables[table].put_item(Item=normalize_for_ddb(item))
+    except Exception:
+        ddb_write_failures.inc(table)
+        raise
+    finally:
+        ddb_write_seconds.observe(time.perf_counter() - started, table)
+
+
 def persist_metric(metric: str, payload: str):
     try:
         data = json.loads(payload)
@@ -197,9 +377,9 @@ def persist_metric(metric: str, payload: str):
         init_ddb()
         if ddb_resource:
             try:
-                item = {"metric": metric, "ts": int(data.get("ts", int(time.time() * 1000)))}
+                item = {"metric": metric, "ts": int(data.get("ts", now_ms()))}
                 item.update(data)
-                ddb_tables["metrics"].put_item(Item=normalize_for_ddb(item))
+                put_ddb_item("metrics", item)
                 record_ddb_success("metrics")
             except Exception as exc:
                 print(f"[data-manager] ddb write failed: {exc}")
@@ -215,25 +395,79 @@ def persist_alarm(payload: str):
         init_ddb()
         if ddb_resource:
             try:
-                item = {"type": data.get("type", "alarm"), "ts": int(data.get("ts", int(time.time() * 1000)))}
+                item = {"type": data.get("type", "alarm"), "ts": int(data.get("ts", now_ms()))}
                 item.update(data)
-                ddb_tables["alarms"].put_item(Item=normalize_for_ddb(item))
+                put_ddb_item("alarms", item)
                 record_ddb_success("alarms")
             except Exception as exc:
                 print(f"[data-manager] ddb write failed: {exc}")
 
 
+def status_item() -> dict:
+    item = {"id": DDB_STATUS_ID, "ts": now_ms()}
+    item.update({key: value for key, value in latest.items() if value is not None})
+    item.update(state)
+    return item
+
+
+def maybe_persist_status():
+    """
+    Write the status item if it changed and the last write is
+    DDB_STATUS_INTERVAL_SECONDS old, or unchanged once the last write is
+    DDB_STATUS_HEARTBEAT_SECONDS old.
+    """
+    if not (DDB_ENABLED and DDB_STATUS_TABLE):
+        return
+    with handler_lock:
+        now = clock()
+        written_at = status_sync["written_at"]
+        if written_at is None:
+            if not status_sync["dirty"]:
+                return
+        elif now - written_at < (DDB_STATUS_INTERVAL_SECONDS if status_sync["dirty"] else DDB_STATUS_HEARTBEAT_SECONDS):
+            return
+        item = status_item()
+        # Cleared before the write so a change made meanwhile marks it dirty again.
+        status_sync["dirty"] = False
+        status_sync["written_at"] = now
+    init_ddb()
+    written = False
+    if ddb_resource:
+        try:
+            put_ddb_item("status", item)
+            record_ddb_success("status")
+            written = True
+        except Exception as exc:
+            print(f"[data-manager] ddb status write failed: {exc}")
+    if not written:
+        # Retry after DDB_STATUS_INTERVAL_SECONDS even if nothing else changes.
+        with handler_lock:
+            status_sync["dirty"] = True
+
+
 def on_connect(client, userdata, flags, rc, properties=None):
     print(f"[data-manager] connected {MQTT_URL}")
     for topic in SOURCE_TOPICS.values():
         client.subscribe(topic)
+    client.subscribe(RELAY_STATUS_TOPIC)
 
 
 def on_message(client, userdata, msg):
+    with handler_lock:
+        handle_message(client, msg)
+
+
+def handle_message(client, msg):
     try:
         data = json.loads(msg.payload.decode("utf-8"))
     except Exception:
         return
+    if not isinstance(data, dict):
+        return
+
+    if msg.topic == RELAY_STATUS_TOPIC:
+        handle_relay_status(client, data)
+        return
 
     if msg.topic == SOURCE_TOPICS["people"]:
         count = to_number(data.get("count", data.get("person_count", data.get("value"))))
@@ -250,8 +484,9 @@ def on_message(client, userdata, msg):
         percent = to_number(data.get("percent", data.get("usage", data.get("value"))))
         if percent is None:
             return
-        payload = json.dumps({"type": "gpu_usage", "percent": percent, "ts": data.get("ts", int(time.time() * 1000))})
+        payload = json.dumps({"type": "gpu_usage", "percent": percent, "ts": data.get("ts", now_ms())})
         forward_metric(client, "gpu_usage", payload)
+        update_latest("gpu", percent)
         publish_alarm(client, "gpu_usage", percent, GPU_WARN_PCT, GPU_ALARM_PCT)
         publish_person_count_average(client)
         return
@@ -260,10 +495,53 @@ def on_message(client, userdata, msg):
         celsius = to_number(data.get("celsius", data.get("temp", data.get("value"))))
         if celsius is None:
             return
-        payload = json.dumps({"type": "temperature", "celsius": celsius, "ts": data.get("ts", int(time.time() * 1000))})
+        payload = json.dumps({"type": "temperature", "celsius": celsius, "ts": data.get("ts", now_ms())})
         forward_metric(client, "temperature", payload)
+        update_latest("temperature", celsius)
         publish_alarm(client, "temperature", celsius, TEMP_WARN_C, TEMP_ALARM_C)
         publish_person_count_average(client)
+        return
+
+    if msg.topic == SOURCE_TOPICS["fps"]:
+        streams = data.get("fps")
+        if not isinstance(streams, dict):
+            return
+        fps = {}
+        for stream, value in streams.items():
+            number = to_number(value)
+            if number is not None:
+                fps[str(stream)] = number
+        if not fps:
+            return
+        payload = json.dumps(
+            {
+                "type": "fps",
+                "fps": fps,
+                "avg": data.get("avg", {}),
+                "min": min(fps.values()),
+                "ts": data.get("ts", now_ms()),
+            }
+        )
+        forward_metric(client, "fps", payload)
+        fps_seen["at"] = clock()
+        update_latest("fps", min(fps.values()))
+        publish_alarm(client, "fps", min(fps.values()), FPS_WARN_MIN, FPS_ALARM_MIN, below=True)
+
+
+def expire_fps(client):
+    if fps_seen["at"] is None or clock() - fps_seen["at"] < FPS_STALE_SECONDS:
+        return
+    fps_seen["at"] = None
+    update_latest("fps", None)
+    set_alarm_level(client, "fps", "normal", None, None)
+
+
+def tick(client):
+    """Periodic work, every RELAY_ACK_CHECK_SECONDS: relay ack retransmits, stale FPS and the status item."""
+    with handler_lock:
+        check_relay_acks(client)
+        expire_fps(client)
+    maybe_persist_status()
 
 
 def main():
@@ -271,8 +549,20 @@ def main():
     client = mqtt.Client(client_id=os.getenv("MQTT_CLIENT_ID"))
     client.on_connect = on_connect
     client.on_message = on_message
+    metrics.instrument(client)
+    metrics.serve(METRICS_PORT)
     client.connect(host, port, 60)
-    client.loop_forever()
+    client.loop_start()
+    metrics.start_publisher(client)
+    try:
+        while True:
+            time.sleep(RELAY_ACK_CHECK_SECONDS)
+            tick(client)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
 
 
 if __name__ == "__main__":
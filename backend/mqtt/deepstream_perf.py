@@ -0,0 +1,210 @@
+"""
+Tail the DeepStream perf log and publish per-stream FPS to MQTT.
+
+deepstream-test5-app prints "**PERF:" lines every perf-measurement-interval-sec;
+server.js redirects them to backend/data/logs/deepstream.out.log. This follows
+that file incrementally (surviving truncation and rotation) and publishes:
+  - deepstream/perf  {"type": "fps", "fps": {"0": 29.97}, "avg": {"0": 29.9}, "ts": ...}
+
+The windows a pipeline prints while it starts up, with every stream at
+"0.00 (0.00)", are skipped, so a start does not raise an FPS alarm. The log is
+appended across pipeline runs; a gap of DEEPSTREAM_PERF_RESTART_GAP_SECONDS
+without perf lines counts as a new run.
+
+The Data Manager forwards it to ui/metrics/fps and raises FPS alarms.
+"""
+
+import json
+import os
+import re
+import time
+
+import paho.mqtt.client as mqtt
+
+MQTT_URL = os.getenv("MQTT_URL", "mqtt://mqtt-dashboard.com:1883")
+PERF_TOPIC = os.getenv("DEEPSTREAM_PERF_TOPIC", "deepstream/perf")
+PERF_LOG_PATH = os.getenv(
+    "DEEPSTREAM_PERF_LOG",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "logs", "deepstream.out.log")),
+)
+POLL_SECONDS = float(os.getenv("DEEPSTREAM_PERF_POLL_SECONDS", "0.5"))
+FROM_START = os.getenv("DEEPSTREAM_PERF_FROM_START", "0") == "1"
+# A few missed perf-measurement-interval-sec (5 s in the shipped configs).
+RESTART_GAP_SECONDS = float(os.getenv("DEEPSTREAM_PERF_RESTART_GAP_SECONDS", "20"))
+READ_CHUNK = 65536
+
+PERF_PREFIX_RE = re.compile(r"^(?:\*\*PERF:|PERF\((\d+)\):)\s*")
+HEADER_RE = re.compile(r"FPS (\d+) \(Avg\)")
+# Optional "sensor_id[sensor_name] " label (nvmultiurisrcbin with stream names).
+VALUE_RE = re.compile(r"(?:(\S+)\[[^\]]*\]\s+)?([0-9]+(?:\.[0-9]+)?) \(([0-9]+(?:\.[0-9]+)?)\)")
+
+
+def parse_mqtt_url(url: str) -> tuple[str, int]:
+    if "://" in url:
+        _, rest = url.split("://", 1)
+    else:
+        rest = url
+    if "/" in rest:
+        rest = rest.split("/", 1)[0]
+    if ":" in rest:
+        host, port = rest.split(":", 1)
+        return host, int(port)
+    return rest, 1883
+
+
+class PerfParser:
+    """
+    Stateful line parser. Header lines ("FPS 0 (Avg)\tFPS 2 (Avg)") give the
+    source ids for the following value lines; with nvmultiurisrcbin the values
+    come on the line after a bare "**PERF:". Windows with every stream at 0
+    are dropped until the first non-zero one; restart() re-arms that.
+    """
+
+    def __init__(self):
+        self.stream_ids: list[str] = []
+        self.expect_values = False
+        self.running = False
+
+    def restart(self):
+        self.running = False
+
+    def feed(self, line: str) -> dict | None:
+        match = PERF_PREFIX_RE.match(line)
+        if match:
+            rest = line[match.end() :]
+            headers = HEADER_RE.findall(rest)
+            if headers:
+                self.stream_ids = headers
+                self.expect_values = False
+                return None
+            values = VALUE_RE.findall(rest)
+            if not values:
+                self.expect_values = True
+                return None
+            self.expect_values = False
+            return self._build(values)
+        if self.expect_values:
+            self.expect_values = False
+            values = VALUE_RE.findall(line)
+            if values:
+                return self._build(values)
+        return None
+
+    def _build(self, values: list[tuple[str, str, str]]) -> dict | None:
+        if not self.running:
+            if all(float(current) == 0.0 for _, current, _ in values):
+                return None  # still starting up
+            self.running = True
+        fps = {}
+        avg = {}
+        for idx, (sensor_id, current, average) in enumerate(values):
+            if sensor_id:
+                key = sensor_id
+            elif idx < len(self.stream_ids):
+                key = self.stream_ids[idx]
+            else:
+                key = str(idx)
+            fps[key] = float(current)
+            avg[key] = float(average)
+        return {"fps": fps, "avg": avg}
+
+
+class LogTailer:
+    """Incremental reader that reopens the file when it is rotated or truncated."""
+
+    def __init__(self, path: str, from_start: bool = False):
+        self.path = path
+        self.from_start = from_start
+        self.handle = None
+        self.inode = None
+        self.pending = b""
+
+    def _open(self, seek_end: bool) -> bool:
+        try:
+            handle = open(self.path, "rb")
+        except OSError:
+            return False
+        if seek_end:
+            handle.seek(0, os.SEEK_END)
+        self.handle = handle
+        self.inode = os.fstat(handle.fileno()).st_ino
+        self.pending = b""
+        return True
+
+    def _close(self):
+        if self.handle:
+            self.handle.close()
+        self.handle = None
+        self.inode = None
+
+    def read_lines(self) -> list[str]:
+        if self.handle is None:
+            # First open skips history unless asked; a file that appears later is new output.
+            seek_end = not self.from_start
+            self.from_start = True
+            if not self._open(seek_end):
+                return []
+
+        lines = self._drain()
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            st = None
+        if st is None or st.st_ino != self.inode:
+            # Rotated: finish the old file (drained above), then start the new one from the top.
+            self._close()
+            if st is not None and self._open(seek_end=False):
+                lines.extend(self._drain())
+        elif st.st_size < self.handle.tell():
+            # Truncated in place.
+            self.handle.seek(0)
+            self.pending = b""
+            lines.extend(self._drain())
+        return lines
+
+    def _drain(self) -> list[str]:
+        chunks = [self.pending]
+        while True:
+            chunk = self.handle.read(READ_CHUNK)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        data = b"".join(chunks)
+        if not data:
+            return []
+        parts = data.split(b"\n")
+        self.pending = parts.pop()
+        return [p.decode("utf-8", errors="ignore").rstrip("\r") for p in parts]
+
+
+def main():
+    host, port = parse_mqtt_url(MQTT_URL)
+    client = mqtt.Client(client_id=os.getenv("MQTT_CLIENT_ID"))
+    client.connect(host, port, 60)
+    client.loop_start()
+
+    print(f"[deepstream-perf] tailing {PERF_LOG_PATH} → {PERF_TOPIC}")
+    tailer = LogTailer(PERF_LOG_PATH, from_start=FROM_START)
+    parser = PerfParser()
+    last_result = time.monotonic()
+    try:
+        while True:
+            if parser.running and time.monotonic() - last_result > RESTART_GAP_SECONDS:
+                parser.restart()
+            for line in tailer.read_lines():
+                result = parser.feed(line)
+                if not result:
+                    continue
+                last_result = time.monotonic()
+                payload = json.dumps({"type": "fps", **result, "ts": int(time.time() * 1000)})
+                client.publish(PERF_TOPIC, payload, qos=0, retain=False)
+            time.sleep(POLL_SECONDS)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
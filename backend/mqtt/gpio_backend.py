@@ -0,0 +1,87 @@
+"""
+GPIO backends for the LED notifier.
+  - jetson (default): Jetson.GPIO with BOARD pin numbering
+  - mock: in-memory pins that record timestamped transitions (no hardware needed)
+Select with LED_GPIO_BACKEND=jetson|mock. The mock keeps the last
+MOCK_GPIO_HISTORY transitions (default 10000).
+"""
+
+import collections
+import os
+import threading
+import time
+from typing import Callable
+
+MOCK_GPIO_HISTORY = int(os.getenv("MOCK_GPIO_HISTORY", "10000"))
+
+
+class JetsonGpioBackend:
+    name = "jetson"
+
+    def __init__(self):
+        # Match your working script hint
+        os.environ.setdefault("JETSON_MODEL_NAME", "JETSON_ORIN_NANO")
+        import Jetson.GPIO as GPIO
+
+        self.GPIO = GPIO
+        GPIO.setwarnings(False)
+        GPIO.setmode(GPIO.BOARD)
+
+    def setup_output(self, pin: int, initial: bool = False):
+        self.GPIO.setup(pin, self.GPIO.OUT, initial=self.GPIO.HIGH if initial else self.GPIO.LOW)
+
+    def output(self, pin: int, level: bool):
+        self.GPIO.output(pin, self.GPIO.HIGH if level else self.GPIO.LOW)
+
+    def cleanup(self, pin: int):
+        self.GPIO.cleanup(pin)
+
+
+class MockGpioBackend:
+    """
+    Keeps pin levels in memory and appends (time.time(), pin, level) to
+    'transitions' on every write, keeping the last 'history' entries.
+    'on_transition' is called with the same tuple, from the writing thread.
+    """
+
+    name = "mock"
+
+    def __init__(
+        self,
+        on_transition: Callable[[tuple[float, int, bool]], None] | None = None,
+        history: int = MOCK_GPIO_HISTORY,
+    ):
+        self.levels: dict[int, bool] = {}
+        self.transitions: collections.deque[tuple[float, int, bool]] = collections.deque(maxlen=history)
+        self.on_transition = on_transition
+        self.lock = threading.Lock()
+
+    def setup_output(self, pin: int, initial: bool = False):
+        with self.lock:
+            self.levels[pin] = initial
+
+    def output(self, pin: int, level: bool):
+        event = (time.time(), pin, level)
+        with self.lock:
+            self.levels[pin] = level
+            self.transitions.append(event)
+        if self.on_transition:
+            self.on_transition(event)
+
+    def cleanup(self, pin: int):
+        with self.lock:
+            self.levels.pop(pin, None)
+
+
+BACKENDS = {
+    "jetson": JetsonGpioBackend,
+    "mock": MockGpioBackend,
+}
+
+
+def create_backend(name: str | None = None):
+    name = (name or os.getenv("LED_GPIO_BACKEND", "jetson")).strip().lower()
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"unknown GPIO backend: {name} (expected one of {', '.join(BACKENDS)})") from None
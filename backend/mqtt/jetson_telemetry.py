@@ -1,8 +1,25 @@
 """
-Publish Jetson GPU usage + temperature to MQTT.
+Publish Jetson telemetry to MQTT.
 Topics:
-  - jetson/internal/gpu_usage
-  - jetson/internal/temperature
+  - jetson/internal/gpu_usage      (legacy, GPU load only)
+  - jetson/internal/temperature    (legacy, one temperature only)
+  - jetson/telemetry/sample        (one compact message per tick with everything below)
+  - jetson/telemetry/processes     (per-process CPU/RSS/threads/context switches)
+
+The batched sample carries GPU load, temperature, per-core CPU utilization
+(from /proc/stat deltas), memory + swap, EMC frequency and INA power rails.
+New kinds of telemetry go under jetson/telemetry/<kind>.
+
+Processes are found through the PID files backend/server.js writes to
+backend/data/run/<name>.pid, falling back to cmdline patterns for anything
+started by hand.
+
+Sysfs/procfs files are resolved once at startup and kept open; each tick only
+re-reads them from offset 0, so the extra fields cost a handful of syscalls.
+
+Publishes, publish failures, the paho queue and the time spent collecting each
+sample are served as Prometheus metrics on TELEMETRY_METRICS_PORT
+(service_metrics.py).
 """
 
 import json
@@ -15,6 +32,8 @@ from pathlib import Path
 
 import paho.mqtt.client as mqtt
 
+import service_metrics
+
 
 MQTT_HOST = os.getenv("MQTT_HOST", "mqtt-dashboard.com")
 MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
@@ -22,60 +41,156 @@ MQTT_CLIENT_ID = os.getenv("MQTT_CLIENT_ID", "jetson-telemetry")
 MQTT_QOS = int(os.getenv("MQTT_QOS", "0"))
 INTERVAL = float(os.getenv("TELEMETRY_INTERVAL_SECONDS", "5"))
 DEBUG = os.getenv("TELEMETRY_DEBUG", "0") == "1"
+METRICS_PORT = int(os.getenv("TELEMETRY_METRICS_PORT", "9102"))
 
 TOPIC_GPU = "jetson/internal/gpu_usage"
 TOPIC_TEMP = "jetson/internal/temperature"
+TELEMETRY_TOPIC_PREFIX = os.getenv("TELEMETRY_TOPIC_PREFIX", "jetson/telemetry")
+TOPIC_SAMPLE = f"{TELEMETRY_TOPIC_PREFIX}/sample"
+TOPIC_PROCESSES = f"{TELEMETRY_TOPIC_PREFIX}/processes"
+PROC_INTERVAL = float(os.getenv("TELEMETRY_PROC_INTERVAL_SECONDS", "1"))
+PROC_RESCAN_SECONDS = float(os.getenv("TELEMETRY_PROC_RESCAN_SECONDS", "30"))
+PID_DIR = Path(
+    os.getenv(
+        "TELEMETRY_PID_DIR",
+        os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "run")),
+    )
+)
+# name=substring pairs matched against /proc/<pid>/cmdline when no PID file exists.
+PROC_PATTERNS = os.getenv(
+    "TELEMETRY_PROC_PATTERNS",
+    "server=backend/server.js,"
+    "deepstream=deepstream-test5-app,"
+    "mediamtx=mediamtx.yml,"
+    "data_manager=data_manager.py,"
+    "telemetry=jetson_telemetry.py,"
+    "relay_emulator=relay_emulator.py,"
+    "perf_tailer=deepstream_perf.py,"
+    "led_notifier=person_led_mqtt.py",
+)
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
 
+# Root of the sysfs/procfs paths below; point it at a fake tree to run the
+# readers off-device (backend/bench/microbench.py does).
+FS_ROOT = Path(os.getenv("TELEMETRY_FS_ROOT", "/"))
 
-def _read_first(paths: list[Path]) -> str | None:
-    for p in paths:
+metrics = service_metrics.Registry("jetson-telemetry")
+collect_seconds = metrics.histogram("telemetry_collect_seconds", "Time to read one tick's values", ("kind",))
+
+
+def host_path(path: str) -> Path:
+    return FS_ROOT / path.lstrip("/")
+
+
+GPU_LOAD_PATHS = [
+    host_path("/sys/devices/gpu.0/load"),
+    host_path("/sys/devices/17000000.ga10b/load"),
+    host_path("/sys/devices/57000000.gpu/load"),
+]
+EMC_RATE_PATHS = [
+    host_path("/sys/kernel/debug/bpmp/debug/clk/emc/rate"),
+    host_path("/sys/kernel/debug/clk/emc/clk_rate"),
+    host_path("/sys/kernel/debug/clk/override.emc/clk_rate"),
+]
+THERMAL_DIR = host_path("/sys/devices/virtual/thermal")
+PROC_STAT_PATH = host_path("/proc/stat")
+MEMINFO_PATH = host_path("/proc/meminfo")
+I2C_DRIVERS_DIR = host_path("/sys/bus/i2c/drivers")
+MEMINFO_KEYS = {
+    "MemTotal": "total_kb",
+    "MemAvailable": "avail_kb",
+    "SwapTotal": "swap_total_kb",
+    "SwapFree": "swap_free_kb",
+}
+
+
+class CachedFile:
+    """An open read-only fd that is re-read from offset 0 on every call."""
+
+    def __init__(self, path: Path, size: int = 4096):
+        self.path = path
+        self.size = size
+        self.fd: int | None = None
+
+    def read(self) -> str | None:
+        if self.fd is None:
+            try:
+                self.fd = os.open(self.path, os.O_RDONLY)
+            except OSError:
+                return None
         try:
-            return p.read_text().strip()
-        except Exception:
-            continue
+            return os.pread(self.fd, self.size, 0).decode("utf-8", errors="ignore")
+        except OSError:
+            self.close()
+            return None
+
+    def read_number(self) -> float | None:
+        raw = self.read()
+        if raw is None:
+            return None
+        try:
+            return float(raw.strip())
+        except ValueError:
+            return None
+
+    def close(self):
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+
+
+def _open_first(paths: list[Path]) -> CachedFile | None:
+    for p in paths:
+        handle = CachedFile(p)
+        if handle.read() is not None:
+            return handle
     return None
 
 
+_gpu_load: CachedFile | None = None
+_gpu_load_resolved = False
+_thermal_zones: list[tuple[str, CachedFile]] | None = None
+
+
 def read_gpu_usage_percent() -> float | None:
     # Common Jetson paths; values are 0..1000 for 0..100% on many devices.
-    candidates = [
-        Path("/sys/devices/gpu.0/load"),
-        Path("/sys/devices/17000000.ga10b/load"),
-        Path("/sys/devices/57000000.gpu/load"),
-    ]
-    raw = _read_first(candidates)
-    if raw is None:
+    global _gpu_load, _gpu_load_resolved
+    if not _gpu_load_resolved:
+        _gpu_load = _open_first(GPU_LOAD_PATHS)
+        _gpu_load_resolved = True
+    val = _gpu_load.read_number() if _gpu_load else None
+    if val is None:
         gpu, _ = read_from_tegrastats()
         return gpu
-    try:
-        val = float(raw)
-        if val > 100:
-            return round(val / 10.0, 2)
-        return round(val, 2)
-    except Exception:
-        return None
+    if val > 100:
+        return round(val / 10.0, 2)
+    return round(val, 2)
 
 
 def read_temperature_c() -> float | None:
     # Prefer GPU therm if present, otherwise take the max temp.
-    zones = list(Path("/sys/devices/virtual/thermal").glob("thermal_zone*"))
+    global _thermal_zones
+    if _thermal_zones is None:
+        _thermal_zones = []
+        for zone in sorted(THERMAL_DIR.glob("thermal_zone*")):
+            try:
+                ztype = (zone / "type").read_text().strip()
+            except Exception:
+                continue
+            _thermal_zones.append((ztype, CachedFile(zone / "temp", 64)))
     best = None
-    best_type = None
-    for zone in zones:
-        try:
-            ztype = (zone / "type").read_text().strip()
-            ztemp = (zone / "temp").read_text().strip()
-        except Exception:
-            continue
-        try:
-            temp_c = float(ztemp) / 1000.0
-        except Exception:
+    for ztype, handle in _thermal_zones:
+        ztemp = handle.read_number()
+        if ztemp is None:
             continue
+        temp_c = ztemp / 1000.0
         if ztype.lower().startswith("gpu"):
             return round(temp_c, 2)
         if best is None or temp_c > best:
             best = temp_c
-            best_type = ztype
     if best is not None:
         return round(best, 2)
     _, temp = read_from_tegrastats()
@@ -122,16 +237,324 @@ def read_from_tegrastats() -> tuple[float | None, float | None]:
     return (gpu, temp)
 
 
+class CpuReader:
+    """Per-core utilization (0..100) from /proc/stat deltas between calls."""
+
+    def __init__(self, path: Path = PROC_STAT_PATH):
+        # Only the leading cpuN lines are parsed; the long intr line is not needed.
+        self.handle = CachedFile(path, 16384)
+        self.prev: dict[str, tuple[int, int]] = {}
+
+    def read(self) -> list[float] | None:
+        raw = self.handle.read()
+        if raw is None:
+            return None
+        cores = []
+        for line in raw.splitlines():
+            if not line.startswith("cpu"):
+                break
+            fields = line.split()
+            name = fields[0]
+            if name == "cpu":
+                continue
+            values = [int(v) for v in fields[1:]]
+            # idle + iowait count as not busy.
+            idle = values[3] + (values[4] if len(values) > 4 else 0)
+            total = sum(values[:8])
+            prev = self.prev.get(name)
+            self.prev[name] = (idle, total)
+            if prev is None or total <= prev[1]:
+                cores.append(0.0)
+                continue
+            d_total = total - prev[1]
+            d_idle = idle - prev[0]
+            cores.append(round(100.0 * (d_total - d_idle) / d_total, 1))
+        return cores
+
+
+class MemReader:
+    def __init__(self, path: Path = MEMINFO_PATH):
+        self.handle = CachedFile(path, 4096)
+
+    def read(self) -> dict | None:
+        raw = self.handle.read()
+        if raw is None:
+            return None
+        mem = {}
+        for line in raw.splitlines():
+            key, _, rest = line.partition(":")
+            out_key = MEMINFO_KEYS.get(key)
+            if out_key is None:
+                continue
+            try:
+                mem[out_key] = int(rest.split()[0])
+            except (IndexError, ValueError):
+                continue
+            if len(mem) == len(MEMINFO_KEYS):
+                break
+        return mem or None
+
+
+class EmcReader:
+    def __init__(self, paths: list[Path] = EMC_RATE_PATHS):
+        self.handle = _open_first(paths)
+
+    def read(self) -> float | None:
+        if self.handle is None:
+            return None
+        rate_hz = self.handle.read_number()
+        if rate_hz is None:
+            return None
+        return round(rate_hz / 1_000_000.0, 1)
+
+
+class PowerRailReader:
+    """
+    INA3221 power rails. Supports the hwmon layout (JetPack 5/6) and the
+    legacy iio layout (JetPack 4). Units: mV, mA, mW.
+    """
+
+    def __init__(self, root: Path = I2C_DRIVERS_DIR):
+        self.rails: list[tuple[str, CachedFile, CachedFile, CachedFile | None]] = []
+        for label_path in sorted(root.glob("ina3221*/*/hwmon/hwmon*/in*_label")):
+            channel = label_path.name[len("in") : -len("_label")]
+            base = label_path.parent
+            self._add(label_path, base / f"in{channel}_input", base / f"curr{channel}_input", None)
+        for label_path in sorted(root.glob("ina3221x/*/iio:device*/rail_name_*")):
+            channel = label_path.name.rsplit("_", 1)[1]
+            base = label_path.parent
+            self._add(
+                label_path,
+                base / f"in_voltage{channel}_input",
+                base / f"in_current{channel}_input",
+                base / f"in_power{channel}_input",
+            )
+
+    def _add(self, label_path: Path, volt: Path, curr: Path, power: Path | None):
+        try:
+            label = label_path.read_text().strip()
+        except Exception:
+            return
+        if not label or label.upper().startswith("NC"):
+            return
+        self.rails.append((label, CachedFile(volt, 64), CachedFile(curr, 64), CachedFile(power, 64) if power else None))
+
+    def read(self) -> dict | None:
+        if not self.rails:
+            return None
+        rails = {}
+        for label, volt, curr, power in self.rails:
+            mv = volt.read_number()
+            ma = curr.read_number()
+            if mv is None or ma is None:
+                continue
+            mw = power.read_number() if power else None
+            if mw is None:
+                mw = mv * ma / 1000.0
+            rails[label] = {"mv": int(mv), "ma": int(ma), "mw": int(mw)}
+        return rails or None
+
+
+class SampleCollector:
+    def __init__(self):
+        self.cpu = CpuReader()
+        self.mem = MemReader()
+        self.emc = EmcReader()
+        self.rails = PowerRailReader()
+        # Prime the /proc/stat baseline so the first published sample has real deltas.
+        self.cpu.read()
+
+    def collect(self, ts: int, gpu: float | None, temp: float | None) -> dict:
+        sample = {"type": "sample", "ts": ts}
+        fields = {
+            "gpu": gpu,
+            "temp": temp,
+            "cpu": self.cpu.read(),
+            "mem": self.mem.read(),
+            "emc_mhz": self.emc.read(),
+            "rails": self.rails.read(),
+        }
+        sample.update({k: v for k, v in fields.items() if v is not None})
+        return sample
+
+
+def parse_proc_patterns(raw: str) -> dict[str, str]:
+    patterns = {}
+    for item in raw.split(","):
+        name, sep, needle = item.partition("=")
+        if sep and name.strip() and needle.strip():
+            patterns[name.strip()] = needle.strip()
+    return patterns
+
+
+class ProcessStats:
+    """Open /proc/<pid>/stat + status handles and the previous counters for one process."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.stat = CachedFile(Path(f"/proc/{pid}/stat"), 1024)
+        self.status = CachedFile(Path(f"/proc/{pid}/status"), 4096)
+        self.start_time: str | None = None
+        self.prev: tuple[float, int, int, int] | None = None
+
+    def read(self, now: float) -> dict | None:
+        raw_stat = self.stat.read()
+        raw_status = self.status.read()
+        if not raw_stat or not raw_status:
+            return None
+        # Fields after "(comm)"; comm itself may contain spaces or parens.
+        fields = raw_stat[raw_stat.rfind(")") + 2 :].split()
+        try:
+            cpu_ticks = int(fields[11]) + int(fields[12])
+            start_time = fields[19]
+        except (IndexError, ValueError):
+            return None
+        if self.start_time is None:
+            self.start_time = start_time
+        elif start_time != self.start_time:
+            # PID was reused by another process.
+            return None
+
+        rss_kb = threads = vcsw = nvcsw = 0
+        for line in raw_status.splitlines():
+            key, _, rest = line.partition(":")
+            if key == "VmRSS":
+                rss_kb = int(rest.split()[0])
+            elif key == "Threads":
+                threads = int(rest)
+            elif key == "voluntary_ctxt_switches":
+                vcsw = int(rest)
+            elif key == "nonvoluntary_ctxt_switches":
+                nvcsw = int(rest)
+
+        prev = self.prev
+        self.prev = (now, cpu_ticks, vcsw, nvcsw)
+        out = {"pid": self.pid, "rss_kb": rss_kb, "threads": threads}
+        if prev is None or now <= prev[0]:
+            return out
+        elapsed = now - prev[0]
+        # 100 = one full core, same as top.
+        out["cpu"] = round(100.0 * (cpu_ticks - prev[1]) / CLK_TCK / elapsed, 1)
+        out["vcsw_s"] = round((vcsw - prev[2]) / elapsed, 1)
+        out["nvcsw_s"] = round((nvcsw - prev[3]) / elapsed, 1)
+        return out
+
+    def close(self):
+        self.stat.close()
+        self.status.close()
+
+
+class ProcessTracker:
+    def __init__(self, pid_dir: Path = PID_DIR, patterns: dict[str, str] | None = None):
+        self.pid_dir = pid_dir
+        self.patterns = parse_proc_patterns(PROC_PATTERNS) if patterns is None else patterns
+        self.tracked: dict[str, ProcessStats] = {}
+        self.pid_dir_mtime: float | None = None
+        self.next_rescan = 0.0
+
+    def _pid_dir_changed(self) -> bool:
+        try:
+            mtime = self.pid_dir.stat().st_mtime
+        except OSError:
+            mtime = None
+        changed = mtime != self.pid_dir_mtime
+        self.pid_dir_mtime = mtime
+        return changed
+
+    def _discover(self) -> dict[str, int]:
+        found = {}
+        for pid_file in self.pid_dir.glob("*.pid"):
+            try:
+                pid = int(pid_file.read_text().strip())
+            except Exception:
+                continue
+            if os.path.exists(f"/proc/{pid}"):
+                found[pid_file.stem] = pid
+        missing = {name: needle for name, needle in self.patterns.items() if name not in found}
+        if not missing:
+            return found
+        own_pid = os.getpid()
+        for entry in os.scandir("/proc"):
+            if not entry.name.isdigit() or int(entry.name) == own_pid:
+                continue
+            try:
+                with open(f"/proc/{entry.name}/cmdline", "rb") as handle:
+                    cmdline = handle.read().replace(b"\0", b" ").decode("utf-8", errors="ignore")
+            except OSError:
+                continue
+            for name, needle in list(missing.items()):
+                if needle in cmdline:
+                    found[name] = int(entry.name)
+                    del missing[name]
+            if not missing:
+                break
+        return found
+
+    def _rescan(self):
+        found = self._discover()
+        for name in list(self.tracked):
+            if found.get(name) != self.tracked[name].pid:
+                self.tracked.pop(name).close()
+        for name, pid in found.items():
+            if name not in self.tracked:
+                self.tracked[name] = ProcessStats(pid)
+
+    def sample(self, now: float) -> dict:
+        if self._pid_dir_changed() or now >= self.next_rescan:
+            self._rescan()
+            self.next_rescan = now + PROC_RESCAN_SECONDS
+        procs = {}
+        for name, stats in list(self.tracked.items()):
+            result = stats.read(now)
+            if result is None:
+                # Exited (or PID reused); look again on the next tick.
+                self.tracked.pop(name).close()
+                self.next_rescan = 0.0
+                continue
+            procs[name] = result
+        return procs
+
+
 def main() -> None:
     client = mqtt.Client(client_id=MQTT_CLIENT_ID)
+    metrics.instrument(client)
+    metrics.serve(METRICS_PORT)
     client.connect(MQTT_HOST, MQTT_PORT, 60)
     client.loop_start()
+    metrics.start_publisher(client)
 
-    print(f"[telemetry] MQTT {MQTT_HOST}:{MQTT_PORT} interval={INTERVAL}s")
+    collector = SampleCollector()
+    tracker = ProcessTracker()
+    print(
+        f"[telemetry] MQTT {MQTT_HOST}:{MQTT_PORT} interval={INTERVAL}s "
+        f"proc_interval={PROC_INTERVAL}s rails={len(collector.rails.rails)}"
+    )
 
+    next_sample = time.monotonic()
+    next_proc = next_sample
     try:
         while True:
+            now = time.monotonic()
+            if PROC_INTERVAL > 0 and now >= next_proc:
+                next_proc = max(next_proc + PROC_INTERVAL, now)
+                started = time.perf_counter()
+                procs = tracker.sample(now)
+                collect_seconds.observe(time.perf_counter() - started, "processes")
+                if procs:
+                    payload = json.dumps(
+                        {"type": "processes", "ts": int(time.time() * 1000), "procs": procs},
+                        separators=(",", ":"),
+                    )
+                    info = client.publish(TOPIC_PROCESSES, payload, qos=MQTT_QOS, retain=False)
+                    if DEBUG:
+                        print(f"[telemetry] {TOPIC_PROCESSES} {payload} rc={info.rc}")
+            if now < next_sample:
+                wake = next_sample if PROC_INTERVAL <= 0 else min(next_sample, next_proc)
+                time.sleep(max(0.0, wake - time.monotonic()))
+                continue
+            next_sample = max(next_sample + INTERVAL, now)
             ts = int(time.time() * 1000)
+            started = time.perf_counter()
             gpu = read_gpu_usage_percent()
             temp = read_temperature_c()
             if gpu is not None:
@@ -144,9 +567,14 @@ def main() -> None:
                 info = client.publish(TOPIC_TEMP, payload, qos=MQTT_QOS, retain=False)
                 if DEBUG:
                     print(f"[telemetry] {TOPIC_TEMP} {payload} rc={info.rc}")
+            sample = collector.collect(ts, gpu, temp)
+            collect_seconds.observe(time.perf_counter() - started, "sample")
+            payload = json.dumps(sample, separators=(",", ":"))
+            info = client.publish(TOPIC_SAMPLE, payload, qos=MQTT_QOS, retain=False)
+            if DEBUG:
+                print(f"[telemetry] {TOPIC_SAMPLE} {payload} rc={info.rc}")
             if DEBUG and gpu is None and temp is None:
                 print("[telemetry] No telemetry values found this cycle")
-            time.sleep(INTERVAL)
     except KeyboardInterrupt:
         pass
     finally:
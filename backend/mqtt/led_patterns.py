@@ -0,0 +1,278 @@
+"""
+Multi-pin LED pattern engine for the LED notifier.
+
+Patterns (JSON specs):
+  "off" / "solid"
+  {"type": "blink", "hz": 2}
+  {"type": "double_flash", "period": 1.0, "flash": 0.1}
+  {"type": "pwm", "duty": 0.25, "hz": 100}       (software PWM brightness)
+
+Rules map MQTT messages to patterns, first matching case wins:
+  {"topic": "deepstream/person_count", "pin": 11, "field": "count",
+   "match": {"stream_id": 0},
+   "cases": [{"min": 3, "pattern": "solid"},
+             {"min": 1, "pattern": {"type": "pwm", "duty": 0.3}, "hold": 5},
+             {"pattern": "off"}]}
+A case matches on "equals" (exact value), "min" (numeric >=) or always when
+neither is given. "hold" reverts the pin to off that many seconds after the
+last message that selected the pattern.
+
+All pins are timed from one scheduler thread over a heap of due events, so a
+wake-up serves every pin that is due and CPU does not grow with idle pins.
+"""
+
+import heapq
+import itertools
+import json
+import math
+import threading
+import time
+
+# Events due within this window are served in the same wake-up.
+COALESCE_SECONDS = 0.0005
+STEP = 0
+EXPIRE = 1
+
+
+class Pattern:
+    """A repeating cycle of (level, seconds) segments."""
+
+    def __init__(self, key: tuple, segments: list[tuple[bool, float]]):
+        self.key = key
+        self.segments = segments
+
+    @property
+    def name(self) -> str:
+        return " ".join(str(part) for part in self.key)
+
+
+OFF = Pattern(("off",), [(False, math.inf)])
+SOLID = Pattern(("solid",), [(True, math.inf)])
+
+
+def parse_pattern(spec) -> Pattern:
+    if isinstance(spec, str):
+        spec = {"type": spec}
+    kind = spec.get("type", "off")
+    if kind == "off":
+        return OFF
+    if kind == "solid":
+        return SOLID
+    if kind == "blink":
+        hz = float(spec.get("hz", 1.0))
+        half = 0.5 / hz
+        return Pattern(("blink", hz), [(True, half), (False, half)])
+    if kind == "double_flash":
+        period = float(spec.get("period", 1.0))
+        flash = float(spec.get("flash", 0.1))
+        rest = max(period - 3 * flash, flash)
+        return Pattern(("double_flash", period, flash), [(True, flash), (False, flash), (True, flash), (False, rest)])
+    if kind == "pwm":
+        duty = min(max(float(spec.get("duty", 0.5)), 0.0), 1.0)
+        hz = float(spec.get("hz", 100.0))
+        if duty <= 0.0:
+            return OFF
+        if duty >= 1.0:
+            return SOLID
+        period = 1.0 / hz
+        return Pattern(("pwm", duty, hz), [(True, duty * period), (False, (1.0 - duty) * period)])
+    raise ValueError(f"unknown LED pattern: {kind}")
+
+
+class PinState:
+    def __init__(self):
+        self.pattern = OFF
+        self.segment = 0
+        self.gen = 0
+        self.level = False  # matches setup_output(initial=False)
+        self.expires_at: float | None = None
+        # Due time and sequence of the live EXPIRE event; older ones are ignored.
+        self.expire_due: float | None = None
+        self.expire_seq = 0
+
+
+class PatternScheduler(threading.Thread):
+    """
+    Single thread that owns all LED timing. Commands update pin state under a
+    condition variable and wake the thread, so they take effect immediately.
+    Pin levels are cached and GPIO is only written on real transitions.
+    """
+
+    def __init__(self, gpio):
+        super().__init__(name="led-scheduler", daemon=True)
+        self.gpio = gpio
+        self.cond = threading.Condition()
+        self.pins: dict[int, PinState] = {}
+        self.heap: list[tuple[float, int, int, int, int]] = []
+        self.counter = itertools.count()
+        self.running = True
+
+    def add_pin(self, pin: int):
+        with self.cond:
+            if pin in self.pins:
+                return
+            self.gpio.setup_output(pin, initial=False)
+            self.pins[pin] = PinState()
+
+    def set_pattern(self, pin: int, pattern: Pattern, hold: float | None = None) -> bool:
+        """
+        Switch 'pin' to 'pattern'. Re-selecting the running pattern only extends
+        its hold window and keeps its phase. Returns True if the pattern changed.
+        """
+        with self.cond:
+            state = self.pins[pin]
+            now = time.monotonic()
+            state.expires_at = now + hold if hold else None
+            if state.expires_at is not None and (state.expire_due is None or state.expires_at < state.expire_due):
+                # A longer hold waits for the queued event; a shorter one needs its own.
+                self._push_expire(pin, state, state.expires_at)
+                self.cond.notify()
+            if pattern.key == state.pattern.key:
+                return False
+            state.gen += 1
+            state.pattern = pattern
+            state.segment = 0
+            self._push(now, pin, state.gen, STEP)
+            self.cond.notify()
+            return True
+
+    def off(self, pin: int) -> bool:
+        return self.set_pattern(pin, OFF)
+
+    def all_off(self):
+        for pin in list(self.pins):
+            self.off(pin)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.join(timeout=1.0)
+        for pin, state in self.pins.items():
+            self._write(pin, state, False)
+
+    def _push(self, due: float, pin: int, gen: int, kind: int):
+        heapq.heappush(self.heap, (due, next(self.counter), pin, gen, kind))
+
+    def _push_expire(self, pin: int, state: PinState, due: float):
+        state.expire_seq += 1
+        state.expire_due = due
+        self._push(due, pin, state.expire_seq, EXPIRE)
+
+    def _write(self, pin: int, state: PinState, level: bool):
+        if level == state.level:
+            return
+        self.gpio.output(pin, level)
+        state.level = level
+
+    def _step(self, pin: int, state: PinState, due: float, now: float):
+        level, seconds = state.pattern.segments[state.segment]
+        self._write(pin, state, level)
+        if seconds == math.inf:
+            return
+        state.segment = (state.segment + 1) % len(state.pattern.segments)
+        next_due = due + seconds
+        if next_due < now:
+            # Fell behind (e.g. a long GC pause); resync instead of bursting.
+            next_due = now + seconds
+        self._push(next_due, pin, state.gen, STEP)
+
+    def _expire(self, pin: int, state: PinState, now: float):
+        state.expire_due = None
+        if state.expires_at is None:
+            return
+        if now < state.expires_at:
+            # Hold was extended after this event was queued.
+            self._push_expire(pin, state, state.expires_at)
+            return
+        state.expires_at = None
+        state.gen += 1
+        state.pattern = OFF
+        state.segment = 0
+        self._step(pin, state, now, now)
+
+    def run(self):
+        with self.cond:
+            while self.running:
+                now = time.monotonic()
+                while self.heap and self.heap[0][0] <= now + COALESCE_SECONDS:
+                    due, _, pin, gen, kind = heapq.heappop(self.heap)
+                    state = self.pins[pin]
+                    if kind == EXPIRE:
+                        if gen == state.expire_seq:
+                            self._expire(pin, state, now)
+                    elif gen == state.gen:
+                        self._step(pin, state, due, now)
+                timeout = self.heap[0][0] - time.monotonic() if self.heap else None
+                if timeout is None or timeout > 0:
+                    self.cond.wait(timeout)
+
+
+def _to_number(value):
+    try:
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, str) and value.strip():
+            return float(value)
+    except Exception:
+        return None
+    return None
+
+
+class LedRule:
+    def __init__(self, spec: dict):
+        self.topic = spec["topic"]
+        self.pin = int(spec["pin"])
+        self.field = spec.get("field", "state")
+        self.match = {str(k): str(v) for k, v in spec.get("match", {}).items()}
+        self.cases = [
+            (case, parse_pattern(case.get("pattern", "off")), case.get("hold")) for case in spec.get("cases", [])
+        ]
+
+    def evaluate(self, data: dict) -> tuple[Pattern, float | None] | None:
+        for key, expected in self.match.items():
+            if str(data.get(key)) != expected:
+                return None
+        value = data.get(self.field)
+        for case, pattern, hold in self.cases:
+            if "equals" in case and value != case["equals"]:
+                continue
+            if "min" in case:
+                number = _to_number(value)
+                if number is None or number < case["min"]:
+                    continue
+            return pattern, hold
+        return None
+
+
+def default_rules(topic: str, pin: int, hold: float) -> list[LedRule]:
+    """The original notifier: blink at 1 Hz on "toggle" for 'hold' seconds, off otherwise."""
+    return [
+        LedRule(
+            {
+                "topic": topic,
+                "pin": pin,
+                "field": "state",
+                "cases": [
+                    {"equals": "toggle", "pattern": {"type": "blink", "hz": 1}, "hold": hold},
+                    {"pattern": "off"},
+                ],
+            }
+        )
+    ]
+
+
+def load_rules(inline: str | None, path: str | None) -> list[LedRule] | None:
+    """Rules from inline JSON or a JSON file: a list of rules or {"rules": [...]}."""
+    raw = inline
+    if not raw and path:
+        with open(path, "r", encoding="utf-8") as handle:
+            raw = handle.read()
+    if not raw:
+        return None
+    config = json.loads(raw)
+    if isinstance(config, dict):
+        config = config.get("rules", [])
+    return [LedRule(spec) for spec in config]
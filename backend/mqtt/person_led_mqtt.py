@@ -1,114 +1,123 @@
 """
 Minimal MQTT-to-LED trigger using the same Jetson.GPIO pattern you verified.
 Toggles LED on "toggle" command and turns off on "idle".
+GPIO goes through gpio_backend (LED_GPIO_BACKEND=jetson|mock), so the
+notifier also runs off-device with the in-memory mock.
+
+More pins and patterns (per-stream person count, alarm level, ...) are
+configured with LED_PATTERNS (inline JSON) or LED_PATTERNS_FILE; see
+led_patterns.py for the rule format.
+
+MQTT traffic, pattern changes and the scheduler's timer queue are served as
+Prometheus metrics on LED_METRICS_PORT (service_metrics.py).
 """
 
 import json
 import os
 import sys
-import threading
 import time
 
-# Match your working script hint
-os.environ.setdefault("JETSON_MODEL_NAME", "JETSON_ORIN_NANO")
-import Jetson.GPIO as GPIO
 import paho.mqtt.client as mqtt
 
+import gpio_backend
+import led_patterns
+import service_metrics
+
 # Config
 BROKER_HOST = os.getenv("MQTT_HOST", "127.0.0.1")
 BROKER_PORT = int(os.getenv("MQTT_PORT", "1883"))
 TOPIC = os.getenv("LED_TOGGLE_TOPIC", "actuator/led_toggle")
 HOLD_SECONDS = float(os.getenv("LED_HOLD_SECONDS", "5"))
 LED_PIN = int(os.getenv("LED_PIN", "7"))  # BOARD pin number, like your test
+GPIO_BACKEND = os.getenv("LED_GPIO_BACKEND", "jetson")
+PATTERNS_INLINE = os.getenv("LED_PATTERNS")
+PATTERNS_FILE = os.getenv("LED_PATTERNS_FILE")
+METRICS_PORT = int(os.getenv("LED_METRICS_PORT", "9104"))
 
 
-GPIO.setwarnings(False)
-GPIO.setmode(GPIO.BOARD)
-GPIO.setup(LED_PIN, GPIO.OUT, initial=GPIO.LOW)
+gpio = None
+scheduler: led_patterns.PatternScheduler | None = None
+rules: list[led_patterns.LedRule] = []
 
-timer_lock = threading.Lock()
-blink_thread: threading.Thread | None = None
-stop_blink = threading.Event()
-last_high_ts: float = 0.0
+metrics = service_metrics.Registry("person-led")
+pattern_changes = metrics.counter("led_pattern_changes_total", "Pattern switches per pin", ("pin",))
+metrics.gauge("led_scheduler_queue", "Timer entries queued in the LED scheduler", fn=lambda: len(scheduler.heap))
 
 
-def set_led(state: bool):
-    GPIO.output(LED_PIN, GPIO.HIGH if state else GPIO.LOW)
+def init_led(backend=None):
+    """Set up the LED pins on 'backend' (default: LED_GPIO_BACKEND) and start the scheduler."""
+    global gpio, scheduler, rules
+    gpio = backend or gpio_backend.create_backend(GPIO_BACKEND)
+    rules = led_patterns.load_rules(PATTERNS_INLINE, PATTERNS_FILE) or led_patterns.default_rules(
+        TOPIC, LED_PIN, HOLD_SECONDS
+    )
+    scheduler = led_patterns.PatternScheduler(gpio)
+    for rule in rules:
+        scheduler.add_pin(rule.pin)
+    scheduler.start()
 
 
-def blink_for_duration(duration: float, period: float = 0.5):
+def blink_for_duration(duration: float, period: float = 0.5, pin: int | None = None):
     """
     Blink LED for 'duration' seconds (toggle every 'period') after last high event.
     New high events reset the timer; low events stop immediately.
     """
-    global blink_thread, last_high_ts, stop_blink
-
-    def _worker():
-        global blink_thread, last_high_ts
-        state = False
-        while True:
-            with timer_lock:
-                if stop_blink.is_set():
-                    set_led(False)
-                    blink_thread = None
-                    return
-                if time.time() - last_high_ts > duration:
-                    set_led(False)
-                    blink_thread = None
-                    return
-            state = not state
-            set_led(state)
-            time.sleep(period)
-
-    with timer_lock:
-        stop_blink.clear()
-        last_high_ts = time.time()
-        if blink_thread is None or not blink_thread.is_alive():
-            blink_thread = threading.Thread(target=_worker, daemon=True)
-            blink_thread.start()
+    pin = LED_PIN if pin is None else pin
+    scheduler.add_pin(pin)
+    scheduler.set_pattern(pin, led_patterns.parse_pattern({"type": "blink", "hz": 0.5 / period}), hold=duration)
 
 
 def cleanup():
-    with timer_lock:
-        global blink_thread, last_high_ts
-        stop_blink.set()
-        last_high_ts = 0.0
-        blink_thread = None
-    set_led(False)
-    GPIO.cleanup(LED_PIN)
+    scheduler.stop()
+    for pin in scheduler.pins:
+        gpio.cleanup(pin)
 
 
 def on_message(client, userdata, msg):
     try:
         data = json.loads(msg.payload.decode("utf-8"))
-        state = data.get("state")
     except Exception:
         return
-    if state == "toggle":
-        print(f"[MQTT] state=toggle → LED BLINK {HOLD_SECONDS}s window")
-        blink_for_duration(HOLD_SECONDS, period=0.5)
-    else:
-        print("[MQTT] state=idle → stop")
-        stop_blink.set()
-        set_led(False)
+    if not isinstance(data, dict):
+        return
+    for rule in rules:
+        if not mqtt.topic_matches_sub(rule.topic, msg.topic):
+            continue
+        result = rule.evaluate(data)
+        if result is None:
+            continue
+        pattern, hold = result
+        if scheduler.set_pattern(rule.pin, pattern, hold):
+            pattern_changes.inc(rule.pin)
+            hold_label = f" for {hold}s" if hold else ""
+            print(f"[MQTT] {msg.topic} → pin {rule.pin} {pattern.name}{hold_label}")
 
 
 def on_connect(client, userdata, flags, rc, properties=None):
-    print(f"[MQTT] Connected rc={rc}; subscribing to {TOPIC}")
-    client.subscribe(TOPIC)
+    topics = sorted({rule.topic for rule in rules})
+    print(f"[MQTT] Connected rc={rc}; subscribing to {', '.join(topics)}")
+    for topic in topics:
+        client.subscribe(topic)
 
 
 def main():
+    init_led()
+
     # Self-test blink
-    print(f"[INIT] Self-test blink on LED pin {LED_PIN}")
-    blink_for_duration(1.0, period=0.25)
+    pins = sorted(scheduler.pins)
+    print(f"[INIT] Self-test blink on LED pins {pins} ({gpio.name})")
+    for pin in pins:
+        blink_for_duration(1.0, period=0.25, pin=pin)
     time.sleep(1.2)
 
     client = mqtt.Client()
     client.on_connect = on_connect
     client.on_message = on_message
+    metrics.instrument(client)
+    metrics.serve(METRICS_PORT)
     client.connect(BROKER_HOST, BROKER_PORT, 60)
     client.loop_start()
+    metrics.start_publisher(client)
 
     try:
         while True:
@@ -0,0 +1,157 @@
+"""
+Per-process CPU/IO scheduling profiles for launched services.
+
+Profiles (JSON, keyed by process name as used by server.js/command_listener):
+  {"deepstream":   {"cpus": "2-5", "nice": -5},
+   "data_manager": {"cpus": "0-1", "nice": 10, "ionice": "idle",
+                    "cpu_max": "50%", "memory_max": "256M"}}
+  cpus        affinity list ("0-1,4" or [0, 1])
+  nice        scheduling priority (negative values need CAP_SYS_NICE)
+  ionice      "idle", "best-effort[:0-7]" or "realtime[:0-7]"
+  cpu_max     cgroup v2 cpu.max: "50%" of one core or a raw "max 100000"
+  memory_max  cgroup v2 memory.max, e.g. "256M"
+cgroup limits put the process in <PROCESS_CGROUP_ROOT>/<name> (needs write
+access to the cgroup v2 hierarchy). Every setting is best-effort: a failure
+is logged and the process still starts.
+
+Used as an exec wrapper so the profile is in place before the service runs,
+and inherited by everything it spawns:
+    python3 backend/mqtt/process_profiles.py data_manager -- python3 data_manager.py
+Profiles come from PROCESS_PROFILES (inline JSON) or PROCESS_PROFILES_FILE; a
+name without a profile just execs the command.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+PROFILES_INLINE = os.getenv("PROCESS_PROFILES")
+PROFILES_FILE = os.getenv("PROCESS_PROFILES_FILE")
+CGROUP_ROOT = os.getenv("PROCESS_CGROUP_ROOT", "/sys/fs/cgroup/jetson-iot")
+CPU_PERIOD_US = 100000
+IONICE_CLASSES = {"realtime": "1", "best-effort": "2", "idle": "3"}
+ONLINE_CPUS_PATH = "/sys/devices/system/cpu/online"
+
+
+def load_profiles(inline: str | None = PROFILES_INLINE, path: str | None = PROFILES_FILE) -> dict:
+    raw = inline
+    if not raw and path:
+        with open(path, "r", encoding="utf-8") as handle:
+            raw = handle.read()
+    return json.loads(raw) if raw else {}
+
+
+def parse_cpus(spec) -> set[int]:
+    if isinstance(spec, (list, tuple)):
+        return {int(cpu) for cpu in spec}
+    cpus = set()
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def online_cpus() -> set[int]:
+    """CPUs the kernel has online, regardless of this process's own affinity."""
+    try:
+        with open(ONLINE_CPUS_PATH, "r", encoding="utf-8") as handle:
+            return parse_cpus(handle.read())
+    except OSError:
+        return set(range(os.cpu_count() or 1))
+
+
+def parse_cpu_max(spec) -> str:
+    spec = str(spec).strip()
+    if spec.endswith("%"):
+        quota = int(CPU_PERIOD_US * float(spec[:-1]) / 100.0)
+        return f"{max(quota, 1000)} {CPU_PERIOD_US}"
+    return spec
+
+
+def _write(path: str, value: str):
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write(value)
+
+
+def join_cgroup(name: str, pid: int, cpu_max=None, memory_max=None):
+    os.makedirs(CGROUP_ROOT, exist_ok=True)
+    try:
+        _write(os.path.join(CGROUP_ROOT, "cgroup.subtree_control"), "+cpu +memory")
+    except OSError:
+        pass  # already enabled, or the parent does not delegate them
+    path = os.path.join(CGROUP_ROOT, name)
+    os.makedirs(path, exist_ok=True)
+    if cpu_max is not None:
+        _write(os.path.join(path, "cpu.max"), parse_cpu_max(cpu_max))
+    if memory_max is not None:
+        _write(os.path.join(path, "memory.max"), str(memory_max))
+    _write(os.path.join(path, "cgroup.procs"), str(pid))
+
+
+def apply_profile(name: str, profile: dict, pid: int = 0) -> list[str]:
+    """Apply 'profile' to 'pid' (0 = this process). Returns what was applied."""
+    pid = pid or os.getpid()
+    applied = []
+
+    def attempt(label: str, action):
+        try:
+            action()
+            applied.append(label)
+        except Exception as exc:
+            print(f"[process-profiles] {name}: {label} failed: {exc}", file=sys.stderr)
+
+    if "cpus" in profile:
+        # Not the launcher's own mask: a "server" pinned to 0-1 still starts a deepstream on 2-5.
+        cpus = parse_cpus(profile["cpus"]) & online_cpus()
+        if cpus:
+            attempt(f"cpus={sorted(cpus)}", lambda: os.sched_setaffinity(pid, cpus))
+        else:
+            print(f"[process-profiles] {name}: none of cpus {profile['cpus']} are online", file=sys.stderr)
+    if "nice" in profile:
+        attempt(f"nice={profile['nice']}", lambda: os.setpriority(os.PRIO_PROCESS, pid, int(profile["nice"])))
+    if "ionice" in profile:
+        kind, _, level = str(profile["ionice"]).partition(":")
+        args = ["ionice", "-c", IONICE_CLASSES[kind]] + (["-n", level] if level else []) + ["-p", str(pid)]
+        attempt(f"ionice={profile['ionice']}", lambda: subprocess.run(args, check=True, capture_output=True))
+    if "cpu_max" in profile or "memory_max" in profile:
+        attempt(
+            f"cgroup={name}",
+            lambda: join_cgroup(name, pid, profile.get("cpu_max"), profile.get("memory_max")),
+        )
+    if applied:
+        print(f"[process-profiles] {name} pid={pid}: {', '.join(applied)}", file=sys.stderr)
+    return applied
+
+
+def wrap_command(name: str, command: list[str], profiles: dict) -> list[str]:
+    """Prefix 'command' with this wrapper when 'name' has a profile."""
+    if name not in profiles:
+        return command
+    return [sys.executable, os.path.abspath(__file__), name, "--"] + command
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) < 3 or args[1] != "--":
+        print("usage: process_profiles.py NAME -- COMMAND [ARGS...]", file=sys.stderr)
+        sys.exit(2)
+    name, command = args[0], args[2:]
+    try:
+        profile = load_profiles().get(name)
+    except Exception as exc:
+        print(f"[process-profiles] cannot load profiles: {exc}", file=sys.stderr)
+        profile = None
+    if profile:
+        apply_profile(name, profile)
+    os.execvp(command[0], command)
+
+
+if __name__ == "__main__":
+    main()
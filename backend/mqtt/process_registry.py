@@ -0,0 +1,209 @@
+"""
+Registry of named child processes with readiness probes.
+
+A ManagedProcess is spawned in its own session (so stop() takes down its whole
+process group) and is "ready" once its probe succeeds, e.g. the web server
+answering GET /api/status. start() only spawns; wait_ready() blocks until the
+probe passes so callers can warm a process in the background and wait for it
+later. Stage timings are kept in milliseconds relative to the spawn.
+
+With an OutputBuffer, stdout/stderr go through a pipe drained by a reader
+thread that only appends to bounded deques, so a slow consumer (e.g. a
+congested MQTT link) can never fill the pipe and stall the child; old lines
+are dropped instead.
+"""
+
+import collections
+import os
+import signal
+import subprocess
+import threading
+import time
+import urllib.request
+
+PROBE_INTERVAL_SECONDS = 0.05
+READ_CHUNK = 4096
+MAX_LINE_CHARS = 1000
+
+
+def http_probe(url: str, timeout: float = 1.0):
+    """Probe that passes when 'url' answers with a 2xx status."""
+
+    def probe() -> bool:
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as resp:
+                return 200 <= resp.status < 300
+        except Exception:
+            return False
+
+    return probe
+
+
+class OutputBuffer:
+    """
+    Captured output lines: 'history' keeps the last lines for tail requests,
+    'pending' holds lines not yet published. Both are bounded ring buffers.
+    """
+
+    def __init__(self, history_lines: int = 500, pending_lines: int = 1000):
+        self.history: collections.deque[str] = collections.deque(maxlen=history_lines)
+        self.pending: collections.deque[str] = collections.deque(maxlen=pending_lines)
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def append(self, line: str):
+        with self.lock:
+            self.history.append(line)
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(line)
+
+    def drain(self, max_lines: int) -> tuple[list[str], int]:
+        """Up to 'max_lines' pending lines plus the count dropped since the last drain."""
+        with self.lock:
+            lines = [self.pending.popleft() for _ in range(min(max_lines, len(self.pending)))]
+            dropped, self.dropped = self.dropped, 0
+            return lines, dropped
+
+    def tail(self, count: int) -> list[str]:
+        with self.lock:
+            return list(self.history)[-count:] if count > 0 else []
+
+
+def _pump(stream, output: OutputBuffer, echo_prefix: str | None):
+    fd = stream.fileno()
+    partial = b""
+    while True:
+        try:
+            chunk = os.read(fd, READ_CHUNK)
+        except OSError:
+            chunk = b""
+        if not chunk:
+            break
+        lines = (partial + chunk).split(b"\n")
+        partial = lines.pop()
+        if len(partial) > MAX_LINE_CHARS:
+            lines.append(partial)
+            partial = b""
+        for raw in lines:
+            line = raw.decode("utf-8", errors="replace").rstrip("\r")[:MAX_LINE_CHARS]
+            output.append(line)
+            if echo_prefix:
+                print(f"{echo_prefix} {line}")
+    if partial:
+        output.append(partial.decode("utf-8", errors="replace")[:MAX_LINE_CHARS])
+    stream.close()
+
+
+class ManagedProcess:
+    def __init__(
+        self,
+        name: str,
+        command: list[str],
+        cwd: str | None = None,
+        env: dict | None = None,
+        probe=None,
+        output: OutputBuffer | None = None,
+        echo_output: bool = False,
+    ):
+        self.name = name
+        self.command = command
+        self.cwd = cwd
+        self.env = env
+        self.probe = probe
+        self.output = output
+        self.echo_output = echo_output
+        self.process: subprocess.Popen | None = None
+        self.started_at = 0.0
+        self.ready_at: float | None = None
+        self.timings: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    @property
+    def pid(self) -> int | None:
+        return self.process.pid if self.process else None
+
+    def start(self) -> dict:
+        with self.lock:
+            if self.running:
+                return {"status": "already_running", "pid": self.process.pid}
+            self.started_at = time.monotonic()
+            self.ready_at = None
+            pipe = subprocess.PIPE if self.output else None
+            self.process = subprocess.Popen(
+                self.command,
+                cwd=self.cwd,
+                env=self.env,
+                stdout=pipe,
+                stderr=subprocess.STDOUT if self.output else None,
+                start_new_session=True,
+            )
+            if self.output:
+                threading.Thread(
+                    target=_pump,
+                    args=(self.process.stdout, self.output, f"[{self.name}]" if self.echo_output else None),
+                    name=f"{self.name}-output",
+                    daemon=True,
+                ).start()
+            self.timings = {"spawn_ms": round((time.monotonic() - self.started_at) * 1000.0, 1)}
+            print(f"[process-registry] {self.name} started pid={self.process.pid}")
+            return {"status": "started", "pid": self.process.pid}
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Poll the probe until it passes, the process exits or 'timeout' expires."""
+        if self.ready_at is not None:
+            return True
+        deadline = time.monotonic() + timeout
+        while self.running:
+            if self.probe is None or self.probe():
+                self.ready_at = time.monotonic()
+                self.timings["ready_ms"] = round((self.ready_at - self.started_at) * 1000.0, 1)
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(PROBE_INTERVAL_SECONDS)
+        return False
+
+    def stop(self, timeout: float) -> dict:
+        with self.lock:
+            if not self.running:
+                self.process = None
+                return {"status": "not_running"}
+            started = time.monotonic()
+            result = {"status": "stopped", "pid": self.process.pid}
+            try:
+                os.killpg(self.process.pid, signal.SIGTERM)
+                self.process.wait(timeout=timeout)
+            except Exception:
+                result["status"] = "killed"
+                try:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                except Exception:
+                    pass
+            result["stop_ms"] = round((time.monotonic() - started) * 1000.0, 1)
+            print(f"[process-registry] {self.name} {result['status']}")
+            self.process = None
+            self.ready_at = None
+            return result
+
+
+class ProcessRegistry:
+    def __init__(self):
+        self.processes: dict[str, ManagedProcess] = {}
+
+    def add(self, managed: ManagedProcess) -> ManagedProcess:
+        self.processes[managed.name] = managed
+        return managed
+
+    def get(self, name: str) -> ManagedProcess:
+        return self.processes[name]
+
+    def running(self) -> list[ManagedProcess]:
+        return [managed for managed in self.processes.values() if managed.running]
+
+    def stop_all(self, timeout: float) -> dict:
+        return {managed.name: managed.stop(timeout) for managed in self.running()}
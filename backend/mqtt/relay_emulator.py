@@ -1,18 +1,43 @@
 """
 Fake relay actuator: subscribes to relay commands and logs state changes.
+Commands carrying an "id" are always answered on the status topic with the
+same "id", so the Data Manager can match acks to commands.
+
+Fleet mode (RELAY_FLEET_SIZE > 0) emulates that many relays from one asyncio
+loop for load testing: commands on actuator/relay/<id>, status on
+actuator/relay_status/<id>, with configurable actuation delay, failure and
+drop probabilities. Every non-dropped command gets a status that echoes the
+command's "id" and "ts", and per-relay command→status latency is recorded.
+
+MQTT traffic and (in fleet mode) pending actuations are served as Prometheus
+metrics on RELAY_METRICS_PORT (service_metrics.py).
 """
 
+import asyncio
 import json
 import os
+import random
+import signal
 import time
 
 import paho.mqtt.client as mqtt
 
+import service_metrics
+
 MQTT_URL = os.getenv("MQTT_URL", "mqtt://mqtt-dashboard.com:1883")
 RELAY_COMMAND_TOPIC = os.getenv("RELAY_COMMAND_TOPIC", "actuator/relay")
 RELAY_STATUS_TOPIC = os.getenv("RELAY_STATUS_TOPIC", "actuator/relay_status")
+FLEET_SIZE = int(os.getenv("RELAY_FLEET_SIZE", "0"))
+FLEET_DELAY_MIN_MS = float(os.getenv("RELAY_DELAY_MIN_MS", "0"))
+FLEET_DELAY_MAX_MS = float(os.getenv("RELAY_DELAY_MAX_MS", os.getenv("RELAY_DELAY_MIN_MS", "0")))
+FLEET_FAILURE_PROB = float(os.getenv("RELAY_FAILURE_PROB", "0"))
+FLEET_DROP_PROB = float(os.getenv("RELAY_DROP_PROB", "0"))
+FLEET_STATS_SECONDS = float(os.getenv("RELAY_STATS_SECONDS", "10"))
+FLEET_STATS_PATH = os.getenv("RELAY_STATS_PATH")
+METRICS_PORT = int(os.getenv("RELAY_METRICS_PORT", "9103"))
 
 relay_state = "off"
+metrics = service_metrics.Registry("relay-emulator")
 
 
 def parse_mqtt_url(url: str) -> tuple[str, int]:
@@ -55,20 +80,177 @@ def on_message(client, userdata, msg):
         data = json.loads(msg.payload.decode("utf-8"))
     except Exception:
         data = {"state": msg.payload.decode("utf-8")}
+    if not isinstance(data, dict):
+        data = {"state": data}
     next_state = normalize_state(data.get("state", data.get("value")))
-    if not next_state or next_state == relay_state:
+    command_id = data.get("id")
+    if not next_state:
         return
-    relay_state = next_state
-    payload = json.dumps({"type": "relay", "state": relay_state, "ts": int(time.time() * 1000)})
-    print(f"[relay-emulator] state={relay_state}")
-    client.publish(RELAY_STATUS_TOPIC, payload, qos=0, retain=False)
+    if next_state == relay_state and command_id is None:
+        return
+    if next_state != relay_state:
+        relay_state = next_state
+        print(f"[relay-emulator] state={relay_state}")
+    status = {"type": "relay", "state": relay_state, "ts": int(time.time() * 1000)}
+    if command_id is not None:
+        # Correlated commands are always acknowledged, even retransmits.
+        status["id"] = command_id
+    client.publish(RELAY_STATUS_TOPIC, json.dumps(status), qos=0, retain=False)
+
+
+class RelayStats:
+    def __init__(self):
+        self.commands = 0
+        self.failed = 0
+        self.dropped = 0
+        self.latencies_ms: list[float] = []
+
+
+class RelayFleet:
+    """
+    Thousands of emulated relays on one asyncio loop. paho's network thread
+    hands messages to the loop; actuation delays are loop timers, not threads.
+    """
+
+    def __init__(self, client, loop: asyncio.AbstractEventLoop, size: int):
+        self.client = client
+        self.loop = loop
+        self.size = size
+        self.states = ["off"] * size
+        self.stats = [RelayStats() for _ in range(size)]
+        self.unknown = 0
+        self.pending = 0
+        self.prefix = RELAY_COMMAND_TOPIC.rstrip("/") + "/"
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        print(f"[relay-emulator] fleet of {self.size} connected {MQTT_URL}")
+        client.subscribe(f"{self.prefix}+")
+
+    def on_message(self, client, userdata, msg):
+        # paho network thread → asyncio loop
+        self.loop.call_soon_threadsafe(self.handle_command, msg.topic, msg.payload)
+
+    def handle_command(self, topic: str, raw: bytes):
+        try:
+            relay = int(topic[len(self.prefix) :])
+        except ValueError:
+            relay = -1
+        if not 0 <= relay < self.size:
+            self.unknown += 1
+            return
+        try:
+            data = json.loads(raw.decode("utf-8"))
+        except Exception:
+            data = {"state": raw.decode("utf-8", errors="ignore")}
+        if not isinstance(data, dict):
+            data = {"state": data}
+        stats = self.stats[relay]
+        stats.commands += 1
+        if random.random() < FLEET_DROP_PROB:
+            stats.dropped += 1
+            return
+        delay = random.uniform(FLEET_DELAY_MIN_MS, FLEET_DELAY_MAX_MS) / 1000.0
+        self.pending += 1
+        self.loop.call_later(delay, self.actuate, relay, data)
+
+    def actuate(self, relay: int, data: dict):
+        self.pending -= 1
+        stats = self.stats[relay]
+        next_state = normalize_state(data.get("state", data.get("value")))
+        ok = next_state is not None and random.random() >= FLEET_FAILURE_PROB
+        if ok:
+            self.states[relay] = next_state
+        else:
+            stats.failed += 1
+        now_ms = time.time() * 1000
+        status = {"type": "relay", "relay": relay, "state": self.states[relay], "ok": ok, "ts": int(now_ms)}
+        if "id" in data:
+            status["id"] = data["id"]
+        cmd_ts = data.get("ts")
+        if isinstance(cmd_ts, (int, float)):
+            status["cmd_ts"] = cmd_ts
+            stats.latencies_ms.append(now_ms - cmd_ts)
+        self.client.publish(f"{RELAY_STATUS_TOPIC}/{relay}", json.dumps(status), qos=0, retain=False)
+
+    def summary(self) -> dict:
+        latencies = sorted(v for stats in self.stats for v in stats.latencies_ms)
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))], 2) if latencies else None
+
+        per_relay = {}
+        for relay, stats in enumerate(self.stats):
+            if not stats.commands:
+                continue
+            lat = stats.latencies_ms
+            per_relay[relay] = {
+                "commands": stats.commands,
+                "failed": stats.failed,
+                "dropped": stats.dropped,
+                "mean_ms": round(sum(lat) / len(lat), 2) if lat else None,
+                "max_ms": round(max(lat), 2) if lat else None,
+            }
+        return {
+            "relays": self.size,
+            "commands": sum(s.commands for s in self.stats),
+            "failed": sum(s.failed for s in self.stats),
+            "dropped": sum(s.dropped for s in self.stats),
+            "unknown": self.unknown,
+            "latency_ms": {"p50": pct(50), "p99": pct(99), "max": pct(100)},
+            "per_relay": per_relay,
+        }
+
+    async def report(self):
+        while FLEET_STATS_SECONDS > 0:
+            await asyncio.sleep(FLEET_STATS_SECONDS)
+            summary = self.summary()
+            print(
+                f"[relay-emulator] commands={summary['commands']} failed={summary['failed']} "
+                f"dropped={summary['dropped']} latency_ms={summary['latency_ms']}"
+            )
+
+
+async def run_fleet(host: str, port: int):
+    loop = asyncio.get_running_loop()
+    client = mqtt.Client(client_id=os.getenv("MQTT_CLIENT_ID"))
+    fleet = RelayFleet(client, loop, FLEET_SIZE)
+    client.on_connect = fleet.on_connect
+    client.on_message = fleet.on_message
+    metrics.instrument(client)
+    metrics.gauge("fleet_pending_actuations", "Commands waiting for their actuation delay", fn=lambda: fleet.pending)
+    metrics.serve(METRICS_PORT)
+    metrics.start_publisher(client)
+    client.connect(host, port, 60)
+    client.loop_start()
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    reporter = loop.create_task(fleet.report())
+    try:
+        await stop.wait()
+    finally:
+        reporter.cancel()
+        client.loop_stop()
+        client.disconnect()
+        summary = fleet.summary()
+        if FLEET_STATS_PATH:
+            with open(FLEET_STATS_PATH, "w", encoding="utf-8") as handle:
+                json.dump(summary, handle)
+        print(f"[relay-emulator] final commands={summary['commands']} latency_ms={summary['latency_ms']}")
 
 
 def main():
     host, port = parse_mqtt_url(MQTT_URL)
+    if FLEET_SIZE > 0:
+        asyncio.run(run_fleet(host, port))
+        return
     client = mqtt.Client(client_id=os.getenv("MQTT_CLIENT_ID"))
     client.on_connect = on_connect
     client.on_message = on_message
+    metrics.instrument(client)
+    metrics.serve(METRICS_PORT)
+    metrics.start_publisher(client)
     client.connect(host, port, 60)
     client.loop_forever()
 
@@ -0,0 +1,312 @@
+"""
+Counters, gauges and histograms for the MQTT services.
+
+Each service keeps one Registry. Metrics are plain in-process values (an
+increment is a dict update under a lock, no I/O), and are read out in two ways:
+  - serve(port): Prometheus text format on http://METRICS_HOST:<port>/metrics,
+    from a daemon thread; port 0 disables it
+  - start_publisher(client): a JSON snapshot on <service>/stats every
+    METRICS_STATS_SECONDS (0 = off), only when something changed
+instrument(client) wraps a paho client so every service gets the same MQTT
+metrics without touching its handlers: on_message latency per topic (its
+_count is the messages received), messages published and publish failures per
+topic, the client's outgoing queue depths and connection state.
+
+Gauges may take a callback instead of being set; it runs only when the
+metrics are read, so queue depths cost nothing per event. The number of label
+combinations per metric is capped at METRICS_MAX_SERIES; anything beyond is
+counted under "_other" (e.g. the per-relay topics of a large relay fleet).
+"""
+
+import bisect
+import http.server
+import json
+import os
+import threading
+import time
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_STATS_SECONDS = float(os.getenv("METRICS_STATS_SECONDS", "0"))
+METRICS_MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", "100"))
+
+# Seconds; handler latency from 100 us to 1 s.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+# Seconds; remote writes (DynamoDB) from 10 ms to 5 s.
+WRITE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+OTHER = "_other"
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def series_key(values: tuple) -> str:
+    """Label values as a JSON key: '' without labels, 'a' for one, 'a,b' for more."""
+    return ",".join(str(value) for value in values)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values: dict[tuple, object] = {}
+        self.lock = threading.Lock()
+        self.overflow = (OTHER,) * len(self.labels)
+
+    def _key(self, labels: tuple) -> tuple:
+        # Called with the lock held.
+        if labels in self.values or len(self.values) < METRICS_MAX_SERIES:
+            return labels
+        return self.overflow
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            values = self.values
+            if labels in values:
+                values[labels] += amount
+            else:
+                key = self._key(labels)
+                values[key] = values.get(key, 0) + amount
+
+    def collect(self) -> dict:
+        with self.lock:
+            return dict(self.values)
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{format_labels(self.labels, key)} {format_value(value)}" for key, value in self.collect().items()]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), fn=None):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+
+    def set(self, value: float, *labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def collect(self) -> dict:
+        if self.fn is None:
+            with self.lock:
+                return dict(self.values)
+        try:
+            value = self.fn()
+        except Exception:
+            return {}
+        if isinstance(value, dict):
+            return {key if isinstance(key, tuple) else (key,): item for key, item in value.items()}
+        return {(): value}
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{format_labels(self.labels, key)} {format_value(value)}" for key, value in self.collect().items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                key = self._key(labels)
+                # [per-bucket counts (last one is +Inf), sum]
+                series = self.values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self) -> dict:
+        with self.lock:
+            return {key: (list(counts), total) for key, (counts, total) in self.values.items()}
+
+    def render(self) -> list[str]:
+        lines = []
+        for key, (counts, total) in self.collect().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+    def quantile(self, counts: list[int], q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile (None if it is the +Inf bucket)."""
+        target = q * sum(counts)
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return None
+
+
+class Registry:
+    def __init__(self, service: str):
+        self.service = service
+        self.metrics: list[Metric] = []
+        self.server = None
+
+    def _add(self, metric: Metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: tuple = (), fn=None) -> Gauge:
+        return self._add(Gauge(name, help_text, labels, fn))
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.header() + metric.render()
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Counters and gauges by label values, histograms as count/sum/p50/p99 (bucket upper bounds)."""
+        data = {"service": self.service, "counters": {}, "gauges": {}, "histograms": {}}
+        for metric in self.metrics:
+            values = metric.collect()
+            if not values:
+                continue
+            if isinstance(metric, Histogram):
+                data["histograms"][metric.name] = {
+                    series_key(key): {
+                        "count": sum(counts),
+                        "sum": round(total, 6),
+                        "p50": metric.quantile(counts, 0.5),
+                        "p99": metric.quantile(counts, 0.99),
+                    }
+                    for key, (counts, total) in values.items()
+                }
+                continue
+            group = data["counters" if isinstance(metric, Counter) else "gauges"]
+            group[metric.name] = values[()] if not metric.labels and () in values else {
+                series_key(key): value for key, value in values.items()
+            }
+        return data
+
+    def instrument(self, client):
+        """Count and time the client's traffic; call after on_message is set, before connecting."""
+        messages_out = self.counter("mqtt_messages_out_total", "MQTT messages published", ("topic",))
+        failures = self.counter("mqtt_publish_failures_total", "Publishes paho refused (not connected, queue full)", ("topic",))
+        handler_seconds = self.histogram("mqtt_handler_seconds", "on_message duration (count = messages received)", ("topic",))
+        # paho internals: packets waiting for the socket, and QoS>0 messages in flight or queued.
+        self.gauge("mqtt_out_packets", "Outgoing packets not yet written", fn=lambda: len(client._out_packet))
+        self.gauge("mqtt_out_messages", "Outgoing QoS>0 messages not yet acknowledged", fn=lambda: len(client._out_messages))
+        self.gauge("mqtt_connected", "1 while connected to the broker", fn=lambda: int(client.is_connected()))
+
+        publish = client.publish
+
+        def counted_publish(topic, *args, **kwargs):
+            try:
+                info = publish(topic, *args, **kwargs)
+            except Exception:
+                failures.inc(topic)
+                raise
+            messages_out.inc(topic)
+            if info.rc != 0:
+                failures.inc(topic)
+            return info
+
+        client.publish = counted_publish
+
+        handler = client.on_message
+        if handler is not None:
+
+            def timed_on_message(c, userdata, msg):
+                started = time.perf_counter()
+                try:
+                    handler(c, userdata, msg)
+                finally:
+                    handler_seconds.observe(time.perf_counter() - started, msg.topic)
+
+            client.on_message = timed_on_message
+        return client
+
+    def serve(self, port: int, host: str = METRICS_HOST):
+        """Serve /metrics in Prometheus text format from a daemon thread; returns None if disabled or the port is taken."""
+        if not port:
+            return None
+        registry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                return
+
+        try:
+            self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        except OSError as exc:
+            print(f"[{self.service}] metrics server on {host}:{port} failed: {exc}")
+            return None
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"[{self.service}] metrics on http://{host}:{self.server.server_address[1]}/metrics")
+        return self.server
+
+    def start_publisher(self, client, topic: str | None = None, seconds: float = METRICS_STATS_SECONDS):
+        """Publish snapshot() on 'topic' (default <service>/stats) every 'seconds' when it changed."""
+        if seconds <= 0:
+            return None
+        topic = topic or f"{self.service}/stats"
+
+        def run():
+            last = None
+            while True:
+                time.sleep(seconds)
+                snapshot = self.snapshot()
+                if snapshot == last:
+                    continue
+                payload = dict(snapshot, ts=int(time.time() * 1000))
+                client.publish(topic, json.dumps(payload, separators=(",", ":")), qos=0, retain=False)
+                # Taken after the publish, so the stats message itself does not count as a change.
+                last = self.snapshot()
+
+        thread = threading.Thread(target=run, name="metrics-stats", daemon=True)
+        thread.start()
+        return thread
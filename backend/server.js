@@ -13,7 +13,14 @@ const BACKEND_DIR = __dirname;
 const BASE_DIR = path.join(__dirname, '..');
 const UI_ROOT = path.join(BASE_DIR, 'web-ui', 'dist');
 const LOG_DIR = path.join(BACKEND_DIR, 'data', 'logs');
+const RUN_DIR = path.join(BACKEND_DIR, 'data', 'run');
 const PORT = 8081;
+const PROFILE_WRAPPER = path.join(BACKEND_DIR, 'mqtt', 'process_profiles.py');
+const profilesEnabled = Boolean(process.env.PROCESS_PROFILES || process.env.PROCESS_PROFILES_FILE);
+if (process.env.PROCESS_PROFILES_FILE) {
+  // Children run from other working directories.
+  process.env.PROCESS_PROFILES_FILE = path.resolve(process.env.PROCESS_PROFILES_FILE);
+}
 const CONFIG_WEB = path.join(BACKEND_DIR, 'deepstream', 'configs/DeepStream-Yolo/deepstream_app_config.txt');
 const CONFIG_NATIVE = path.join(
   BACKEND_DIR,
@@ -60,6 +67,26 @@ function ensureLogDir() {
   if (!fs.existsSync(LOG_DIR)) fs.mkdirSync(LOG_DIR);
 }
 
+// PID files let jetson_telemetry.py account CPU/RSS per managed process.
+function writePidFile(name, pid) {
+  try {
+    if (!fs.existsSync(RUN_DIR)) fs.mkdirSync(RUN_DIR, { recursive: true });
+    fs.writeFileSync(path.join(RUN_DIR, `${name}.pid`), `${pid}\n`);
+  } catch {
+    // Best-effort; telemetry falls back to name patterns.
+  }
+}
+
+function removePidFile(name, pid) {
+  const pidPath = path.join(RUN_DIR, `${name}.pid`);
+  try {
+    // A restarted process may already own the file.
+    if (fs.readFileSync(pidPath, 'utf8').trim() === String(pid)) fs.unlinkSync(pidPath);
+  } catch {
+    // Already gone.
+  }
+}
+
 function killByPattern(pattern) {
   try {
     spawnSync('pkill', ['-f', pattern], { stdio: 'ignore' });
@@ -83,15 +110,19 @@ function startProcess(name, cmd, args, opts = {}) {
   ensureLogDir();
   const stdout = fs.openSync(path.join(LOG_DIR, `${name}.out.log`), 'a');
   const stderr = fs.openSync(path.join(LOG_DIR, `${name}.err.log`), 'a');
-  const child = spawn(cmd, args, {
+  // Affinity/nice/ionice/cgroup profiles are applied by an exec wrapper, so the PID is still the service's.
+  const [spawnCmd, spawnArgs] = profilesEnabled ? ['python3', [PROFILE_WRAPPER, name, '--', cmd, ...args]] : [cmd, args];
+  const child = spawn(spawnCmd, spawnArgs, {
     cwd: opts.cwd || BACKEND_DIR,
     env: { ...process.env, ...opts.env },
     detached: false,
     stdio: ['ignore', stdout, stderr]
   });
   processes[name] = child;
+  writePidFile(name, child.pid);
   child.on('exit', (code, signal) => {
-    delete processes[name];
+    if (processes[name] === child) delete processes[name];
+    removePidFile(name, child.pid);
     const msg = `[${name}] exited code=${code} signal=${signal}\n`;
     fs.appendFileSync(path.join(LOG_DIR, `${name}.err.log`), msg);
     if (name === 'deepstream' && nativeMode && !suppressAutoSwitch) {
@@ -348,6 +379,8 @@ const server = http.createServer((req, res) => {
   serveStatic(req, res);
 });
 
+writePidFile('server', process.pid);
+
 server.listen(PORT, () => {
   console.log(`Local server running on http://127.0.0.1:${PORT}`);
   console.log(`Serving static files from ${UI_ROOT} (then ${BASE_DIR} fallback)`);
@@ -367,6 +400,8 @@ startProcess('data_manager', 'python3', [path.join(BACKEND_DIR, 'mqtt', 'data_ma
     TEMP_ALARM_C: process.env.TEMP_ALARM_C || '80',
     GPU_WARN_PCT: process.env.GPU_WARN_PCT || '85',
     GPU_ALARM_PCT: process.env.GPU_ALARM_PCT || '95',
+    FPS_WARN_MIN: process.env.FPS_WARN_MIN || '20',
+    FPS_ALARM_MIN: process.env.FPS_ALARM_MIN || '10',
     DDB_ENABLED: ddbFlag || '0',
     AWS_REGION: process.env.AWS_REGION,
     DDB_METRICS_TABLE: process.env.DDB_METRICS_TABLE || 'metrics',
@@ -389,6 +424,18 @@ startProcess('telemetry', 'python3', [path.join(BACKEND_DIR, 'mqtt', 'jetson_tel
   }
 });
 
+// Start DeepStream perf-log tailer (per-stream FPS → deepstream/perf).
+startProcess('perf_tailer', 'python3', [path.join(BACKEND_DIR, 'mqtt', 'deepstream_perf.py')], {
+  env: {
+    MQTT_URL:
+      process.env.DATA_MANAGER_MQTT_URL ||
+      process.env.MQTT_URL ||
+      'mqtt://mqtt-dashboard.com:1883',
+    DEEPSTREAM_PERF_LOG: path.join(LOG_DIR, 'deepstream.out.log'),
+    PYTHONUNBUFFERED: '1'
+  }
+});
+
 // Start fake relay actuator emulator.
 startProcess('relay_emulator', 'python3', [path.join(BACKEND_DIR, 'mqtt', 'relay_emulator.py')], {
   env: {
@@ -400,5 +447,6 @@ startProcess('relay_emulator', 'python3', [path.join(BACKEND_DIR, 'mqtt', 'relay
 
 process.on('SIGINT', () => {
   Object.values(processes).forEach((child) => child.kill('SIGTERM'));
+  removePidFile('server', process.pid);
   process.exit(0);
 });
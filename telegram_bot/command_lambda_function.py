@@ -1,13 +1,75 @@
 import json
 import os
-
-import boto3
+import time
 
 ALLOWED_CHAT_ID = os.environ["ALLOWED_CHAT_ID"]
 IOT_ENDPOINT = os.environ["IOT_ENDPOINT"]
 COMMAND_TOPIC = os.environ.get("COMMAND_TOPIC", "devices/Jetson/commands")
+# "status" is answered here from the item data_manager.py keeps in this table.
+STATUS_TABLE = os.environ.get("STATUS_TABLE", "status")
+STATUS_ID = os.environ.get("STATUS_ID", "jetson")
+# A warm container reads the item at most once per TTL, however many requests arrive.
+STATUS_CACHE_SECONDS = float(os.environ.get("STATUS_CACHE_SECONDS", "10"))
+
+iot = None
+ddb = None
+status_cache = {"item": None, "fetched_at": None}
+
+
+def iot_client():
+    """boto3 is imported and the client built on the first publish, then reused while the container is warm."""
+    global iot
+    if iot is None:
+        import boto3
+
+        iot = boto3.client("iot-data", endpoint_url=f"https://{IOT_ENDPOINT}")
+    return iot
+
+
+def ddb_client():
+    global ddb
+    if ddb is None:
+        import boto3
 
-iot = boto3.client("iot-data", endpoint_url=f"https://{IOT_ENDPOINT}")
+        ddb = boto3.client("dynamodb")
+    return ddb
+
+
+def read_status() -> dict | None:
+    fetched_at = status_cache["fetched_at"]
+    if fetched_at is not None and time.monotonic() - fetched_at < STATUS_CACHE_SECONDS:
+        return status_cache["item"]
+    item = ddb_client().get_item(TableName=STATUS_TABLE, Key={"id": {"S": STATUS_ID}}).get("Item")
+    if item is not None:
+        item = {key: value.get("S", value.get("N")) for key, value in item.items()}
+    status_cache["item"], status_cache["fetched_at"] = item, time.monotonic()
+    return item
+
+
+def status_text(item: dict | None) -> str:
+    if not item:
+        return "No status yet. Is the data manager running with DDB_STATUS_TABLE set?"
+    age = max(0, int(time.time() - int(item.get("ts", 0)) / 1000))
+    lines = [f"📊 Status ({age}s ago)"]
+    if "people" in item:
+        lines.append(f"People: {item['people']}")
+    if "gpu" in item:
+        lines.append(f"GPU: {float(item['gpu']):.0f}% ({item.get('gpuLevel', '?')})")
+    if "temperature" in item:
+        lines.append(f"Temperature: {float(item['temperature']):.1f}°C ({item.get('tempLevel', '?')})")
+    if "fps" in item:
+        lines.append(f"FPS: {float(item['fps']):.1f} ({item.get('fpsLevel', '?')})")
+    lines.append(f"Relay: {item.get('relayState', '?')} (ack {item.get('relayAckLevel', '?')})")
+    return "\n".join(lines)
+
+
+def reply(chat_id: str, text: str) -> dict:
+    # Telegram runs a Bot API method returned in the webhook response, so no outbound call is needed.
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps({"method": "sendMessage", "chat_id": chat_id, "text": text}),
+    }
 
 
 def lambda_handler(event, context):
@@ -33,11 +95,28 @@ def lambda_handler(event, context):
     if chat_id != str(ALLOWED_CHAT_ID):
         return {"statusCode": 403, "body": "unauthorized"}
 
+    if text == "status":
+        try:
+            return reply(chat_id, status_text(read_status()))
+        except Exception as exc:
+            print(f"status read failed: {exc}")
+            return reply(chat_id, "Status unavailable right now.")
+
     allowed = {"run", "run -db", "start pipeline", "stop"}
     if text not in allowed:
         return {"statusCode": 200, "body": "ignored"}
 
-    cmd_payload = json.dumps({"command": text, "source": "telegram"})
-    iot.publish(topic=COMMAND_TOPIC, qos=0, payload=cmd_payload)
+    # QoS 1 + the listener's persistent session: commands survive a dropped link.
+    # "id" lets it ignore redeliveries, "ts" lets it skip commands that waited too long.
+    command = {
+        "command": text,
+        "source": "telegram",
+        "id": f"tg-{chat_id}-{message.get('message_id')}",
+    }
+    # Without a date the listener cannot tell a stale command, so it runs it.
+    if message.get("date"):
+        command["ts"] = int(message["date"]) * 1000
+    cmd_payload = json.dumps(command)
+    iot_client().publish(topic=COMMAND_TOPIC, qos=1, payload=cmd_payload)
 
     return {"statusCode": 200, "body": "ok"}
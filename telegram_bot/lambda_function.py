@@ -1,22 +1,185 @@
-import os
+import http.client
 import json
-import urllib.request
+import os
+import ssl
+import threading
+import time
+import urllib.parse
 
 BOT_TOKEN = os.environ["BOT_TOKEN"]
-CHAT_ID = os.environ["CHAT_ID"]
+# One chat id, or several separated by commas.
+CHAT_IDS = [chat.strip() for chat in os.environ["CHAT_ID"].split(",") if chat.strip()]
 THRESHOLD = int(os.environ.get("PEOPLE_THRESHOLD", "1"))
+SEND_CONCURRENCY = int(os.environ.get("SEND_CONCURRENCY", "4"))
+SEND_RETRIES = int(os.environ.get("SEND_RETRIES", "3"))
+SEND_TIMEOUT_SECONDS = float(os.environ.get("SEND_TIMEOUT_SECONDS", "5"))
+# Alert on transitions only: nobody -> people (count >= THRESHOLD) and back.
+# A transition within SUPPRESS_SECONDS of the previous alert is deferred: it is
+# sent with the first record after the window if it still holds, and dropped if
+# it flickered back.
+SUPPRESS_SECONDS = float(os.environ.get("SUPPRESS_SECONDS", "60"))
+# Last alert state; without a table it only lives in the warm container.
+STATE_TABLE = os.environ.get("NOTIFY_STATE_TABLE", "")
+STATE_KEY = os.environ.get("NOTIFY_STATE_KEY", "person_count")
+STATE_CACHE_SECONDS = float(os.environ.get("STATE_CACHE_SECONDS", "300"))
+# Overridable for local testing against a stand-in server (http:// is allowed).
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+MAX_MESSAGE_CHARS = 4096
 
 
-def send_telegram(msg: str):
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    data = json.dumps({"chat_id": CHAT_ID, "text": msg}).encode("utf-8")
-    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
-    with urllib.request.urlopen(req, timeout=5) as resp:
-        return resp.read()
+class PermanentSendError(RuntimeError):
+    """Telegram refused the message (4xx other than 429, e.g. the bot was blocked); a retry would fail again."""
 
 
-def lambda_handler(event, context):
-    for record in event.get("Records", []):
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections, reused across sends and warm invocations.
+    Nothing connects until the first request; the TLS context (CA bundle load)
+    is built once and shared by every connection.
+    """
+
+    def __init__(self, base_url: str, size: int):
+        url = urllib.parse.urlsplit(base_url)
+        self.https = url.scheme != "http"
+        self.context: ssl.SSLContext | None = None
+        self.netloc = url.netloc
+        self.prefix = url.path
+        self.idle: list[http.client.HTTPConnection] = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def request(self, method: str, path: str, body: bytes, headers: dict) -> tuple[int, bytes]:
+        with self.slots:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            reused = conn is not None
+            while True:
+                if conn is None:
+                    conn = self.connect()
+                try:
+                    conn.request(method, self.prefix + path, body=body, headers=headers)
+                    resp = conn.getresponse()
+                    data = resp.read()
+                except (http.client.HTTPException, OSError):
+                    conn.close()
+                    if not reused:
+                        raise
+                    # The server closed an idle keep-alive connection; retry once on a fresh one.
+                    conn, reused = None, False
+                    continue
+                with self.lock:
+                    self.idle.append(conn)
+                return resp.status, data
+
+    def connect(self) -> http.client.HTTPConnection:
+        if not self.https:
+            return http.client.HTTPConnection(self.netloc, timeout=SEND_TIMEOUT_SECONDS)
+        with self.lock:
+            if self.context is None:
+                self.context = ssl.create_default_context()
+        return http.client.HTTPSConnection(self.netloc, timeout=SEND_TIMEOUT_SECONDS, context=self.context)
+
+
+# Built on first use and kept for the life of the container.
+pool = ConnectionPool(TELEGRAM_API_URL, SEND_CONCURRENCY)
+executor = None
+ddb = None
+cached_state: dict | None = None
+cached_at = 0.0
+
+
+def ddb_client():
+    global ddb
+    if ddb is None:
+        import boto3
+
+        ddb = boto3.client("dynamodb")
+    return ddb
+
+
+def send_executor():
+    global executor
+    if executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+
+        executor = ThreadPoolExecutor(max_workers=SEND_CONCURRENCY)
+    return executor
+
+
+def load_state(refresh: bool = False) -> dict:
+    """Warm invocations reuse the cached state; a failed conditional write forces a re-read."""
+    global cached_state, cached_at
+    fresh = time.monotonic() - cached_at < STATE_CACHE_SECONDS
+    if cached_state is not None and (not STATE_TABLE or (fresh and not refresh)):
+        return dict(cached_state)
+    state = {"present": False, "count": 0, "last_alert_ts": 0, "pending_alert": [], "version": 0}
+    if STATE_TABLE:
+        item = ddb_client().get_item(TableName=STATE_TABLE, Key={"id": {"S": STATE_KEY}}, ConsistentRead=True).get("Item")
+        if item:
+            state = {
+                "present": item["present"]["BOOL"],
+                "count": int(item["count"]["N"]),
+                "last_alert_ts": int(item["last_alert_ts"]["N"]),
+                "pending_alert": [tuple(alert) for alert in json.loads(item.get("pending_alert", {}).get("S", "[]"))],
+                "version": int(item["version"]["N"]),
+            }
+    cached_state, cached_at = dict(state), time.monotonic()
+    return state
+
+
+def save_state(state: dict, expected_version: int) -> bool:
+    """Conditional write: False if another invocation updated the state first."""
+    global cached_state, cached_at
+    state = dict(state, version=expected_version + 1)
+    if STATE_TABLE:
+        client = ddb_client()
+        try:
+            client.put_item(
+                TableName=STATE_TABLE,
+                Item={
+                    "id": {"S": STATE_KEY},
+                    "present": {"BOOL": state["present"]},
+                    "count": {"N": str(state["count"])},
+                    "last_alert_ts": {"N": str(state["last_alert_ts"])},
+                    "pending_alert": {"S": json.dumps(state["pending_alert"])},
+                    "version": {"N": str(state["version"])},
+                },
+                ConditionExpression="attribute_not_exists(#id) OR #version = :expected",
+                ExpressionAttributeNames={"#id": "id", "#version": "version"},
+                ExpressionAttributeValues={":expected": {"N": str(expected_version)}},
+            )
+        except client.exceptions.ConditionalCheckFailedException:
+            return False
+    cached_state, cached_at = dict(state), time.monotonic()
+    return True
+
+
+def send_telegram(chat_id: str, msg: str, deadline: float):
+    body = json.dumps({"chat_id": chat_id, "text": msg}).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    for _ in range(SEND_RETRIES + 1):
+        status, data = pool.request("POST", f"/bot{BOT_TOKEN}/sendMessage", body, headers)
+        if status == 429:
+            try:
+                retry_after = float(json.loads(data).get("parameters", {}).get("retry_after", 1))
+            except Exception:
+                retry_after = 1.0
+            if time.monotonic() + retry_after > deadline:
+                raise RuntimeError(f"telegram rate limit: retry_after={retry_after}s exceeds the time left")
+            time.sleep(retry_after)
+            continue
+        if 400 <= status < 500:
+            raise PermanentSendError(f"telegram sendMessage refused: {status} {data[:200]!r}")
+        if status >= 400:
+            raise RuntimeError(f"telegram sendMessage failed: {status} {data[:200]!r}")
+        return data
+    raise RuntimeError("telegram rate limit: retries exhausted")
+
+
+def person_counts(records: list) -> list[tuple[int, int]]:
+    """(ts, count) of the person_count inserts/updates, in stream order."""
+    counts = []
+    for record in records:
         if record.get("eventName") not in ("INSERT", "MODIFY"):
             continue
 
@@ -30,7 +193,121 @@ def lambda_handler(event, context):
             continue
 
         count = int(float(count_val))
-        if count >= THRESHOLD:
-            send_telegram(f"\ud83d\udea8 Person detected: {count}")
+        ts = new_image.get("ts", {}).get("N")
+        if ts is None:
+            ts = record.get("dynamodb", {}).get("ApproximateCreationDateTime", time.time()) * 1000
+        counts.append((int(float(ts)), count))
+    return counts
+
+
+def apply_counts(state: dict, counts: list[tuple[int, int]]) -> list[tuple[bool, int]]:
+    """Advance 'state' through 'counts'; returns the (present, count) transitions to alert on."""
+    alerts = []
+    for ts, count in counts:
+        present = count >= THRESHOLD
+        # 'present' is what was last alerted; it only moves when an alert goes out.
+        if present == state["present"]:
+            continue
+        if state["last_alert_ts"] and ts - state["last_alert_ts"] < SUPPRESS_SECONDS * 1000:
+            continue
+        state["present"] = present
+        state["count"] = count
+        state["last_alert_ts"] = ts
+        alerts.append((present, count))
+    return alerts
+
+
+def alert_message(alerts: list[tuple[bool, int]]) -> str:
+    lines = [f"🚨 Person detected: {count}" if present else "✅ No people detected" for present, count in alerts]
+    return "\n".join(lines)
+
+
+def deliver(alerts: list[tuple], deadline: float) -> tuple[set, set, dict]:
+    """
+    Send every chat the pending alerts it is still owed. Returns the chats
+    delivered, the chats that refused for good (logged and dropped) and the
+    exceptions of the chats to retry.
+    """
+    messages = {}
+    for chat_id in CHAT_IDS:
+        owed = [(present, count) for present, count, chats in alerts if chat_id in chats]
+        if owed:
+            messages[chat_id] = alert_message(owed)[:MAX_MESSAGE_CHARS]
+    if len(messages) == 1:
+        outcomes = {}
+        for chat_id, msg in messages.items():
+            try:
+                send_telegram(chat_id, msg, deadline)
+                outcomes[chat_id] = None
+            except Exception as exc:
+                outcomes[chat_id] = exc
+    else:
+        futures = {chat_id: send_executor().submit(send_telegram, chat_id, msg, deadline) for chat_id, msg in messages.items()}
+        outcomes = {chat_id: future.exception() for chat_id, future in futures.items()}
+    delivered, dropped, failed = set(), set(), {}
+    for chat_id, exc in outcomes.items():
+        if exc is None:
+            delivered.add(chat_id)
+        elif isinstance(exc, PermanentSendError):
+            print(f"dropping alert for chat {chat_id}: {exc}")
+            dropped.add(chat_id)
+        else:
+            failed[chat_id] = exc
+    return delivered, dropped, failed
+
+
+def release_pending(sent: list[tuple], version: int, done: set):
+    """
+    Remove the chats in 'done' from the alerts just sent, and drop alerts no chat
+    is owed any more; keeps any alert another invocation added meanwhile.
+    """
+    for attempt in range(3):
+        state = load_state(refresh=attempt > 0)
+        if attempt == 0 and state["version"] != version:
+            continue
+        pending = list(state["pending_alert"])
+        if pending[: len(sent)] != sent:
+            return  # already released (or resent) elsewhere
+        owed = [
+            (present, count, [chat for chat in chats if chat not in done and chat in CHAT_IDS])
+            for present, count, chats in sent
+        ]
+        state["pending_alert"] = [alert for alert in owed if alert[2]] + pending[len(sent):]
+        if save_state(state, state["version"]):
+            return
+
+
+def lambda_handler(event, context):
+    counts = person_counts(event.get("Records", []))
+    if not counts:
+        return {"ok": True, "sent": 0}
+
+    alerts, version = [], 0
+    for attempt in range(3):
+        state = load_state(refresh=attempt > 0)
+        version = state["version"]
+        # Each pending alert lists the chats it is still owed.
+        new_alerts = [(present, count, list(CHAT_IDS)) for present, count in apply_counts(state, counts)]
+        # Alerts claimed by an earlier attempt whose send failed go out again first.
+        alerts = list(state["pending_alert"]) + new_alerts
+        if not new_alerts:
+            break  # no new transition: no write
+        # Claim the transitions before sending so concurrent invocations alert once.
+        state["pending_alert"] = alerts
+        if save_state(state, version):
+            version += 1
+            break
+        alerts = []
+    if not alerts:
+        return {"ok": True, "records": len(counts), "sent": 0}
 
-    return {"ok": True}
+    remaining_ms = context.get_remaining_time_in_millis() if context else 30000
+    deadline = time.monotonic() + max(remaining_ms / 1000.0 - 1.0, 0.0)
+    delivered, dropped, failed = deliver(alerts, deadline)
+    release_pending(alerts, version, delivered | dropped)
+    if failed:
+        # The failed chats stay pending, so the stream retries the batch and
+        # the retry resends to them only.
+        chat_id, exc = next(iter(failed.items()))
+        raise RuntimeError(f"telegram send failed for {len(failed)} chat(s), e.g. {chat_id}: {exc}") from exc
+    return {"ok": True, "records": len(counts), "sent": len(delivered)}